@@ -10,4 +10,9 @@ class NotFoundError(Exception):
 
 class StorageError(Exception):
     """Raised when storage operations fail."""
+    pass
+
+
+class PersistenceError(Exception):
+    """Raised when a buffered database write could not be made durable."""
     pass
\ No newline at end of file
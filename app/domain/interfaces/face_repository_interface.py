@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
 import numpy as np
-from ..models import Person, FaceEncoding
+from ..models import Person, FaceEncoding, SyncWatermark, EncodingDelta
 
 
 class IFaceRepository(ABC):
@@ -13,6 +13,10 @@ class IFaceRepository(ABC):
     async def get_person_by_id(self, person_id: int) -> Optional[Person]:
         pass
 
+    @abstractmethod
+    async def get_persons_by_ids(self, person_ids: List[int]) -> List[Person]:
+        pass
+
     @abstractmethod
     async def get_person_by_name(self, name: str) -> Optional[Person]:
         pass
@@ -30,10 +34,39 @@ class IFaceRepository(ABC):
     ) -> FaceEncoding:
         pass
 
+    @abstractmethod
+    async def save_face_encodings(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        """Insert many encodings in one statement and transaction; returns them with ids."""
+        pass
+
     @abstractmethod
     async def get_all_face_encodings(self) -> List[FaceEncoding]:
         pass
 
+    @abstractmethod
+    async def count_face_encodings(self) -> int:
+        pass
+
+    @abstractmethod
+    def iter_encoding_chunks(self, chunk_size: int = 10000) -> AsyncIterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Stream all encodings in id order as (encoding ids, person ids, float32 matrix) chunks."""
+        pass
+
+    @abstractmethod
+    async def get_sync_position(self) -> SyncWatermark:
+        """Watermark at the current end of the encoding and tombstone streams."""
+        pass
+
+    @abstractmethod
+    async def get_encoding_delta(self, since: SyncWatermark, overlap_seconds: float = 60.0) -> EncodingDelta:
+        """Encodings added and persons deleted since a watermark (everything when it is initial)."""
+        pass
+
     @abstractmethod
     async def delete_person(self, person_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete_face_encodings(self, encoding_ids: List[int]) -> int:
+        """Delete single encodings, recording a tombstone for each; returns rows deleted."""
         pass
\ No newline at end of file
@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field  # 'field' with lowercase 'f'
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import numpy as np
 
 
@@ -21,6 +21,63 @@ class FaceEncoding:
     created_at: datetime = field(default_factory=datetime.utcnow)
 
 
+@dataclass
+class DetectedFace:
+    encoding: np.ndarray
+    location: Tuple[int, int, int, int] = (0, 0, 0, 0)  # (top, right, bottom, left)
+
+    @property
+    def bounding_box(self) -> Dict[str, int]:
+        top, right, bottom, left = self.location
+        return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+
+
+@dataclass
+class PersonCandidate:
+    person_id: int
+    distance: float  # aggregated distance of the person's nearest encodings
+    confidence: float
+    votes: int = 0  # nearest encodings within tolerance
+    margin: Optional[float] = None  # score gap to the next-ranked person, None if there is none
+    person_name: Optional[str] = None
+
+
+@dataclass
+class SyncWatermark:
+    """Position of a gallery in the encoding and tombstone change streams."""
+    encoding_id: int = 0
+    encoding_created_at: Optional[datetime] = None
+    tombstone_id: int = 0
+    tombstone_deleted_at: Optional[datetime] = None
+
+    @property
+    def is_initial(self) -> bool:
+        return self.encoding_id == 0 and self.tombstone_id == 0
+
+
+@dataclass
+class EncodingDelta:
+    """Encodings added, and persons or single encodings deleted, since a watermark."""
+    encoding_ids: np.ndarray
+    person_ids: np.ndarray
+    encodings: np.ndarray  # N x 128 float32
+    deleted_person_ids: List[int]
+    watermark: SyncWatermark
+    deleted_encoding_ids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class GalleryChange:
+    """One gallery write, announced to the other workers under its gallery version."""
+    sequence: int = 0
+    encoding_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    person_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    encodings: np.ndarray = field(default_factory=lambda: np.empty((0, 128), dtype=np.float32))
+    created_at: Optional[datetime] = None  # newest created_at among the added encodings
+    deleted_person_ids: List[int] = field(default_factory=list)
+    deleted_encoding_ids: List[int] = field(default_factory=list)
+
+
 @dataclass
 class ImageUploadResult:
     success: bool
@@ -31,6 +88,16 @@ class ImageUploadResult:
     is_new_person: bool = False
 
 
+@dataclass
+class ImageEvent:
+    """A decoded image.received event, as handed to the face service."""
+    image_bytes: bytes
+    filename: str
+    person_name: Optional[str] = None
+    image_id: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
 # RabbitMQ Event Models
 @dataclass
 class BaseEvent:
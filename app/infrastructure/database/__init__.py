@@ -1,5 +1,5 @@
 """Database module."""
 from app.infrastructure.database.connection import Base, engine, get_db, SessionLocal
-from app.infrastructure.database.models import PersonDB, FaceEncodingDB
+from app.infrastructure.database.models import PersonDB, FaceEncodingDB, PersonTombstoneDB
 
-__all__ = ["Base", "engine", "get_db", "SessionLocal", "PersonDB", "FaceEncodingDB"]
\ No newline at end of file
+__all__ = ["Base", "engine", "get_db", "SessionLocal", "PersonDB", "FaceEncodingDB", "PersonTombstoneDB"]
\ No newline at end of file
@@ -0,0 +1,87 @@
+from typing import Any, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine, AsyncSession
+from app.config import get_settings
+
+# Async drivers substituted for the sync ones in settings.database_url
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """Connection pool counters, fed by pool events."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.invalidated = 0
+
+        pool_events = engine.sync_engine.pool
+        event.listen(pool_events, "connect", self._on_connect)
+        event.listen(pool_events, "checkout", self._on_checkout)
+        event.listen(pool_events, "checkin", self._on_checkin)
+        event.listen(pool_events, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidated += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.engine.sync_engine.pool
+        stats: Dict[str, Any] = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "invalidated": self.invalidated
+        }
+        # QueuePool only; sqlite's static/null pools have no size
+        if hasattr(pool, "size"):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=pool.overflow())
+        return stats
+
+
+def create_async_database_engine(url: Optional[str] = None) -> AsyncEngine:
+    """Create the async engine with the pool configured in settings."""
+    settings = get_settings()
+    url = async_database_url(url or settings.database_url)
+
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+            pool_recycle=settings.database_pool_recycle
+        )
+
+    return create_async_engine(url, **options)
+
+
+def create_async_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    # Rows are mapped to domain models inside the unit of work, nothing is lazy-loaded afterwards
+    return async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
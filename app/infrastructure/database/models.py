@@ -20,8 +20,17 @@ class FaceEncodingDB(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     person_id = Column(Integer, ForeignKey("persons.id"))
-    encoding = Column(LargeBinary)  # Store numpy array as binary
+    encoding = Column(LargeBinary)  # Tagged raw float32, see repositories/encoding_format.py
     image_path = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    person = relationship("PersonDB", back_populates="face_encodings")
+
 
-    person = relationship("PersonDB", back_populates="face_encodings")
\ No newline at end of file
+class PersonTombstoneDB(Base):
+    __tablename__ = "person_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    person_id = Column(Integer, nullable=False)
+    encoding_id = Column(Integer, nullable=True)  # set when only this encoding was deleted
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
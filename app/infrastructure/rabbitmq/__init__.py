@@ -1,5 +1,6 @@
 from .connection import RabbitMQConnection
 from .consumer import RabbitMQConsumer
 from .publisher import RabbitMQPublisher
+from .gallery_feed import GalleryChangeFeed
 
-__all__ = ['RabbitMQConnection', 'RabbitMQConsumer', 'RabbitMQPublisher']
\ No newline at end of file
+__all__ = ['RabbitMQConnection', 'RabbitMQConsumer', 'RabbitMQPublisher', 'GalleryChangeFeed']
\ No newline at end of file
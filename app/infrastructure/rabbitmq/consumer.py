@@ -1,24 +1,60 @@
+import asyncio
 import json
 import logging
-from typing import Dict, Callable
+import time
+from typing import Dict, Callable, List, Optional, Set
 import aio_pika
 from app.config import get_settings
+from app.core.exceptions import PersistenceError
 
 logger = logging.getLogger(__name__)
 
 
 class RabbitMQConsumer:
-    def __init__(self, connection):
+    """
+    Consumes image events with up to ``concurrency`` messages in flight.
+
+    Each delivery is handled in its own task, acked or rejected on its own
+    when that task ends; the prefetch window is widened to match, so the
+    broker keeps every slot busy. With a concurrency of 1 messages are
+    handled strictly one after another.
+
+    With ``batch_size`` above 1 a slot takes a batch instead: up to
+    ``batch_size`` messages, or whatever arrived within ``batch_linger``
+    seconds of the first, handed together to the batch handler of their
+    routing key. Each message is still acked or rejected on its own.
+    """
+
+    def __init__(self, connection, concurrency: int = 1, batch_size: int = 1, batch_linger: float = 0.0):
         self.connection = connection
         self.settings = get_settings()
         self.handlers: Dict[str, Callable] = {}
+        self.batch_handlers: Dict[str, Callable] = {}
         self.queue = None
+        self.concurrency = max(concurrency, 1)
+        self.batch_size = max(batch_size, 1)
+        self.batch_linger = batch_linger
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._in_flight: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_messages = 0
+        self._linger_seconds = 0.0
+        self._batch_seconds = 0.0
 
     def register_handler(self, routing_key: str, handler: Callable):
         """Register a handler for a specific routing key."""
         self.handlers[routing_key] = handler
         logger.info(f"Registered handler for routing key: {routing_key}")
 
+    def register_batch_handler(self, routing_key: str, handler: Callable):
+        """
+        Register a handler taking a list of message bodies and returning,
+        for each, None or the exception it failed with. Used in place of
+        the routing key's handler when batching.
+        """
+        self.batch_handlers[routing_key] = handler
+        logger.info(f"Registered batch handler for routing key: {routing_key}")
+
     async def start_consuming(self):
         """Start consuming messages from the queue."""
         try:
@@ -36,16 +72,193 @@ class RabbitMQConsumer:
                 )
                 logger.info(f"Bound queue to routing key: {routing_key}")
 
-            # Start consuming
+            # Let the broker deliver as many messages as we handle at once
+            prefetch_count = max(self.concurrency * self.batch_size, self.settings.rabbitmq_prefetch_count)
+            await self.connection.channel.set_qos(prefetch_count=prefetch_count)
+
+            if self.batch_size > 1:
+                await self._consume_batches()
+                return
+
+            # Start consuming; a message is only taken once a slot is free
             async with self.queue.iterator() as queue_iter:
                 async for message in queue_iter:
-                    async with message.process():
-                        await self._process_message(message)
+                    try:
+                        await self._slots.acquire()
+                    except asyncio.CancelledError:
+                        await message.nack(requeue=True)
+                        raise
+                    task = asyncio.create_task(self._handle_message(message))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
 
         except Exception as e:
             logger.error(f"Error in consumer: {e}")
             raise
 
+    async def drain(self, timeout: float):
+        """
+        Wait up to ``timeout`` seconds for the messages in flight once
+        consuming has stopped; the ones still running are then cancelled and requeued.
+        """
+        if not self._in_flight:
+            return
+
+        logger.info(f"Waiting for {len(self._in_flight)} messages in flight")
+        _, pending = await asyncio.wait(set(self._in_flight), timeout=timeout or None)
+        if pending:
+            logger.warning(f"Requeueing {len(pending)} messages still in flight after {timeout}s")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        """Batch counters: how full batches were and how long they lingered and took."""
+        batches = self.batches or 1
+        return {
+            "batches": self.batches,
+            "messages": self.batched_messages,
+            "mean_fill": self.batched_messages / (batches * self.batch_size),
+            "mean_linger_ms": 1000 * self._linger_seconds / batches,
+            "mean_batch_ms": 1000 * self._batch_seconds / batches
+        }
+
+    async def _consume_batches(self):
+        deliveries: asyncio.Queue = asyncio.Queue()
+        consumer_tag = await self.queue.consume(deliveries.put)
+        try:
+            while True:
+                await self._slots.acquire()
+                try:
+                    batch, lingered = await self._next_batch(deliveries)
+                except asyncio.CancelledError:
+                    self._slots.release()
+                    raise
+                task = asyncio.create_task(self._handle_batch(batch, lingered))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        finally:
+            # Stop deliveries; what was prefetched but not taken goes back to the queue
+            await self.queue.cancel(consumer_tag)
+            while not deliveries.empty():
+                await deliveries.get_nowait().nack(requeue=True)
+
+    async def _next_batch(self, deliveries: asyncio.Queue):
+        """Wait for a message, then add more until the batch is full or has lingered long enough."""
+        batch: List[aio_pika.IncomingMessage] = [await deliveries.get()]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            while len(batch) < self.batch_size:
+                if not deliveries.empty():
+                    batch.append(deliveries.get_nowait())
+                    continue
+                remaining = started + self.batch_linger - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(deliveries.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            for message in batch:
+                await message.nack(requeue=True)
+            raise
+        return batch, loop.time() - started
+
+    async def _handle_batch(self, batch: List[aio_pika.IncomingMessage], lingered: float):
+        """Process a batch in its own task and settle each of its messages."""
+        started = time.perf_counter()
+        try:
+            try:
+                outcomes = await self._process_batch(batch)
+            except asyncio.CancelledError:
+                # Shutting down mid-batch; another worker picks the messages up
+                for message in batch:
+                    await message.nack(requeue=True)
+                raise
+            except Exception as e:
+                outcomes = [e] * len(batch)
+
+            for message, error in zip(batch, outcomes):
+                await self._settle(message, error)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to settle a batch of {len(batch)} messages: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self.batched_messages += len(batch)
+            self._linger_seconds += lingered
+            self._batch_seconds += elapsed
+            self._slots.release()
+            logger.info(
+                f"Processed a batch of {len(batch)}/{self.batch_size} messages "
+                f"(lingered {lingered * 1000:.0f}ms, took {elapsed * 1000:.0f}ms)"
+            )
+
+    async def _process_batch(self, batch: List[aio_pika.IncomingMessage]) -> List[Optional[Exception]]:
+        """Hand the batch to the batch handler of each routing key; returns an outcome per message."""
+        outcomes: List[Optional[Exception]] = [None] * len(batch)
+        groups: Dict[str, List[int]] = {}
+        bodies: Dict[int, Dict] = {}
+        for position, message in enumerate(batch):
+            try:
+                bodies[position] = json.loads(message.body.decode())
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to decode message: {e}")
+                continue
+            groups.setdefault(message.routing_key, []).append(position)
+
+        for routing_key, positions in groups.items():
+            handler = self.batch_handlers.get(routing_key)
+            if handler:
+                errors = await handler([bodies[position] for position in positions])
+                for position, error in zip(positions, errors):
+                    outcomes[position] = error
+                continue
+
+            # No batch handler for this routing key; handle its messages one by one
+            for position in positions:
+                try:
+                    await self._process_message(batch[position])
+                except Exception as e:
+                    outcomes[position] = e
+        return outcomes
+
+    @staticmethod
+    async def _settle(message: aio_pika.IncomingMessage, error: Optional[Exception]):
+        if error is None:
+            await message.ack()
+        elif isinstance(error, PersistenceError):
+            # Results were not made durable; redeliver instead of dropping
+            await message.nack(requeue=True)
+        else:
+            logger.error(f"Message {message.delivery_tag} rejected: {error}")
+            await message.reject(requeue=False)
+
+    async def _handle_message(self, message: aio_pika.IncomingMessage):
+        """Process one message in its own task and settle it."""
+        try:
+            async with message.process(ignore_processed=True):
+                try:
+                    await self._process_message(message)
+                except PersistenceError:
+                    # Results were not made durable; redeliver instead of dropping
+                    await message.nack(requeue=True)
+                except asyncio.CancelledError:
+                    # Shutting down mid-message; another worker picks it up
+                    await message.nack(requeue=True)
+                    raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Already rejected by message.process(); the other messages carry on
+            logger.error(f"Message {message.delivery_tag} rejected: {e}")
+        finally:
+            self._slots.release()
+
     async def _process_message(self, message: aio_pika.IncomingMessage):
         """Process a single message."""
         try:
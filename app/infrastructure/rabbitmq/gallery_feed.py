@@ -0,0 +1,139 @@
+import logging
+import struct
+from typing import Callable, Optional
+import aio_pika
+import numpy as np
+from app.config import get_settings
+from app.domain.models import GalleryChange
+from app.utils.time_utils import to_micros, from_micros
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<4sqIIIq")
+_FORMAT_TAG = b"GCH1"
+
+
+class GalleryChangeFeed:
+    """
+    Fanout exchange that carries gallery changes between worker replicas.
+
+    Every worker binds its own exclusive queue, so each change reaches all
+    replicas, the writer included (it already has the change and skips it
+    by sequence). Messages are transient: a replica that misses one sees
+    the gap in sequence numbers and resyncs from the database.
+    """
+
+    def __init__(self, connection, exchange_name: Optional[str] = None, prefetch_count: int = 256):
+        self.connection = connection
+        self.settings = get_settings()
+        self.exchange_name = exchange_name or self.settings.gallery_change_exchange
+        self.prefetch_count = prefetch_count
+        self.channel: Optional[aio_pika.Channel] = None
+        self.exchange: Optional[aio_pika.Exchange] = None
+        self.handler: Optional[Callable[[GalleryChange], None]] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, handler: Callable[[GalleryChange], None]):
+        """Declare the exchange and start delivering changes to ``handler``."""
+        self.handler = handler
+
+        # A channel of its own, so the image consumer's prefetch does not throttle the feed
+        self.channel = await self.connection.connection.channel()
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+        self.exchange = await self.channel.declare_exchange(
+            name=self.exchange_name,
+            type=aio_pika.ExchangeType.FANOUT,
+            durable=True
+        )
+
+        queue = await self.channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(self.exchange)
+        await queue.consume(self._on_message, no_ack=True)
+        logger.info(f"Listening for gallery changes on exchange {self.exchange_name}")
+
+    async def stop(self):
+        if self.channel and not self.channel.is_closed:
+            await self.channel.close()
+
+    async def publish(self, change: GalleryChange):
+        """Announce a change; failures are logged, replicas recover through gap detection."""
+        if self.exchange is None:
+            return
+
+        try:
+            await self.exchange.publish(
+                aio_pika.Message(
+                    body=pack_change(change),
+                    content_type="application/octet-stream",
+                    delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT
+                ),
+                routing_key=""
+            )
+            self.published += 1
+        except Exception as e:
+            logger.warning(f"Failed to publish gallery change {change.sequence}: {e}")
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        try:
+            change = unpack_change(message.body)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable gallery change: {e}")
+            return
+
+        self.received += 1
+        try:
+            self.handler(change)
+        except Exception as e:
+            logger.error(f"Failed to apply gallery change {change.sequence}: {e}")
+
+
+def pack_change(change: GalleryChange) -> bytes:
+    encodings = np.asarray(change.encodings, dtype="<f4")
+    encodings = encodings.reshape(len(change.encoding_ids), encodings.shape[-1])
+    header = _HEADER.pack(
+        _FORMAT_TAG,
+        change.sequence,
+        len(change.encoding_ids),
+        len(change.deleted_person_ids),
+        len(change.deleted_encoding_ids),
+        to_micros(change.created_at)
+    )
+    return b"".join([
+        header,
+        np.uint32(encodings.shape[1]).tobytes(),
+        np.asarray(change.encoding_ids, dtype="<i8").tobytes(),
+        np.asarray(change.person_ids, dtype="<i8").tobytes(),
+        encodings.tobytes(),
+        np.asarray(change.deleted_person_ids, dtype="<i8").tobytes(),
+        np.asarray(change.deleted_encoding_ids, dtype="<i8").tobytes()
+    ])
+
+
+def unpack_change(payload: bytes) -> GalleryChange:
+    tag, sequence, added, deleted_persons, deleted_encodings, created_at = _HEADER.unpack_from(payload)
+    if tag != _FORMAT_TAG:
+        raise ValueError(f"Unknown gallery change format: {tag!r}")
+
+    offset = _HEADER.size
+    dimension = int(np.frombuffer(payload, dtype="<u4", count=1, offset=offset)[0])
+    offset += 4
+
+    def take(dtype: str, count: int) -> np.ndarray:
+        nonlocal offset
+        array = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    change = GalleryChange(
+        sequence=sequence,
+        encoding_ids=take("<i8", added).astype(np.int64),
+        person_ids=take("<i8", added).astype(np.int64),
+        encodings=take("<f4", added * dimension).reshape(added, dimension).astype(np.float32),
+        created_at=from_micros(created_at),
+        deleted_person_ids=take("<i8", deleted_persons).tolist(),
+        deleted_encoding_ids=take("<i8", deleted_encodings).tolist()
+    )
+    if offset != len(payload):
+        raise ValueError(f"Gallery change is {len(payload)} bytes, expected {offset}")
+    return change
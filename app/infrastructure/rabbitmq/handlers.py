@@ -1,7 +1,9 @@
+import asyncio
 import base64
 import logging
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from app.domain.models import ImageEvent
 from app.services.face_service import FaceService
 
 logger = logging.getLogger(__name__)
@@ -84,43 +86,13 @@ class EventHandlers:
                 image_bytes=image_bytes,
                 filename=filename or "unknown.jpg",
                 person_name=person_name,  # Will be None if not registering
-                image_id=image_id
+                image_id=image_id,
+                metadata=metadata
             )
 
             # Calculate processing time
             processing_ms = int((time.time() - start_time) * 1000)
-
-            # Log result
-            if result.get("success"):
-                logger.info(
-                    f"Face recognition successful for {image_id}: "
-                    f"person={result.get('person_name')}, "
-                    f"confidence={result.get('confidence'):.2%}, "
-                    f"is_new={result.get('is_new_person')}, "
-                    f"time={processing_ms}ms"
-                )
-            else:
-                logger.warning(
-                    f"Face recognition failed for {image_id}: "
-                    f"{result.get('message')}, time={processing_ms}ms"
-                )
-
-            # Publish face.recognized event (matching Go's FaceRecognitionEventData)
-            await self._publish_face_recognized(image_id, result, processing_ms)
-
-            # Publish data.saved event (matching Go's DataSavedEventData)
-            if result.get("success"):
-                await self._publish_data_saved(
-                    image_id=image_id,
-                    success=True,
-                    storage_url=result.get("image_path")
-                )
-            else:
-                await self._publish_data_saved(
-                    image_id=image_id,
-                    success=False,
-                    error=result.get("message", "Face recognition failed")
-                )
+            await self._publish_result(image_id, result, processing_ms)
 
         except Exception as e:
             logger.error(f"Unexpected error processing image event: {e}", exc_info=True)
@@ -130,24 +102,120 @@ class EventHandlers:
                 await self._publish_error(image_id, str(e))
             raise
 
+    async def handle_image_received_batch(self, events: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Handle a batch of image.received events in one pass through the
+        face service, then publish every result together.
+
+        Returns one entry per event: None once it is handled (including
+        events rejected as invalid), otherwise the exception it failed with.
+        """
+        start_time = time.time()
+        outcomes: List[Optional[Exception]] = [None] * len(events)
+        publishes = []
+        accepted = []
+        image_events = []
+        for position, event in enumerate(events):
+            data = event.get("data", {})
+            image_id = data.get("image_id")
+            if not image_id:
+                logger.error("Missing required field: image_id")
+                continue
+            if not data.get("image_data"):
+                logger.error(f"Missing image data for image_id: {image_id}")
+                publishes.append((position, self._publish_error(image_id, "No image data provided")))
+                continue
+            try:
+                image_bytes = base64.b64decode(data["image_data"])
+            except Exception as e:
+                logger.error(f"Failed to decode base64 for image {image_id}: {e}")
+                publishes.append((position, self._publish_error(image_id, "Invalid base64 image data")))
+                continue
+
+            accepted.append(position)
+            image_events.append(ImageEvent(
+                image_bytes=image_bytes,
+                filename=data.get("file_name") or "unknown.jpg",
+                person_name=data.get("name"),
+                image_id=image_id,
+                metadata=data.get("metadata", {})
+            ))
+
+        logger.info(f"Starting face recognition for a batch of {len(image_events)} images")
+        try:
+            results = await self.face_service.process_images_from_events(image_events)
+        except Exception as e:
+            logger.error(f"Unexpected error processing image batch: {e}", exc_info=True)
+            results = [e] * len(image_events)
+
+        processing_ms = int((time.time() - start_time) * 1000)
+        for position, image_event, result in zip(accepted, image_events, results):
+            if isinstance(result, Exception):
+                logger.error(f"Unexpected error processing image {image_event.image_id}: {result}")
+                outcomes[position] = result
+                publishes.append((position, self._publish_error(image_event.image_id, str(result))))
+            else:
+                publishes.append((position, self._publish_result(image_event.image_id, result, processing_ms)))
+
+        # Every event's results go out together
+        published = await asyncio.gather(*[publish for _, publish in publishes], return_exceptions=True)
+        for (position, _), error in zip(publishes, published):
+            if isinstance(error, Exception) and outcomes[position] is None:
+                outcomes[position] = error
+        return outcomes
+
+    async def _publish_result(self, image_id: str, result: Dict[str, Any], processing_ms: int):
+        """Log the outcome of an image and publish its face.recognized and data.saved events."""
+        # Log result
+        if result.get("success"):
+            logger.info(
+                f"Face recognition successful for {image_id}: "
+                f"person={result.get('person_name')}, "
+                f"confidence={result.get('confidence'):.2%}, "
+                f"is_new={result.get('is_new_person')}, "
+                f"time={processing_ms}ms"
+            )
+        else:
+            logger.warning(
+                f"Face recognition failed for {image_id}: "
+                f"{result.get('message')}, time={processing_ms}ms"
+            )
+
+        # Publish face.recognized event (matching Go's FaceRecognitionEventData)
+        await self._publish_face_recognized(image_id, result, processing_ms)
+
+        # Publish data.saved event (matching Go's DataSavedEventData)
+        if result.get("success"):
+            await self._publish_data_saved(
+                image_id=image_id,
+                success=True,
+                storage_url=result.get("image_path")
+            )
+        else:
+            await self._publish_data_saved(
+                image_id=image_id,
+                success=False,
+                error=result.get("message", "Face recognition failed")
+            )
+
     async def _publish_face_recognized(self, image_id: str, result: Dict[str, Any], processing_ms: int):
         """Publish face.recognized event matching Go's structure."""
-        # Build results array matching Go's FaceRecognitionResult
+        # Build results array matching Go's FaceRecognitionResult, one entry per detected face
         results = []
-        if result.get("success") and result.get("faces_found", 0) > 0:
+        for position, face in enumerate(result.get("faces", [])):
+            attributes = {
+                "person_name": face.get("person_name"),
+                "is_new_person": face.get("is_new_person", False),
+                "recognized": face.get("success", False)
+            }
+            if "candidates" in face:
+                attributes["candidates"] = face["candidates"]
+
             results.append({
-                "face_id": f"face_{image_id}",  # Generate a face ID
-                "confidence": result.get("confidence", 0.0),
-                "bounding_box": {
-                    "x": 0,
-                    "y": 0,
-                    "width": 0,
-                    "height": 0
-                },
-                "attributes": {
-                    "person_name": result.get("person_name"),
-                    "is_new_person": result.get("is_new_person", False)
-                }
+                "face_id": f"face_{image_id}_{position}",  # Generate a face ID
+                "confidence": face.get("confidence", 0.0),
+                "bounding_box": face.get("bounding_box"),
+                "attributes": attributes
             })
 
         # Create FaceRecognitionEventData
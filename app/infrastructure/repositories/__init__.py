@@ -1,4 +1,7 @@
 """Repositories module."""
 from app.infrastructure.repositories.face_repository import FaceRepository
+from app.infrastructure.repositories.async_face_repository import AsyncFaceRepository
+from app.infrastructure.repositories.sqlite_face_repository import SqliteFaceRepository
+from app.infrastructure.repositories.encoding_write_buffer import EncodingWriteBuffer
 
-__all__ = ["FaceRepository"]
\ No newline at end of file
+__all__ = ["FaceRepository", "AsyncFaceRepository", "SqliteFaceRepository", "EncodingWriteBuffer"]
\ No newline at end of file
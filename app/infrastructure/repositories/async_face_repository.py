@@ -0,0 +1,182 @@
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+import numpy as np
+from sqlalchemy import select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.domain.interfaces.face_repository_interface import IFaceRepository
+from app.domain.models import Person, FaceEncoding, SyncWatermark, EncodingDelta
+from app.infrastructure.database.async_connection import PoolMetrics
+from app.infrastructure.database.models import PersonDB, FaceEncodingDB, PersonTombstoneDB
+from app.infrastructure.repositories.encoding_format import encode_encoding, decode_encodings
+from app.infrastructure.repositories.encoding_queries import (
+    encoding_insert_query,
+    encoding_insert_params,
+    saved_encodings,
+    encoding_matrix_query,
+    encoding_matrix,
+    encoding_count_query,
+    sync_position_queries,
+    sync_position,
+    encoding_delta_queries,
+    build_encoding_delta,
+    encoding_delete_query,
+    encoding_tombstone_params
+)
+
+
+class AsyncFaceRepository(IFaceRepository):
+    """
+    FaceRepository on an async engine.
+
+    Every call is its own unit of work on a session checked out from the
+    pool, so concurrent messages never share a session and DB round-trips
+    do not block the event loop.
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            pool_metrics: Optional[PoolMetrics] = None
+    ):
+        self.session_factory = session_factory
+        self.pool_metrics = pool_metrics
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.pool_metrics.snapshot() if self.pool_metrics else {}
+
+    async def create_person(self, name: str) -> Person:
+        async with self.session_factory.begin() as session:
+            db_person = PersonDB(name=name)
+            session.add(db_person)
+            await session.flush()
+            await session.refresh(db_person)
+            return self._to_person(db_person)
+
+    async def get_person_by_id(self, person_id: int) -> Optional[Person]:
+        async with self.session_factory() as session:
+            db_person = await session.get(PersonDB, person_id)
+            return self._to_person(db_person) if db_person else None
+
+    async def get_persons_by_ids(self, person_ids: List[int]) -> List[Person]:
+        if not person_ids:
+            return []
+
+        async with self.session_factory() as session:
+            db_persons = await session.scalars(select(PersonDB).where(PersonDB.id.in_(person_ids)))
+            return [self._to_person(p) for p in db_persons]
+
+    async def get_person_by_name(self, name: str) -> Optional[Person]:
+        async with self.session_factory() as session:
+            db_person = await session.scalar(select(PersonDB).where(PersonDB.name == name).limit(1))
+            return self._to_person(db_person) if db_person else None
+
+    async def get_all_persons(self) -> List[Person]:
+        async with self.session_factory() as session:
+            db_persons = await session.scalars(select(PersonDB))
+            return [self._to_person(p) for p in db_persons]
+
+    async def save_face_encoding(
+            self,
+            person_id: int,
+            encoding: np.ndarray,
+            image_path: str
+    ) -> FaceEncoding:
+        async with self.session_factory.begin() as session:
+            db_encoding = FaceEncodingDB(
+                person_id=person_id,
+                encoding=encode_encoding(encoding),
+                image_path=image_path
+            )
+            session.add(db_encoding)
+            await session.flush()
+            await session.refresh(db_encoding)
+
+            return FaceEncoding(
+                id=db_encoding.id,
+                person_id=db_encoding.person_id,
+                encoding=encoding,
+                image_path=db_encoding.image_path,
+                created_at=db_encoding.created_at
+            )
+
+    async def save_face_encodings(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        if not encodings:
+            return []
+
+        async with self.session_factory.begin() as session:
+            result = await session.execute(encoding_insert_query(), encoding_insert_params(encodings))
+            rows = result.all()
+        return saved_encodings(encodings, rows)
+
+    async def get_all_face_encodings(self) -> List[FaceEncoding]:
+        async with self.session_factory() as session:
+            db_encodings = (await session.scalars(select(FaceEncodingDB))).all()
+
+        matrix = decode_encodings([db_enc.encoding for db_enc in db_encodings])
+        return [
+            FaceEncoding(
+                id=db_enc.id,
+                person_id=db_enc.person_id,
+                encoding=encoding_array,
+                image_path=db_enc.image_path,
+                created_at=db_enc.created_at
+            )
+            for db_enc, encoding_array in zip(db_encodings, matrix)
+        ]
+
+    async def count_face_encodings(self) -> int:
+        async with self.session_factory() as session:
+            return (await session.execute(encoding_count_query())).scalar_one()
+
+    async def iter_encoding_chunks(self, chunk_size: int = 10000) -> AsyncIterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # stream() runs on a server-side cursor; only one chunk of rows is held at a time
+        async with self.session_factory() as session:
+            result = await session.stream(encoding_matrix_query().execution_options(yield_per=chunk_size))
+            async for rows in result.partitions():
+                yield encoding_matrix(rows)
+
+    async def get_sync_position(self) -> SyncWatermark:
+        encoding_query, tombstone_query = sync_position_queries()
+        async with self.session_factory() as session:
+            tombstone_head = (await session.execute(tombstone_query)).one()
+            encoding_head = (await session.execute(encoding_query)).one()
+        return sync_position(encoding_head, tombstone_head)
+
+    async def get_encoding_delta(self, since: SyncWatermark, overlap_seconds: float = 60.0) -> EncodingDelta:
+        # Tombstones first: a deletion racing with the encoding read is then picked up next time
+        tombstone_query, encoding_query = encoding_delta_queries(since, overlap_seconds)
+        async with self.session_factory() as session:
+            tombstone_rows = (await session.execute(tombstone_query)).all()
+            encoding_rows = (await session.execute(encoding_query)).all()
+        return build_encoding_delta(since, tombstone_rows, encoding_rows)
+
+    async def delete_person(self, person_id: int) -> bool:
+        async with self.session_factory.begin() as session:
+            db_person = await session.get(PersonDB, person_id)
+            if not db_person:
+                return False
+
+            # Bulk delete instead of loading the cascade into the session
+            await session.execute(delete(FaceEncodingDB).where(FaceEncodingDB.person_id == person_id))
+            await session.delete(db_person)
+            session.add(PersonTombstoneDB(person_id=person_id))
+            return True
+
+    async def delete_face_encodings(self, encoding_ids: List[int]) -> int:
+        if not encoding_ids:
+            return 0
+
+        async with self.session_factory.begin() as session:
+            result = await session.execute(encoding_delete_query(encoding_ids))
+            deleted = result.all()
+            if deleted:
+                await session.execute(insert(PersonTombstoneDB), encoding_tombstone_params(deleted))
+            return len(deleted)
+
+    @staticmethod
+    def _to_person(db_person: PersonDB) -> Person:
+        return Person(
+            id=db_person.id,
+            name=db_person.name,
+            created_at=db_person.created_at,
+            updated_at=db_person.updated_at
+        )
@@ -0,0 +1,66 @@
+import io
+import pickle
+from typing import List
+import numpy as np
+
+# Stored encodings are a 4-byte format tag followed by raw little-endian float32 values
+ENCODING_FORMAT_TAG = b"FE32"
+ENCODING_DIMENSION = 128
+_VALUE_DTYPE = np.dtype("<f4")
+_RECORD_DTYPE = np.dtype([("tag", "S4"), ("values", _VALUE_DTYPE, (ENCODING_DIMENSION,))])
+
+# Globals a pickled numpy array may reference; anything else is refused
+_LEGACY_PICKLE_GLOBALS = {
+    ("numpy.core.multiarray", "_reconstruct"),
+    ("numpy._core.multiarray", "_reconstruct"),
+    ("numpy", "ndarray"),
+    ("numpy", "dtype"),
+}
+
+
+class _LegacyEncodingUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) not in _LEGACY_PICKLE_GLOBALS:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a stored encoding")
+        return super().find_class(module, name)
+
+
+def encode_encoding(encoding: np.ndarray) -> bytes:
+    """Serialize one encoding in the compact tagged float32 format."""
+    values = np.asarray(encoding, dtype=_VALUE_DTYPE).reshape(-1)
+    return ENCODING_FORMAT_TAG + values.tobytes()
+
+
+def is_current_format(data: bytes) -> bool:
+    return bytes(data[:len(ENCODING_FORMAT_TAG)]) == ENCODING_FORMAT_TAG
+
+
+def decode_encoding(data: bytes) -> np.ndarray:
+    """Deserialize one encoding, accepting rows not yet migrated from pickle."""
+    if is_current_format(data):
+        return np.frombuffer(data, dtype=_VALUE_DTYPE, offset=len(ENCODING_FORMAT_TAG))
+
+    encoding = _LegacyEncodingUnpickler(io.BytesIO(data)).load()
+    if not isinstance(encoding, np.ndarray):
+        raise ValueError(f"Stored encoding is a {type(encoding).__name__}, not an array")
+    return encoding.astype(_VALUE_DTYPE).reshape(-1)
+
+
+def decode_encodings(blobs: List[bytes]) -> np.ndarray:
+    """
+    Decode many stored encodings into one N x 128 float32 matrix.
+
+    When every blob is in the current format the concatenated column is
+    read with a single np.frombuffer; otherwise (a migration in progress)
+    rows are decoded one at a time.
+    """
+    if not blobs:
+        return np.empty((0, ENCODING_DIMENSION), dtype=np.float32)
+
+    buffer = b"".join(blobs)
+    if len(buffer) == len(blobs) * _RECORD_DTYPE.itemsize:
+        records = np.frombuffer(buffer, dtype=_RECORD_DTYPE)
+        if np.all(records["tag"] == ENCODING_FORMAT_TAG):
+            return records["values"]
+
+    return np.stack([decode_encoding(blob) for blob in blobs])
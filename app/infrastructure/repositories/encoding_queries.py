@@ -0,0 +1,161 @@
+"""Encoding insert/load/sync statements shared by the sync and async repositories."""
+from datetime import timedelta
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import Delete, Insert, Select, delete, func, insert, or_, select
+from app.domain.models import FaceEncoding, SyncWatermark, EncodingDelta
+from app.infrastructure.database.models import FaceEncodingDB, PersonTombstoneDB
+from app.infrastructure.repositories.encoding_format import encode_encoding, decode_encodings
+
+
+def encoding_insert_query() -> Insert:
+    # Executed with a parameter list, SQLAlchemy renders multi-row INSERT ... VALUES ... RETURNING
+    return insert(FaceEncodingDB).returning(
+        FaceEncodingDB.id,
+        FaceEncodingDB.created_at,
+        sort_by_parameter_order=True
+    )
+
+
+def encoding_insert_params(encodings: Sequence[FaceEncoding]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "person_id": enc.person_id,
+            "encoding": encode_encoding(enc.encoding),
+            "image_path": enc.image_path
+        }
+        for enc in encodings
+    ]
+
+
+def saved_encodings(encodings: Sequence[FaceEncoding], rows: Sequence) -> List[FaceEncoding]:
+    """Combine the inserted encodings with their RETURNING rows."""
+    return [
+        FaceEncoding(
+            id=row.id,
+            person_id=enc.person_id,
+            encoding=enc.encoding,
+            image_path=enc.image_path,
+            created_at=row.created_at
+        )
+        for enc, row in zip(encodings, rows)
+    ]
+
+
+def encoding_delete_query(encoding_ids: Sequence[int]) -> Delete:
+    return delete(FaceEncodingDB).where(FaceEncodingDB.id.in_(encoding_ids)).returning(
+        FaceEncodingDB.id,
+        FaceEncodingDB.person_id
+    )
+
+
+def encoding_tombstone_params(deleted_rows: Sequence) -> List[Dict[str, Any]]:
+    """Tombstones for single deleted encodings, so other workers drop them from their galleries."""
+    return [{"person_id": row.person_id, "encoding_id": row.id} for row in deleted_rows]
+
+
+def encoding_matrix_query() -> Select:
+    return select(
+        FaceEncodingDB.id,
+        FaceEncodingDB.person_id,
+        FaceEncodingDB.encoding
+    ).order_by(FaceEncodingDB.id)
+
+
+def encoding_matrix(rows: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    encoding_ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+    person_ids = np.fromiter((row.person_id for row in rows), dtype=np.int64, count=len(rows))
+    return encoding_ids, person_ids, decode_encodings([row.encoding for row in rows])
+
+
+def encoding_count_query() -> Select:
+    return select(func.count()).select_from(FaceEncodingDB)
+
+
+def sync_position_queries() -> Tuple[Select, Select]:
+    """Statements for the current heads of the encoding and tombstone streams."""
+    return (
+        select(
+            func.coalesce(func.max(FaceEncodingDB.id), 0).label("id"),
+            func.max(FaceEncodingDB.created_at).label("created_at")
+        ),
+        select(
+            func.coalesce(func.max(PersonTombstoneDB.id), 0).label("id"),
+            func.max(PersonTombstoneDB.deleted_at).label("deleted_at")
+        )
+    )
+
+
+def sync_position(encoding_head, tombstone_head) -> SyncWatermark:
+    return SyncWatermark(
+        encoding_id=encoding_head.id,
+        encoding_created_at=encoding_head.created_at,
+        tombstone_id=tombstone_head.id,
+        tombstone_deleted_at=tombstone_head.deleted_at
+    )
+
+
+def encoding_delta_queries(since: SyncWatermark, overlap_seconds: float) -> Tuple[Select, Select]:
+    """
+    Statements for the tombstones and encodings changed since a watermark.
+
+    Besides everything past the id cursors, a short window before the time
+    cursors is re-read: ids are allocated before commit, so a concurrent
+    writer can commit a lower id late.
+    """
+    overlap = timedelta(seconds=overlap_seconds)
+    tombstones = select(
+        PersonTombstoneDB.id,
+        PersonTombstoneDB.person_id,
+        PersonTombstoneDB.encoding_id,
+        PersonTombstoneDB.deleted_at
+    )
+    encodings = select(
+        FaceEncodingDB.id,
+        FaceEncodingDB.person_id,
+        FaceEncodingDB.encoding,
+        FaceEncodingDB.created_at
+    ).order_by(FaceEncodingDB.id)
+
+    if since.is_initial:
+        # Cold start: earlier deletions are already reflected in the encodings,
+        # only the latest tombstone is needed to position the cursor
+        return tombstones.order_by(PersonTombstoneDB.id.desc()).limit(1), encodings
+
+    condition = PersonTombstoneDB.id > since.tombstone_id
+    if since.tombstone_deleted_at is not None:
+        condition = or_(condition, PersonTombstoneDB.deleted_at >= since.tombstone_deleted_at - overlap)
+    tombstones = tombstones.where(condition).order_by(PersonTombstoneDB.id)
+
+    condition = FaceEncodingDB.id > since.encoding_id
+    if since.encoding_created_at is not None:
+        condition = or_(condition, FaceEncodingDB.created_at >= since.encoding_created_at - overlap)
+    return tombstones, encodings.where(condition)
+
+
+def build_encoding_delta(since: SyncWatermark, tombstone_rows: Sequence, encoding_rows: Sequence) -> EncodingDelta:
+    encoding_ids, person_ids, encodings = encoding_matrix(encoding_rows)
+
+    watermark = SyncWatermark(
+        encoding_id=max([since.encoding_id] + [row.id for row in encoding_rows]),
+        encoding_created_at=max(
+            filter(None, [since.encoding_created_at] + [row.created_at for row in encoding_rows]),
+            default=None
+        ),
+        tombstone_id=max([since.tombstone_id] + [row.id for row in tombstone_rows]),
+        tombstone_deleted_at=max(
+            filter(None, [since.tombstone_deleted_at] + [row.deleted_at for row in tombstone_rows]),
+            default=None
+        )
+    )
+
+    # Cold start: earlier deletions are already reflected in the encodings read
+    deletions = [] if since.is_initial else tombstone_rows
+    return EncodingDelta(
+        encoding_ids=encoding_ids,
+        person_ids=person_ids,
+        encodings=encodings,
+        deleted_person_ids=sorted({row.person_id for row in deletions if row.encoding_id is None}),
+        watermark=watermark,
+        deleted_encoding_ids=sorted({row.encoding_id for row in deletions if row.encoding_id is not None})
+    )
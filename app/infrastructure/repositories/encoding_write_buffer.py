@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.core.exceptions import PersistenceError
+from app.domain.interfaces.face_repository_interface import IFaceRepository
+from app.domain.models import FaceEncoding
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingWriteBuffer:
+    """
+    Write-behind buffer that groups encoding inserts from many messages.
+
+    Callers await ``save`` until the batch holding their rows is committed,
+    so a message is only acknowledged once its encodings are durable. While
+    one batch is being written the next one accumulates (group commit); an
+    optional ``flush_interval`` lingers a little to build larger batches,
+    bounding the added latency.
+    """
+
+    def __init__(
+            self,
+            repository: IFaceRepository,
+            max_batch: int = 256,
+            flush_interval: float = 0.0
+    ):
+        self.repository = repository
+        self.max_batch = max(max_batch, 1)
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[FaceEncoding, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rows = 0
+        self.failures = 0
+
+    async def save(self, encoding: FaceEncoding) -> FaceEncoding:
+        """Queue one encoding and wait until it is committed."""
+        return (await self.save_many([encoding]))[0]
+
+    async def save_many(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        """Queue encodings and wait until all of them are committed."""
+        if not encodings:
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for encoding in encodings:
+            future = loop.create_future()
+            self._pending.append((encoding, future))
+            futures.append(future)
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_pending())
+
+        return list(await asyncio.gather(*futures))
+
+    async def close(self):
+        """Write out whatever is still queued."""
+        if self._flusher is not None:
+            await self._flusher
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "failures": self.failures,
+            "rows_per_flush": self.rows / self.flushes if self.flushes else 0.0
+        }
+
+    async def _flush_pending(self):
+        while self._pending:
+            if self.flush_interval and len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[FaceEncoding, asyncio.Future]]):
+        try:
+            saved = await self.repository.save_face_encodings([encoding for encoding, _ in batch])
+        except Exception as e:
+            # Nothing of this batch was committed; every waiting message must not be acked
+            self.failures += 1
+            logger.error(f"Failed to write {len(batch)} buffered encodings: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(PersistenceError(f"Encoding write failed: {e}"))
+            return
+
+        self.flushes += 1
+        self.rows += len(saved)
+        for (_, future), encoding in zip(batch, saved):
+            if not future.done():
+                future.set_result(encoding)
@@ -1,10 +1,25 @@
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
 import numpy as np
-import pickle
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.domain.interfaces.face_repository_interface import IFaceRepository
-from app.domain.models import Person, FaceEncoding
-from app.infrastructure.database.models import PersonDB, FaceEncodingDB
+from app.domain.models import Person, FaceEncoding, SyncWatermark, EncodingDelta
+from app.infrastructure.database.models import PersonDB, FaceEncodingDB, PersonTombstoneDB
+from app.infrastructure.repositories.encoding_format import encode_encoding, decode_encodings
+from app.infrastructure.repositories.encoding_queries import (
+    encoding_insert_query,
+    encoding_insert_params,
+    saved_encodings,
+    encoding_matrix_query,
+    encoding_matrix,
+    encoding_count_query,
+    sync_position_queries,
+    sync_position,
+    encoding_delta_queries,
+    build_encoding_delta,
+    encoding_delete_query,
+    encoding_tombstone_params
+)
 
 
 class FaceRepository(IFaceRepository):
@@ -36,6 +51,21 @@ class FaceRepository(IFaceRepository):
             updated_at=db_person.updated_at
         )
 
+    async def get_persons_by_ids(self, person_ids: List[int]) -> List[Person]:
+        if not person_ids:
+            return []
+
+        db_persons = self.db.query(PersonDB).filter(PersonDB.id.in_(person_ids)).all()
+        return [
+            Person(
+                id=p.id,
+                name=p.name,
+                created_at=p.created_at,
+                updated_at=p.updated_at
+            )
+            for p in db_persons
+        ]
+
     async def get_person_by_name(self, name: str) -> Optional[Person]:
         db_person = self.db.query(PersonDB).filter(PersonDB.name == name).first()
         if not db_person:
@@ -66,8 +96,8 @@ class FaceRepository(IFaceRepository):
             encoding: np.ndarray,
             image_path: str
     ) -> FaceEncoding:
-        # Serialize numpy array to binary
-        encoding_binary = pickle.dumps(encoding)
+        # Serialize as tagged raw float32
+        encoding_binary = encode_encoding(encoding)
 
         db_encoding = FaceEncodingDB(
             person_id=person_id,
@@ -86,24 +116,50 @@ class FaceRepository(IFaceRepository):
             created_at=db_encoding.created_at
         )
 
+    async def save_face_encodings(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        if not encodings:
+            return []
+
+        rows = self.db.execute(encoding_insert_query(), encoding_insert_params(encodings)).all()
+        self.db.commit()
+        return saved_encodings(encodings, rows)
+
     async def get_all_face_encodings(self) -> List[FaceEncoding]:
         db_encodings = self.db.query(FaceEncodingDB).all()
-        encodings = []
-
-        for db_enc in db_encodings:
-            # Deserialize numpy array from binary
-            encoding_array = pickle.loads(db_enc.encoding)
-            encodings.append(
-                FaceEncoding(
-                    id=db_enc.id,
-                    person_id=db_enc.person_id,
-                    encoding=encoding_array,
-                    image_path=db_enc.image_path,
-                    created_at=db_enc.created_at
-                )
+        matrix = decode_encodings([db_enc.encoding for db_enc in db_encodings])
+
+        return [
+            FaceEncoding(
+                id=db_enc.id,
+                person_id=db_enc.person_id,
+                encoding=encoding_array,
+                image_path=db_enc.image_path,
+                created_at=db_enc.created_at
             )
+            for db_enc, encoding_array in zip(db_encodings, matrix)
+        ]
+
+    async def count_face_encodings(self) -> int:
+        return self.db.execute(encoding_count_query()).scalar_one()
 
-        return encodings
+    async def iter_encoding_chunks(self, chunk_size: int = 10000) -> AsyncIterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # yield_per streams through a server-side cursor instead of buffering the whole result
+        result = self.db.execute(encoding_matrix_query().execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            yield encoding_matrix(rows)
+
+    async def get_sync_position(self) -> SyncWatermark:
+        encoding_query, tombstone_query = sync_position_queries()
+        tombstone_head = self.db.execute(tombstone_query).one()
+        encoding_head = self.db.execute(encoding_query).one()
+        return sync_position(encoding_head, tombstone_head)
+
+    async def get_encoding_delta(self, since: SyncWatermark, overlap_seconds: float = 60.0) -> EncodingDelta:
+        # Tombstones first: a deletion racing with the encoding read is then picked up next time
+        tombstone_query, encoding_query = encoding_delta_queries(since, overlap_seconds)
+        tombstone_rows = self.db.execute(tombstone_query).all()
+        encoding_rows = self.db.execute(encoding_query).all()
+        return build_encoding_delta(since, tombstone_rows, encoding_rows)
 
     async def delete_person(self, person_id: int) -> bool:
         db_person = self.db.query(PersonDB).filter(PersonDB.id == person_id).first()
@@ -111,5 +167,16 @@ class FaceRepository(IFaceRepository):
             return False
 
         self.db.delete(db_person)
+        self.db.add(PersonTombstoneDB(person_id=person_id))
+        self.db.commit()
+        return True
+
+    async def delete_face_encodings(self, encoding_ids: List[int]) -> int:
+        if not encoding_ids:
+            return 0
+
+        deleted = self.db.execute(encoding_delete_query(encoding_ids)).all()
+        if deleted:
+            self.db.execute(insert(PersonTombstoneDB), encoding_tombstone_params(deleted))
         self.db.commit()
-        return True
\ No newline at end of file
+        return len(deleted)
\ No newline at end of file
@@ -0,0 +1,305 @@
+import asyncio
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Optional, List, Tuple
+import numpy as np
+from app.domain.interfaces.face_repository_interface import IFaceRepository
+from app.domain.models import Person, FaceEncoding, SyncWatermark, EncodingDelta
+from app.infrastructure.repositories.encoding_format import encode_encoding, decode_encodings
+from app.infrastructure.repositories.encoding_queries import encoding_matrix, sync_position, build_encoding_delta
+
+# Timestamps are stored as ISO-8601 text, which sorts chronologically.
+# AUTOINCREMENT keeps ids of deleted rows from being reused, which the sync cursors rely on.
+sqlite3.register_converter("ISOTIME", lambda value: datetime.fromisoformat(value.decode()))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    created_at ISOTIME NOT NULL,
+    updated_at ISOTIME NOT NULL
+);
+CREATE TABLE IF NOT EXISTS face_encodings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    person_id INTEGER NOT NULL REFERENCES persons(id) ON DELETE CASCADE,
+    encoding BLOB NOT NULL,
+    image_path TEXT,
+    created_at ISOTIME NOT NULL
+);
+CREATE TABLE IF NOT EXISTS person_tombstones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    person_id INTEGER NOT NULL,
+    encoding_id INTEGER,
+    deleted_at ISOTIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_face_encodings_person_id ON face_encodings(person_id);
+CREATE INDEX IF NOT EXISTS idx_face_encodings_created_at ON face_encodings(created_at);
+CREATE INDEX IF NOT EXISTS idx_person_tombstones_deleted_at ON person_tombstones(deleted_at);
+"""
+
+# Statements are kept constant so sqlite3's statement cache reuses the prepared versions
+INSERT_PERSON = "INSERT INTO persons (name, created_at, updated_at) VALUES (?, ?, ?)"
+SELECT_PERSON_BY_ID = "SELECT id, name, created_at, updated_at FROM persons WHERE id = ?"
+SELECT_PERSON_BY_NAME = "SELECT id, name, created_at, updated_at FROM persons WHERE name = ?"
+SELECT_PERSONS = "SELECT id, name, created_at, updated_at FROM persons"
+INSERT_ENCODING = "INSERT INTO face_encodings (person_id, encoding, image_path, created_at) VALUES (?, ?, ?, ?)"
+SELECT_ENCODINGS = "SELECT id, person_id, encoding, image_path, created_at FROM face_encodings"
+SELECT_ENCODING_MATRIX = "SELECT id, person_id, encoding FROM face_encodings ORDER BY id"
+COUNT_ENCODINGS = "SELECT COUNT(*) AS count FROM face_encodings"
+ENCODING_HEAD = "SELECT COALESCE(MAX(id), 0) AS id, MAX(created_at) AS \"created_at [ISOTIME]\" FROM face_encodings"
+TOMBSTONE_HEAD = "SELECT COALESCE(MAX(id), 0) AS id, MAX(deleted_at) AS \"deleted_at [ISOTIME]\" FROM person_tombstones"
+SELECT_LAST_TOMBSTONE = "SELECT id, person_id, encoding_id, deleted_at FROM person_tombstones ORDER BY id DESC LIMIT 1"
+SELECT_TOMBSTONES_SINCE = (
+    "SELECT id, person_id, encoding_id, deleted_at FROM person_tombstones "
+    "WHERE id > ? OR deleted_at >= ? ORDER BY id"
+)
+SELECT_ENCODINGS_SINCE = (
+    "SELECT id, person_id, encoding, created_at FROM face_encodings "
+    "WHERE id > ? OR created_at >= ? ORDER BY id"
+)
+SELECT_ENCODING_OWNER = "SELECT id, person_id FROM face_encodings WHERE id = ?"
+DELETE_ENCODING = "DELETE FROM face_encodings WHERE id = ?"
+DELETE_ENCODINGS_OF_PERSON = "DELETE FROM face_encodings WHERE person_id = ?"
+DELETE_PERSON = "DELETE FROM persons WHERE id = ?"
+INSERT_TOMBSTONE = "INSERT INTO person_tombstones (person_id, encoding_id, deleted_at) VALUES (?, ?, ?)"
+
+
+@lru_cache(maxsize=64)
+def _row_type(fields: Tuple[str, ...]):
+    return namedtuple("Row", fields)
+
+
+def _named_row(cursor: sqlite3.Cursor, row: tuple):
+    # Attribute access, like SQLAlchemy rows, so the shared row helpers work unchanged
+    return _row_type(tuple(column[0] for column in cursor.description))(*row)
+
+
+def _window_start(cursor: Optional[datetime], overlap: timedelta) -> str:
+    # Without a time cursor there is no window: "~" sorts after every ISO timestamp
+    return (cursor - overlap).isoformat() if cursor else "~"
+
+
+class SqliteFaceRepository(IFaceRepository):
+    """
+    Embedded IFaceRepository on a single SQLite file.
+
+    For single-node deployments and local benchmarks: WAL journaling so
+    reads never wait for the writer, a memory-mapped page cache, encodings
+    as BLOBs in the same tagged float32 format, and no network hop. All
+    calls run on one dedicated thread that owns the connection, keeping
+    the event loop free.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            mmap_size: int = 256 * 1024 * 1024,
+            synchronous: str = "NORMAL",
+            busy_timeout: float = 5.0
+    ):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-repository")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    async def create_person(self, name: str) -> Person:
+        def create(db: sqlite3.Connection) -> Person:
+            now = datetime.utcnow()
+            with db:
+                cursor = db.execute(INSERT_PERSON, (name, now.isoformat(), now.isoformat()))
+            return Person(id=cursor.lastrowid, name=name, created_at=now, updated_at=now)
+
+        return await self._run_with_db(create)
+
+    async def get_person_by_id(self, person_id: int) -> Optional[Person]:
+        row = await self._fetch_one(SELECT_PERSON_BY_ID, (person_id,))
+        return self._to_person(row) if row else None
+
+    async def get_persons_by_ids(self, person_ids: List[int]) -> List[Person]:
+        if not person_ids:
+            return []
+
+        placeholders = ", ".join("?" * len(person_ids))
+        rows = await self._fetch_all(f"{SELECT_PERSONS} WHERE id IN ({placeholders})", tuple(person_ids))
+        return [self._to_person(row) for row in rows]
+
+    async def get_person_by_name(self, name: str) -> Optional[Person]:
+        row = await self._fetch_one(SELECT_PERSON_BY_NAME, (name,))
+        return self._to_person(row) if row else None
+
+    async def get_all_persons(self) -> List[Person]:
+        return [self._to_person(row) for row in await self._fetch_all(SELECT_PERSONS)]
+
+    async def save_face_encoding(
+            self,
+            person_id: int,
+            encoding: np.ndarray,
+            image_path: str
+    ) -> FaceEncoding:
+        saved = await self.save_face_encodings([
+            FaceEncoding(person_id=person_id, encoding=encoding, image_path=image_path)
+        ])
+        return saved[0]
+
+    async def save_face_encodings(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        if not encodings:
+            return []
+
+        def save(db: sqlite3.Connection) -> List[FaceEncoding]:
+            now = datetime.utcnow()
+            saved = []
+            # One transaction, so one WAL sync for the whole batch
+            with db:
+                for enc in encodings:
+                    cursor = db.execute(
+                        INSERT_ENCODING,
+                        (enc.person_id, encode_encoding(enc.encoding), enc.image_path, now.isoformat())
+                    )
+                    saved.append(FaceEncoding(
+                        id=cursor.lastrowid,
+                        person_id=enc.person_id,
+                        encoding=enc.encoding,
+                        image_path=enc.image_path,
+                        created_at=now
+                    ))
+            return saved
+
+        return await self._run_with_db(save)
+
+    async def get_all_face_encodings(self) -> List[FaceEncoding]:
+        rows = await self._fetch_all(SELECT_ENCODINGS)
+        matrix = decode_encodings([row.encoding for row in rows])
+        return [
+            FaceEncoding(
+                id=row.id,
+                person_id=row.person_id,
+                encoding=encoding_array,
+                image_path=row.image_path,
+                created_at=row.created_at
+            )
+            for row, encoding_array in zip(rows, matrix)
+        ]
+
+    async def count_face_encodings(self) -> int:
+        return (await self._fetch_one(COUNT_ENCODINGS)).count
+
+    async def iter_encoding_chunks(self, chunk_size: int = 10000) -> AsyncIterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        cursor = await self._run_with_db(lambda db: db.execute(SELECT_ENCODING_MATRIX))
+        try:
+            while True:
+                rows = await self._run(cursor.fetchmany, chunk_size)
+                if not rows:
+                    break
+                yield encoding_matrix(rows)
+        finally:
+            await self._run(cursor.close)
+
+    async def get_sync_position(self) -> SyncWatermark:
+        def position(db: sqlite3.Connection) -> SyncWatermark:
+            tombstone_head = db.execute(TOMBSTONE_HEAD).fetchone()
+            encoding_head = db.execute(ENCODING_HEAD).fetchone()
+            return sync_position(encoding_head, tombstone_head)
+
+        return await self._run_with_db(position)
+
+    async def get_encoding_delta(self, since: SyncWatermark, overlap_seconds: float = 60.0) -> EncodingDelta:
+        overlap = timedelta(seconds=overlap_seconds)
+
+        def delta(db: sqlite3.Connection) -> EncodingDelta:
+            # Same cursors and overlap window as the SQLAlchemy repositories, tombstones first
+            if since.is_initial:
+                tombstone_rows = db.execute(SELECT_LAST_TOMBSTONE).fetchall()
+            else:
+                tombstone_rows = db.execute(SELECT_TOMBSTONES_SINCE, (
+                    since.tombstone_id,
+                    _window_start(since.tombstone_deleted_at, overlap)
+                )).fetchall()
+            encoding_rows = db.execute(SELECT_ENCODINGS_SINCE, (
+                since.encoding_id,
+                _window_start(since.encoding_created_at, overlap)
+            )).fetchall()
+            return build_encoding_delta(since, tombstone_rows, encoding_rows)
+
+        return await self._run_with_db(delta)
+
+    async def delete_person(self, person_id: int) -> bool:
+        def delete(db: sqlite3.Connection) -> bool:
+            with db:
+                db.execute(DELETE_ENCODINGS_OF_PERSON, (person_id,))
+                deleted = db.execute(DELETE_PERSON, (person_id,)).rowcount
+                if deleted:
+                    db.execute(INSERT_TOMBSTONE, (person_id, None, datetime.utcnow().isoformat()))
+            return bool(deleted)
+
+        return await self._run_with_db(delete)
+
+    async def delete_face_encodings(self, encoding_ids: List[int]) -> int:
+        if not encoding_ids:
+            return 0
+
+        def delete(db: sqlite3.Connection) -> int:
+            deleted_at = datetime.utcnow().isoformat()
+            deleted = 0
+            with db:
+                for encoding_id in encoding_ids:
+                    row = db.execute(SELECT_ENCODING_OWNER, (encoding_id,)).fetchone()
+                    if row is None:
+                        continue
+                    db.execute(DELETE_ENCODING, (encoding_id,))
+                    db.execute(INSERT_TOMBSTONE, (row.person_id, encoding_id, deleted_at))
+                    deleted += 1
+            return deleted
+
+        return await self._run_with_db(delete)
+
+    async def _fetch_one(self, sql: str, parameters: tuple = ()):
+        return await self._run_with_db(lambda db: db.execute(sql, parameters).fetchone())
+
+    async def _fetch_all(self, sql: str, parameters: tuple = ()) -> list:
+        return await self._run_with_db(lambda db: db.execute(sql, parameters).fetchall())
+
+    async def _run_with_db(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await self._run(lambda: operation(self._db()))
+
+    async def _run(self, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _db(self) -> sqlite3.Connection:
+        # Only ever called on the repository thread, which owns the connection
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                cached_statements=256
+            )
+            db.row_factory = _named_row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"PRAGMA synchronous={self.synchronous}")
+            db.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            db.execute("PRAGMA foreign_keys=ON")
+            db.executescript(SCHEMA)
+            self._connection = db
+        return self._connection
+
+    @staticmethod
+    def _to_person(row) -> Person:
+        return Person(
+            id=row.id,
+            name=row.name,
+            created_at=row.created_at,
+            updated_at=row.updated_at
+        )
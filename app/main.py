@@ -3,14 +3,32 @@ import logging
 import signal
 import sys
 from app.config import get_settings
-from app.infrastructure.database.connection import engine, SessionLocal
+from app.infrastructure.database.connection import engine
+from app.infrastructure.database.async_connection import (
+    create_async_database_engine,
+    create_async_session_factory,
+    PoolMetrics
+)
 from app.infrastructure.database.models import Base
-from app.infrastructure.rabbitmq import RabbitMQConnection, RabbitMQConsumer, RabbitMQPublisher
+from app.infrastructure.rabbitmq import (
+    RabbitMQConnection,
+    RabbitMQConsumer,
+    RabbitMQPublisher,
+    GalleryChangeFeed
+)
 from app.infrastructure.rabbitmq.handlers import EventHandlers
 from app.services.face_service import FaceService
-from app.infrastructure.repositories.face_repository import FaceRepository
+from app.infrastructure.repositories.async_face_repository import AsyncFaceRepository
+from app.infrastructure.repositories.sqlite_face_repository import SqliteFaceRepository
+from app.infrastructure.repositories.encoding_write_buffer import EncodingWriteBuffer
 from app.infrastructure.storage.file_storage import FileStorage
 from app.services.face_recognition_engine import FaceRecognitionEngine
+from app.services.encoding_pool import EncodingWorkerPool
+from app.services.encoding_cache import EncodingCache
+from app.services.near_duplicate_index import NearDuplicateIndex
+from app.services.person_cache import PersonCache
+from app.services.gallery_snapshot import GallerySnapshotCache
+from app.services.gallery_file_snapshot import GalleryFileSnapshot
 import redis
 
 # Configure logging
@@ -28,15 +46,22 @@ class FaceRecognitionWorker:
         self.rabbitmq_connection = None
         self.rabbitmq_consumer = None
         self.rabbitmq_publisher = None
+        self.encoding_pool = None
+        self.async_engine = None
+        self.repository = None
+        self.write_buffer = None
+        self.face_service = None
+        self.change_feed = None
         self.shutdown_event = asyncio.Event()
 
     async def setup(self):
         """Initialize all services and connections."""
         logger.info("Initializing Face Recognition Worker...")
 
-        # Create database tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
+        # Create database tables (the embedded repository creates its own schema)
+        if settings.repository_backend != "sqlite":
+            Base.metadata.create_all(bind=engine)
+            logger.info("Database tables created successfully")
 
         # Initialize RabbitMQ
         self.rabbitmq_connection = RabbitMQConnection()
@@ -46,17 +71,55 @@ class FaceRecognitionWorker:
         # Create publisher
         self.rabbitmq_publisher = RabbitMQPublisher(self.rabbitmq_connection)
 
-        # Create consumer
-        self.rabbitmq_consumer = RabbitMQConsumer(self.rabbitmq_connection)
-
         # Initialize services
-        db = SessionLocal()
-        repository = FaceRepository(db)
+        if settings.repository_backend == "sqlite":
+            self.repository = SqliteFaceRepository(
+                settings.sqlite_path,
+                mmap_size=settings.sqlite_mmap_size,
+                synchronous=settings.sqlite_synchronous
+            )
+        else:
+            self.async_engine = create_async_database_engine()
+            self.repository = AsyncFaceRepository(
+                create_async_session_factory(self.async_engine),
+                pool_metrics=PoolMetrics(self.async_engine)
+            )
+        if settings.encoding_write_max_batch:
+            self.write_buffer = EncodingWriteBuffer(
+                self.repository,
+                max_batch=settings.encoding_write_max_batch,
+                flush_interval=settings.encoding_write_flush_interval
+            )
         storage = FileStorage(settings.upload_path)
-        recognition_engine = FaceRecognitionEngine(
-            tolerance=settings.face_tolerance,
-            model=settings.face_encoding_model
+        engine_options = {
+            "tolerance": settings.face_tolerance,
+            "model": settings.face_encoding_model,
+            "detection_max_dimension": settings.face_detection_max_dimension,
+            "decode_max_dimension": settings.face_decode_max_dimension
+        }
+        recognition_engine = FaceRecognitionEngine(**engine_options)
+
+        # Move detection/encoding off the event loop if configured
+        if settings.encoding_workers:
+            self.encoding_pool = EncodingWorkerPool(
+                workers=settings.encoding_workers,
+                engine_options=engine_options,
+                max_pending=settings.encoding_max_pending,
+                task_timeout=settings.encoding_task_timeout
+            )
+            self.encoding_pool.start()
+
+        # Create consumer; concurrency only pays off for CPU work when it runs in the pool
+        concurrency = settings.rabbitmq_concurrency
+        if concurrency <= 0:
+            concurrency = 2 * self.encoding_pool.workers if self.encoding_pool else 1
+        self.rabbitmq_consumer = RabbitMQConsumer(
+            self.rabbitmq_connection,
+            concurrency=concurrency,
+            batch_size=settings.rabbitmq_batch_size,
+            batch_linger=settings.rabbitmq_batch_linger_ms / 1000
         )
+        logger.info(f"Handling up to {concurrency} messages at once")
 
         # Initialize Redis if configured
         redis_client = None
@@ -67,20 +130,78 @@ class FaceRecognitionWorker:
                 logger.info("Connected to Redis")
             except Exception as e:
                 logger.warning(f"Could not connect to Redis: {e}")
+        if redis_client is None:
+            if settings.gallery_poll_interval > 0:
+                logger.info(f"No Redis: polling the database for gallery changes every {settings.gallery_poll_interval}s")
+            else:
+                logger.warning("No Redis and gallery polling is off: changes by other workers will not be seen")
+
+        encoding_cache = None
+        if settings.encoding_cache_size:
+            encoding_cache = EncodingCache(
+                max_entries=settings.encoding_cache_size,
+                redis_client=redis_client,
+                redis_ttl=settings.encoding_cache_redis_ttl
+            )
+
+        near_duplicate_index = None
+        if settings.near_duplicate_window:
+            near_duplicate_index = NearDuplicateIndex(
+                window=settings.near_duplicate_window,
+                max_distance=settings.near_duplicate_max_distance
+            )
+
+        person_cache = None
+        if settings.person_cache_size:
+            person_cache = PersonCache(
+                max_entries=settings.person_cache_size,
+                ttl=settings.person_cache_ttl
+            )
+
+        snapshot_cache = None
+        if redis_client and settings.gallery_snapshot_ttl:
+            snapshot_cache = GallerySnapshotCache(
+                redis_client,
+                chunk_size=settings.gallery_snapshot_chunk_size,
+                ttl=settings.gallery_snapshot_ttl,
+                refresh_versions=settings.gallery_snapshot_refresh_versions
+            )
+
+        file_snapshot = None
+        if settings.gallery_snapshot_dir:
+            file_snapshot = GalleryFileSnapshot(
+                settings.gallery_snapshot_dir,
+                refresh_versions=settings.gallery_snapshot_refresh_versions
+            )
+
+        # Replicas share gallery changes over a fanout exchange, sequenced by the Redis version counter
+        if redis_client and settings.gallery_change_feed:
+            self.change_feed = GalleryChangeFeed(self.rabbitmq_connection)
 
         # Create face service
-        face_service = FaceService(
-            repository=repository,
+        self.face_service = face_service = FaceService(
+            repository=self.repository,
             storage=storage,
             recognition_engine=recognition_engine,
-            redis_client=redis_client
+            redis_client=redis_client,
+            encoding_pool=self.encoding_pool,
+            encoding_cache=encoding_cache,
+            near_duplicate_index=near_duplicate_index,
+            write_buffer=self.write_buffer,
+            person_cache=person_cache,
+            snapshot_cache=snapshot_cache,
+            file_snapshot=file_snapshot,
+            change_feed=self.change_feed
         )
+        if self.change_feed:
+            await self.change_feed.start(face_service.apply_change)
 
         # Create event handlers
         event_handlers = EventHandlers(face_service, self.rabbitmq_publisher)
 
         # Register handlers
         self.rabbitmq_consumer.register_handler("image.received", event_handlers.handle_image_received)
+        self.rabbitmq_consumer.register_batch_handler("image.received", event_handlers.handle_image_received_batch)
 
         logger.info("Worker setup completed")
 
@@ -93,16 +214,28 @@ class FaceRecognitionWorker:
 
             # Start consuming messages
             consumer_task = asyncio.create_task(self.rabbitmq_consumer.start_consuming())
+            tasks = [consumer_task]
+            if settings.gallery_compaction_interval > 0 and settings.gallery_max_encodings_per_person:
+                tasks.append(asyncio.create_task(self.compact_periodically()))
 
             # Wait for shutdown signal
             await self.shutdown_event.wait()
 
-            # Cancel consumer task
+            # Stop taking messages, then let the ones in flight finish
             consumer_task.cancel()
             try:
                 await consumer_task
             except asyncio.CancelledError:
                 pass
+            await self.rabbitmq_consumer.drain(settings.rabbitmq_drain_timeout)
+
+            # Cancel background tasks
+            for task in tasks:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
 
         except Exception as e:
             logger.error(f"Worker error: {e}")
@@ -110,13 +243,45 @@ class FaceRecognitionWorker:
         finally:
             await self.cleanup()
 
+    async def compact_periodically(self):
+        """Prune the gallery back to the per-person retention cap at a fixed interval."""
+        interval = settings.gallery_compaction_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.face_service.compact_gallery()
+            except Exception as e:
+                logger.error(f"Gallery compaction failed: {e}")
+
     async def cleanup(self):
         """Clean up resources."""
         logger.info("Cleaning up...")
 
+        if self.change_feed:
+            await self.change_feed.stop()
+
+        if self.face_service:
+            await self.face_service.close()
+
+        if self.rabbitmq_consumer and self.rabbitmq_consumer.batches:
+            logger.info(f"Message batches: {self.rabbitmq_consumer.stats()}")
+
         if self.rabbitmq_connection:
             await self.rabbitmq_connection.disconnect()
 
+        if self.encoding_pool:
+            self.encoding_pool.shutdown()
+
+        if self.write_buffer:
+            await self.write_buffer.close()
+
+        if self.async_engine:
+            logger.info(f"Database pool: {self.repository.pool_stats()}")
+            await self.async_engine.dispose()
+
+        if isinstance(self.repository, SqliteFaceRepository):
+            await self.repository.close()
+
         logger.info("Cleanup completed")
 
     def handle_shutdown(self, signum, frame):
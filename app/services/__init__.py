@@ -1,5 +1,6 @@
 """Services module containing business logic implementations."""
 from app.services.face_service import FaceService
 from app.services.face_recognition_engine import FaceRecognitionEngine
+from app.services.face_gallery import FaceGallery
 
-__all__ = ["FaceService", "FaceRecognitionEngine"]
\ No newline at end of file
+__all__ = ["FaceService", "FaceRecognitionEngine", "FaceGallery"]
\ No newline at end of file
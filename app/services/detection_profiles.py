@@ -0,0 +1,48 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+
+@dataclass(frozen=True)
+class DetectionProfile:
+    """
+    Speed/accuracy trade-off for face extraction.
+
+    ``steps`` are (detector model, upsample count) pairs tried in order; the
+    next, more expensive step only runs when the previous one found nothing.
+    """
+    name: str
+    steps: Tuple[Tuple[str, int], ...]
+    landmark_model: str = "small"  # 'small' (5 points) or 'large' (68 points)
+    num_jitters: int = 1
+
+
+DETECTION_PROFILES: Dict[str, DetectionProfile] = {
+    profile.name: profile
+    for profile in (
+        DetectionProfile("fast", (("hog", 0), ("hog", 1))),
+        DetectionProfile("balanced", (("hog", 0), ("hog", 1), ("cnn", 0))),
+        DetectionProfile("accurate", (("hog", 1), ("cnn", 1)), landmark_model="large", num_jitters=5),
+    )
+}
+
+
+class DetectionStats:
+    """Counts, per profile, which cascade step produced the faces."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, profile: str, step: int):
+        """Record one image; step is the index of the step that found faces, -1 for none."""
+        counts = self._counts.setdefault(profile, {"images": 0, "escalated": 0, "no_face": 0})
+        counts["images"] += 1
+        if step > 0:
+            counts["escalated"] += 1
+        elif step < 0:
+            counts["no_face"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            profile: dict(counts, escalation_rate=counts["escalated"] / counts["images"])
+            for profile, counts in self._counts.items()
+        }
@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+import redis
+from app.domain.models import DetectedFace
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<4sI")
+_FORMAT_TAG = b"FCE1"
+
+
+class EncodingCache:
+    """
+    Content-addressed cache of extracted faces.
+
+    Keyed by the SHA-256 of the image bytes, so byte-identical redeliveries
+    skip detection and encoding. A bounded in-memory LRU sits in front of an
+    optional Redis tier shared by all workers.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            redis_client: Optional[redis.Redis] = None,
+            redis_ttl: int = 3600,
+            key_prefix: str = "face_extract:"
+    ):
+        self.max_entries = max_entries
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self._entries: "OrderedDict[str, List[DetectedFace]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image_data: bytes) -> str:
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get(self, key: str) -> Optional[List[DetectedFace]]:
+        faces = self._entries.get(key)
+        if faces is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return faces
+
+        if self.redis_client and self.redis_ttl:
+            try:
+                payload = self.redis_client.get(self.key_prefix + key)
+            except redis.RedisError as e:
+                logger.warning(f"Encoding cache lookup failed: {e}")
+                payload = None
+
+            faces = self._deserialize(payload) if payload else None
+            if faces is not None:
+                self._remember(key, faces)
+                self.hits += 1
+                self.redis_hits += 1
+                return faces
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, faces: List[DetectedFace]):
+        self._remember(key, faces)
+
+        if self.redis_client and self.redis_ttl:
+            try:
+                self.redis_client.setex(self.key_prefix + key, self.redis_ttl, self._serialize(faces))
+            except redis.RedisError as e:
+                logger.warning(f"Encoding cache store failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _remember(self, key: str, faces: List[DetectedFace]):
+        self._entries[key] = faces
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _serialize(faces: List[DetectedFace]) -> bytes:
+        locations = np.array([face.location for face in faces], dtype="<i4").reshape(-1, 4)
+        encodings = b"".join(np.asarray(face.encoding, dtype="<f8").tobytes() for face in faces)
+        return _HEADER.pack(_FORMAT_TAG, len(faces)) + locations.tobytes() + encodings
+
+    @staticmethod
+    def _deserialize(payload: bytes) -> Optional[List[DetectedFace]]:
+        try:
+            return EncodingCache._unpack(payload)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable encoding cache entry: {e}")
+            return None
+
+    @staticmethod
+    def _unpack(payload: bytes) -> List[DetectedFace]:
+        tag, count = _HEADER.unpack_from(payload)
+        if tag != _FORMAT_TAG:
+            raise ValueError(f"Unknown encoding cache format: {tag!r}")
+        if count == 0:
+            return []
+
+        offset = _HEADER.size
+        locations = np.frombuffer(payload, dtype="<i4", count=count * 4, offset=offset).reshape(count, 4)
+        offset += locations.nbytes
+        encodings = np.frombuffer(payload, dtype="<f8", offset=offset).reshape(count, -1)
+
+        return [
+            DetectedFace(encoding=encoding.copy(), location=tuple(int(v) for v in location))
+            for location, encoding in zip(locations, encodings)
+        ]
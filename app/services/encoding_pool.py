@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+from app.domain.models import DetectedFace
+from app.services.detection_profiles import DetectionStats
+from app.services.face_recognition_engine import FaceRecognitionEngine
+
+logger = logging.getLogger(__name__)
+
+# Per-process engine, created once by the pool initializer
+_worker_engine: Optional[FaceRecognitionEngine] = None
+
+
+def _init_worker(engine_options: Dict[str, Any]):
+    """Load the dlib models once per worker process."""
+    global _worker_engine
+    _worker_engine = FaceRecognitionEngine(**engine_options)
+
+
+def _extract_faces(image_data: bytes, profile: Optional[str]) -> Tuple[Optional[List[DetectedFace]], str, int]:
+    resolved = _worker_engine.get_profile(profile).name
+    faces, step = _worker_engine.extract_faces_with_step(image_data, resolved)
+    return faces, resolved, step
+
+
+class EncodingWorkerPool:
+    """
+    Runs face detection/encoding in a pool of worker processes.
+
+    Keeps the asyncio event loop free while dlib works, bounds the number of
+    images queued for the pool, enforces a per-task timeout and replaces the
+    pool when a worker crashes or hangs.
+    """
+
+    def __init__(
+            self,
+            workers: int,
+            engine_options: Optional[Dict[str, Any]] = None,
+            max_pending: int = 0,
+            task_timeout: float = 30.0
+    ):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.engine_options = engine_options or {}
+        self.task_timeout = task_timeout
+        self._pending = asyncio.Semaphore(max_pending or 2 * self.workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = DetectionStats()
+
+    def start(self):
+        """Spawn the worker processes."""
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.engine_options,)
+        )
+        logger.info(f"Started encoding pool with {self.workers} worker processes")
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Encoding pool shut down")
+
+    async def extract_faces(self, image_data: bytes, profile: Optional[str] = None) -> Optional[List[DetectedFace]]:
+        """Extract every face (location and encoding) in a worker process; None if the image could not be processed."""
+        async with self._pending:
+            try:
+                faces, resolved, step = await self._run(image_data, profile)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM kill); retry once on a fresh pool
+                logger.warning("Encoding worker crashed, retrying on a new pool")
+                faces, resolved, step = await self._run(image_data, profile)
+
+        self.stats.record(resolved, step)
+        return faces
+
+    async def _run(self, image_data: bytes, profile: Optional[str]) -> Tuple[Optional[List[DetectedFace]], str, int]:
+        if self._executor is None:
+            self.start()
+
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(executor, _extract_faces, image_data, profile)
+            return await asyncio.wait_for(future, timeout=self.task_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Face encoding timed out after {self.task_timeout}s, restarting pool")
+            self._restart(executor)
+            raise
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def _restart(self, failed: ProcessPoolExecutor):
+        # Concurrent failures on the same pool only trigger one restart
+        if failed is not self._executor:
+            return
+
+        # The executor cannot cancel running tasks, so stuck workers are terminated
+        processes = list((getattr(failed, "_processes", None) or {}).values())
+        failed.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        self.start()
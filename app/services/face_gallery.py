@@ -0,0 +1,338 @@
+import numpy as np
+from typing import Iterable, Iterator, Optional, Tuple
+from app.services.gallery_index import GalleryIndex
+
+ENCODING_DIMENSION = 128
+
+
+class FaceGallery:
+    """
+    In-memory gallery of known face encodings.
+
+    Encodings live in contiguous N x 128 float32 blocks with parallel
+    id / person_id arrays and precomputed squared norms, so matching a probe
+    is a matrix-vector product instead of a Python loop over arrays.
+
+    A gallery adopted from a snapshot keeps the mapped matrix as an
+    immutable base: appended rows go to a separate in-memory delta block and
+    deleted base rows are only masked, so a change never copies the base.
+    Rows are numbered base first, then delta. Rows below ``len(self)`` are
+    never rewritten in place (storage is reallocated instead), so views
+    handed out earlier stay consistent.
+    """
+
+    def __init__(self, capacity: int = 1024, dimension: int = ENCODING_DIMENSION):
+        capacity = max(int(capacity), 1)
+        self.dimension = dimension
+        self._size = 0
+        # Immutable base matrix (a memory map), its live mask and the base row of each gallery row
+        self._base: Optional[np.ndarray] = None
+        self._base_live: Optional[np.ndarray] = None
+        self._base_rows: Optional[np.ndarray] = None
+        self._base_size = 0
+        # Delta block: gallery row r >= _base_size is _matrix[r - _base_size]
+        self._matrix = np.empty((capacity, dimension), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._person_ids = np.empty(capacity, dtype=np.int64)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self.index: Optional[GalleryIndex] = None
+        # Memory-mapped ColdTier holding the rows that are not resident, when tiered
+        self.cold = None
+
+    @classmethod
+    def from_snapshot(
+            cls,
+            ids: np.ndarray,
+            person_ids: np.ndarray,
+            matrix: np.ndarray,
+            sq_norms: np.ndarray
+    ) -> "FaceGallery":
+        """
+        Adopt snapshot arrays (typically read-only memory maps) without
+        copying them. The matrix stays the immutable base; the id and norm
+        columns (20 bytes a row) are copied into memory on the first change.
+        """
+        gallery = cls(capacity=1, dimension=matrix.shape[1])
+        gallery._ids, gallery._person_ids, gallery._sq_norms = ids, person_ids, sq_norms
+        gallery._base = matrix
+        gallery._base_live = np.ones(len(matrix), dtype=bool)
+        gallery._size = gallery._base_size = len(ids)
+        return gallery
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """All rows as one matrix; a view while there is no delta or masked base row, else a copy."""
+        delta = self._matrix[:self._size - self._base_size]
+        if self._base is None:
+            return delta
+        base = self._base_matrix()
+        return base if len(delta) == 0 else np.concatenate([base, delta])
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def person_ids(self) -> np.ndarray:
+        return self._person_ids[:self._size]
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        return self._sq_norms[:self._size]
+
+    @property
+    def total_size(self) -> int:
+        """Rows in this gallery plus the live rows of its cold tier."""
+        return self._size + (len(self.cold) if self.cold is not None else 0)
+
+    def frozen(self) -> "FaceGallery":
+        """
+        Read-only view of the current rows, cheap to take, for readers on
+        another thread (e.g. snapshot publishing); later changes do not show through.
+        """
+        view = FaceGallery(capacity=1, dimension=self.dimension)
+        view._size, view._base_size = self._size, self._base_size
+        view._base, view._base_live, view._base_rows = self._base, self._base_live, self._base_rows
+        view._matrix, view._ids, view._person_ids, view._sq_norms = (
+            self._matrix, self._ids, self._person_ids, self._sq_norms
+        )
+        view.cold = self.cold.frozen() if self.cold is not None else None
+        return view
+
+    def encodings_at(self, rows) -> np.ndarray:
+        """Encodings of the given rows (an index array or a slice), gathered from the base and the delta."""
+        if isinstance(rows, slice):
+            rows = np.arange(self._size, dtype=np.int64)[rows]
+        rows = np.asarray(rows, dtype=np.int64)
+        if self._base_size == 0:
+            return self._matrix[rows]
+
+        in_base = rows < self._base_size
+        if np.all(in_base):
+            return self._base[self._to_base(rows)]
+        encodings = np.empty((len(rows), self.dimension), dtype=np.float32)
+        encodings[in_base] = self._base[self._to_base(rows[in_base])]
+        encodings[~in_base] = self._matrix[rows[~in_base] - self._base_size]
+        return encodings
+
+    def attach_index(self, index: GalleryIndex) -> None:
+        """Attach a candidate index; it is kept in sync with every change."""
+        self.index = index
+        index.on_attach(self)
+
+    def attach_cold(self, cold) -> None:
+        """Attach (or replace) the cold tier; rows already resident are skipped by cold searches."""
+        if self.cold is not None:
+            cold.touch(self.cold.recent_persons())
+        self.cold = cold
+        cold.adopt(self)
+
+    def promote(self, person_ids: Iterable[int]) -> int:
+        """Copy the cold-tier rows of these persons into memory. Returns rows promoted."""
+        if self.cold is None:
+            return 0
+
+        promoted = 0
+        for person_id in person_ids:
+            encoding_ids, owners, encodings = self.cold.take_person(person_id)
+            self.extend(encoding_ids, owners, encodings)
+            promoted += len(encoding_ids)
+        return promoted
+
+    def iter_segments(self, chunk_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Every row, cold tier included, as (ids, person ids, encodings, squared norms) blocks."""
+        if self.cold is not None:
+            yield from self.cold.iter_live(chunk_size)
+        for start in range(0, self._size, chunk_size):
+            end = min(start + chunk_size, self._size)
+            yield (
+                self.ids[start:end],
+                self.person_ids[start:end],
+                self.encodings_at(slice(start, end)),
+                self.sq_norms[start:end]
+            )
+
+    def add(self, encoding_id: int, person_id: int, encoding: np.ndarray) -> int:
+        """Append a single encoding and return its row."""
+        self.extend([encoding_id], [person_id], np.asarray(encoding).reshape(1, -1))
+        return self._size - 1
+
+    def extend(
+            self,
+            encoding_ids: Iterable[int],
+            person_ids: Iterable[int],
+            encodings: np.ndarray
+    ) -> None:
+        """Append a block of encodings to the delta, growing storage geometrically."""
+        block = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dimension)
+        count = block.shape[0]
+        if count == 0:
+            return
+
+        self._reserve(self._size + count)
+        start, end = self._size, self._size + count
+        self._matrix[start - self._base_size:end - self._base_size] = block
+        self._ids[start:end] = np.fromiter(encoding_ids, dtype=np.int64, count=count)
+        self._person_ids[start:end] = np.fromiter(person_ids, dtype=np.int64, count=count)
+        self._sq_norms[start:end] = np.einsum("ij,ij->i", block, block)
+        self._size = end
+
+        if self.index is not None:
+            self.index.on_extend(self, start, end)
+
+    def remove_person(self, person_id: int) -> int:
+        """Drop every encoding of a person. Returns rows removed."""
+        keep = self.person_ids != person_id
+        removed = self._size - int(np.count_nonzero(keep))
+        if removed:
+            self._compact(keep)
+        if self.cold is not None:
+            removed += self.cold.remove_person(person_id)
+        return removed
+
+    def remove_ids(self, encoding_ids: Iterable[int]) -> int:
+        """Drop the given encodings. Returns rows removed."""
+        encoding_ids = np.fromiter(encoding_ids, dtype=np.int64)
+        if len(encoding_ids) == 0:
+            return 0
+
+        removed = self.cold.remove_ids(encoding_ids) if self.cold is not None else 0
+        return removed + self.evict(encoding_ids)
+
+    def evict(self, encoding_ids: Iterable[int]) -> int:
+        """Drop encodings from memory only, leaving the cold tier as it is. Returns rows removed."""
+        encoding_ids = np.fromiter(encoding_ids, dtype=np.int64)
+        if self._size == 0 or len(encoding_ids) == 0:
+            return 0
+
+        keep = ~np.isin(self.ids, encoding_ids)
+        removed = self._size - int(np.count_nonzero(keep))
+        if removed:
+            self._compact(keep)
+        return removed
+
+    def rows_for_person(self, person_id: int) -> np.ndarray:
+        return np.flatnonzero(self.person_ids == person_id)
+
+    def has_ids(self, encoding_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask of the given encoding ids already in the gallery."""
+        encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+        if self.cold is not None:
+            return self._has_resident_ids(encoding_ids) | self.cold.has_ids(encoding_ids)
+        return self._has_resident_ids(encoding_ids)
+
+    def rows_for_ids(self, encoding_ids: np.ndarray) -> np.ndarray:
+        """Map encoding ids to gallery rows, -1 for ids not in the gallery."""
+        encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+        rows = np.full(len(encoding_ids), -1, dtype=np.int64)
+        if self._size == 0:
+            return rows
+
+        ids = self.ids
+        order = np.argsort(ids, kind="stable")
+        positions = np.minimum(np.searchsorted(ids, encoding_ids, sorter=order), self._size - 1)
+        found = ids[order[positions]] == encoding_ids
+        rows[found] = order[positions[found]]
+        return rows
+
+    def distances(self, probe: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Euclidean distances from a probe to all (or the given) rows."""
+        probe = np.asarray(probe, dtype=np.float32).reshape(-1)
+        if rows is None:
+            sq_norms, products = self.sq_norms, self._products(probe.reshape(1, -1))[0]
+        else:
+            sq_norms, products = self._sq_norms[rows], self.encodings_at(rows) @ probe
+
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, one BLAS gemv for the dot products
+        sq = sq_norms + np.dot(probe, probe) - 2.0 * products
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq)
+
+    def distances_batch(self, probes: np.ndarray) -> np.ndarray:
+        """F x N distance matrix from several probes to every row, one BLAS gemm per block."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dimension)
+        sq = (
+            self.sq_norms[None, :]
+            + np.einsum("ij,ij->i", probes, probes)[:, None]
+            - 2.0 * self._products(probes)
+        )
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq)
+
+    def _products(self, probes: np.ndarray) -> np.ndarray:
+        """F x N dot products of the probes with every row, scanning the base and the delta separately."""
+        delta = probes @ self._matrix[:self._size - self._base_size].T
+        if self._base is None:
+            return delta
+
+        # Masked base rows are scanned too; dropping their columns is cheaper than gathering the base
+        base = probes @ self._base.T
+        if self._base_rows is not None:
+            base = base[:, self._base_rows]
+        return np.hstack([base, delta]) if delta.shape[1] else base
+
+    def _base_matrix(self) -> np.ndarray:
+        if self._base_rows is None:
+            return self._base
+        return self._base[self._base_rows]
+
+    def _to_base(self, rows: np.ndarray) -> np.ndarray:
+        return rows if self._base_rows is None else self._base_rows[rows]
+
+    def _has_resident_ids(self, encoding_ids: np.ndarray) -> np.ndarray:
+        if self._size == 0 or len(encoding_ids) == 0:
+            return np.zeros(len(encoding_ids), dtype=bool)
+
+        # New ids are mostly recent ones, so only compare against rows with ids in range
+        ids = self.ids
+        recent = ids[ids >= encoding_ids.min()]
+        return np.isin(encoding_ids, recent)
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._ids.shape[0]
+        if needed > capacity or not self._ids.flags.writeable:
+            new_capacity = max(needed, capacity * 2)
+            for name in ("_ids", "_person_ids", "_sq_norms"):
+                setattr(self, name, self._regrow(getattr(self, name), self._size, new_capacity))
+
+        delta_size, delta_needed = self._size - self._base_size, needed - self._base_size
+        if delta_needed > self._matrix.shape[0]:
+            self._matrix = self._regrow(self._matrix, delta_size, max(delta_needed, self._matrix.shape[0] * 2))
+
+    @staticmethod
+    def _regrow(array: np.ndarray, size: int, capacity: int) -> np.ndarray:
+        grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:size] = array[:size]
+        return grown
+
+    def _compact(self, keep: np.ndarray) -> None:
+        kept = int(np.count_nonzero(keep))
+        base_keep, delta_keep = keep[:self._base_size], keep[self._base_size:]
+
+        # Fresh arrays rather than shifting rows in place, so earlier views stay valid
+        for name in ("_ids", "_person_ids", "_sq_norms"):
+            array = getattr(self, name)
+            compacted = np.empty(max(kept, len(array) - (self._size - kept)), dtype=array.dtype)
+            compacted[:kept] = array[:self._size][keep]
+            setattr(self, name, compacted)
+
+        if self._base is not None and not np.all(base_keep):
+            base_rows = self._to_base(np.arange(self._base_size, dtype=np.int64))
+            self._base_live = self._base_live.copy()
+            self._base_live[base_rows[~base_keep]] = False
+            self._base_rows = np.flatnonzero(self._base_live)
+            self._base_size = len(self._base_rows)
+        if not np.all(delta_keep):
+            matrix = np.empty_like(self._matrix)
+            matrix[:int(np.count_nonzero(delta_keep))] = self._matrix[:len(delta_keep)][delta_keep]
+            self._matrix = matrix
+
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[keep] = np.arange(kept, dtype=np.int64)
+        self._size = kept
+
+        if self.index is not None:
+            self.index.on_remap(self, remap)
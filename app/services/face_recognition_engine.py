@@ -1,76 +1,276 @@
+import logging
 import face_recognition
 import numpy as np
-from typing import Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List, Union
 from PIL import Image
-import io
+from app.domain.models import DetectedFace, PersonCandidate
+from app.services.face_gallery import FaceGallery
+from app.services.detection_profiles import DetectionProfile, DetectionStats, DETECTION_PROFILES
+from app.utils.image_utils import scale_to_max_dimension, decode_image
+
+logger = logging.getLogger(__name__)
 
 
 class FaceRecognitionEngine:
-    def __init__(self, tolerance: float = 0.6, model: str = "hog"):
+    def __init__(
+            self,
+            tolerance: float = 0.6,
+            model: str = "hog",
+            detection_max_dimension: int = 0,
+            decode_max_dimension: int = 0
+    ):
         self.tolerance = tolerance
         self.model = model  # 'hog' or 'cnn'
+        self.detection_max_dimension = detection_max_dimension  # 0 detects at full resolution
+        self.decode_max_dimension = decode_max_dimension  # 0 decodes at full resolution
+        self.stats = DetectionStats()
+
+        # 'default' keeps the configured detector; on a downscaled copy it may upsample once
+        default_steps = ((model, 0), (model, 1)) if detection_max_dimension else ((model, 1),)
+        self.profiles: Dict[str, DetectionProfile] = dict(
+            DETECTION_PROFILES, default=DetectionProfile("default", default_steps)
+        )
+
+    def get_profile(self, name: Optional[str] = None) -> DetectionProfile:
+        """Resolve a profile name, falling back to 'default' for unknown names."""
+        return self.profiles.get(name or "default", self.profiles["default"])
 
     def extract_face_encoding(self, image_data: bytes) -> Optional[np.ndarray]:
         """Extract face encoding from image bytes."""
-        try:
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_data))
+        faces = self.extract_faces(image_data)
 
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        # Return the first face encoding
+        return faces[0].encoding if faces else None
 
-            # Convert to numpy array
-            image_array = np.array(image)
+    def extract_faces(self, image_data: bytes, profile: Optional[str] = None) -> Optional[List[DetectedFace]]:
+        """Extract every face in the image with its location and encoding; None if the image could not be processed."""
+        resolved = self.get_profile(profile)
+        faces, step = self.extract_faces_with_step(image_data, resolved.name)
+        self.stats.record(resolved.name, step)
+        return faces
 
-            # Find face locations
-            face_locations = face_recognition.face_locations(
-                image_array,
-                model=self.model
+    def extract_faces_with_step(
+            self,
+            image_data: bytes,
+            profile: Optional[str] = None
+    ) -> Tuple[Optional[List[DetectedFace]], int]:
+        """
+        Extract faces using a detection profile.
+        Returns the faces (None if the image could not be processed) and the
+        index of the cascade step that found them (-1 if none).
+        """
+        resolved = self.get_profile(profile)
+        try:
+            # Decode to an RGB array, at reduced scale for large JPEGs if configured
+            decoded = decode_image(image_data, self.decode_max_dimension)
+            logger.debug(
+                f"Decoded {decoded.image.size[0]}x{decoded.image.size[1]} image "
+                f"in {decoded.decode_ms:.1f}ms, peak {decoded.peak_bytes / 1e6:.1f}MB"
             )
+            image_array = decoded.array
+
+            # Find face locations
+            face_locations, step = self._locate_faces(decoded.image, image_array, resolved)
 
             if not face_locations:
-                return None
+                return [], -1
 
-            # Get face encodings
+            # Get face encodings at decoded resolution
             face_encodings = face_recognition.face_encodings(
                 image_array,
-                face_locations
+                face_locations,
+                num_jitters=resolved.num_jitters,
+                model=resolved.landmark_model
             )
 
-            if not face_encodings:
-                return None
-
-            # Return the first face encoding
-            return face_encodings[0]
+            # Report boxes in original image coordinates
+            faces = [
+                DetectedFace(
+                    encoding=encoding,
+                    location=tuple(int(round(v / decoded.scale)) for v in location)
+                )
+                for location, encoding in zip(face_locations, face_encodings)
+            ]
+            return faces, step
 
         except Exception as e:
-            print(f"Error extracting face encoding: {e}")
-            return None
+            logger.error(f"Error extracting face encoding: {e}")
+            return None, -1
+
+    def _locate_faces(
+            self,
+            image: Image.Image,
+            image_array: np.ndarray,
+            profile: DetectionProfile
+    ) -> Tuple[List[Tuple[int, int, int, int]], int]:
+        """
+        Run the profile's detector cascade, on a downscaled copy when configured,
+        and map boxes back to full resolution.
+        """
+        detection_image, scale = scale_to_max_dimension(image, self.detection_max_dimension)
+        detection_array = image_array if scale == 1.0 else np.asarray(detection_image)
+
+        # Cheap steps first; escalate only while nothing has been found
+        locations, found_step = [], -1
+        for step, (model, upsample) in enumerate(profile.steps):
+            locations = face_recognition.face_locations(
+                detection_array, number_of_times_to_upsample=upsample, model=model
+            )
+            if locations:
+                found_step = step
+                break
+
+        if scale == 1.0:
+            return locations, found_step
+
+        height, width = image_array.shape[:2]
+        return [
+            (
+                max(0, int(top / scale)),
+                min(width, int(right / scale)),
+                min(height, int(bottom / scale)),
+                max(0, int(left / scale))
+            )
+            for top, right, bottom, left in locations
+        ], found_step
 
     def compare_faces(
             self,
-            known_encodings: List[np.ndarray],
+            known_encodings: Union[FaceGallery, List[np.ndarray]],
             unknown_encoding: np.ndarray
     ) -> Tuple[bool, int, float]:
         """
         Compare unknown face with known faces.
         Returns: (match_found, best_match_index, distance)
         """
-        if not known_encodings:
+        if len(known_encodings) == 0:
             return False, -1, 1.0
 
         # Calculate face distances
-        distances = face_recognition.face_distance(known_encodings, unknown_encoding)
+        if isinstance(known_encodings, FaceGallery):
+            rows = None
+            if known_encodings.index is not None and known_encodings.index.is_ready:
+                # Approximate candidates, re-ranked with exact distances below
+                rows = known_encodings.index.candidates(unknown_encoding)
+                if len(rows) == 0:
+                    return False, -1, 1.0
+            distances = known_encodings.distances(unknown_encoding, rows)
+        else:
+            rows = None
+            distances = face_recognition.face_distance(known_encodings, unknown_encoding)
 
         # Get the best match
-        best_match_index = np.argmin(distances)
-        best_distance = distances[best_match_index]
+        best_position = np.argmin(distances)
+        best_match_index = rows[best_position] if rows is not None else best_position
+
+        return self._to_match(int(best_match_index), float(distances[best_position]))
+
+    def match_faces(
+            self,
+            gallery: FaceGallery,
+            unknown_encodings: np.ndarray,
+            exclude: Optional[np.ndarray] = None
+    ) -> List[Tuple[bool, int, float]]:
+        """
+        Compare several unknown faces with the gallery at once.
+        Returns one (match_found, best_match_index, confidence) per face.
+        ``exclude`` masks gallery rows out of an exhaustive (unindexed) search.
+        """
+        unknown_encodings = np.asarray(unknown_encodings).reshape(-1, gallery.dimension)
+        if len(gallery) == 0:
+            return [(False, -1, 1.0)] * len(unknown_encodings)
+
+        # Candidate sets differ per probe, so indexed galleries are searched one by one
+        if gallery.index is not None and gallery.index.is_ready:
+            return [self.compare_faces(gallery, encoding) for encoding in unknown_encodings]
+
+        # One (F x 128) . (128 x N) product for every face in the image
+        distances = gallery.distances_batch(unknown_encodings)
+        if exclude is not None:
+            distances[:, exclude] = np.inf
+        best_indices = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(best_indices)), best_indices]
+
+        return [
+            self._to_match(int(index), float(distance))
+            for index, distance in zip(best_indices, best_distances)
+        ]
+
+    def rank_candidates(
+            self,
+            gallery: FaceGallery,
+            unknown_encoding: np.ndarray,
+            top_k: int = 5,
+            neighbours: int = 50,
+            aggregate: str = "min",
+            exclude: Optional[np.ndarray] = None
+    ) -> List[PersonCandidate]:
+        """
+        Rank the most likely persons for a face by k-NN voting.
+
+        The ``neighbours`` nearest encodings are grouped by person and scored
+        by ``aggregate``: 'min' or 'mean' distance, or 'count' of encodings
+        within tolerance (ties broken by min distance). compare_faces is the
+        special case top_k=1, neighbours=1. Rows set in ``exclude`` are skipped.
+        """
+        if len(gallery) == 0:
+            return []
+
+        rows = None
+        if gallery.index is not None and gallery.index.is_ready:
+            rows = gallery.index.candidates(unknown_encoding)
+            if len(rows) == 0:
+                return []
+        distances = gallery.distances(unknown_encoding, rows)
+        row_ids = rows if rows is not None else np.arange(len(distances))
+        if exclude is not None:
+            distances[exclude[row_ids]] = np.inf
+
+        # k nearest encodings without sorting the whole gallery
+        k = min(neighbours, int(np.count_nonzero(np.isfinite(distances))))
+        if k == 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest_distances = distances[nearest]
+        person_ids, inverse = np.unique(gallery.person_ids[row_ids[nearest]], return_inverse=True)
+
+        min_distances = np.full(len(person_ids), np.inf)
+        np.minimum.at(min_distances, inverse, nearest_distances)
+        counts = np.bincount(inverse, minlength=len(person_ids))
+        votes = np.bincount(inverse, weights=nearest_distances <= self.tolerance, minlength=len(person_ids))
+
+        if aggregate == "mean":
+            person_distances = np.bincount(inverse, weights=nearest_distances) / counts
+        else:
+            person_distances = min_distances
+
+        if aggregate == "count":
+            order = np.lexsort((min_distances, -votes))
+            scores = -votes
+        else:
+            order = np.argsort(person_distances, kind="stable")
+            scores = person_distances
+
+        order = order[:top_k + 1]
+        candidates = []
+        for position, slot in enumerate(order[:top_k]):
+            runner_up = scores[order[position + 1]] if position + 1 < len(order) else None
+            distance = float(person_distances[slot])
+            candidates.append(PersonCandidate(
+                person_id=int(person_ids[slot]),
+                distance=distance,
+                confidence=max(0.0, 1.0 - distance),
+                votes=int(votes[slot]),
+                margin=float(runner_up - scores[slot]) if runner_up is not None else None
+            ))
+
+        return candidates
 
+    def _to_match(self, index: int, distance: float) -> Tuple[bool, int, float]:
         # Check if it's a match based on tolerance
-        is_match = best_distance <= self.tolerance
+        is_match = distance <= self.tolerance
 
         # Convert distance to confidence (0-1 scale, where 1 is perfect match)
-        confidence = 1.0 - best_distance if is_match else 0.0
+        confidence = 1.0 - distance if is_match else 0.0
 
-        return is_match, int(best_match_index), float(confidence)
\ No newline at end of file
+        return is_match, index, float(confidence)
@@ -1,16 +1,50 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+import logging
+import time
+from dataclasses import asdict, replace
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 from pathlib import Path  # THIS IMPORT WAS MISSING!
 from fastapi import UploadFile
 import redis
 import numpy as np
 from app.domain.interfaces.face_service_interface import IFaceService
 from app.domain.interfaces.face_repository_interface import IFaceRepository
-from app.domain.models import ImageUploadResult, Person, FaceEncoding
+from app.domain.models import (
+    ImageUploadResult,
+    Person,
+    FaceEncoding,
+    DetectedFace,
+    PersonCandidate,
+    SyncWatermark,
+    EncodingDelta,
+    GalleryChange,
+    ImageEvent
+)
 from app.services.face_recognition_engine import FaceRecognitionEngine
+from app.services.face_gallery import FaceGallery, ENCODING_DIMENSION
+from app.services.gallery_index import IVFIndex, PersonPrototypeIndex
+from app.services.encoding_pool import EncodingWorkerPool
+from app.services.encoding_cache import EncodingCache
+from app.services.near_duplicate_index import NearDuplicateIndex
+from app.services.person_cache import PersonCache
+from app.services.gallery_retention import RetentionPolicy
+from app.services.gallery_snapshot import GallerySnapshotCache
+from app.services.gallery_file_snapshot import GalleryFileSnapshot
+from app.services.gallery_tiers import ColdTier, hot_rows_for_budget
+from app.utils.image_utils import perceptual_hash
+from app.infrastructure.repositories.encoding_write_buffer import EncodingWriteBuffer
+from app.infrastructure.rabbitmq.gallery_feed import GalleryChangeFeed
 from app.infrastructure.storage.file_storage import FileStorage
 from app.config import get_settings
 from app.core.exceptions import ValidationError
 
+logger = logging.getLogger(__name__)
+
+
+def _latest(*times: Optional[datetime]) -> Optional[datetime]:
+    return max((t for t in times if t is not None), default=None)
+
 
 class FaceService(IFaceService):
     def __init__(
@@ -18,13 +52,55 @@ class FaceService(IFaceService):
             repository: IFaceRepository,
             storage: FileStorage,
             recognition_engine: FaceRecognitionEngine,
-            redis_client: Optional[redis.Redis] = None
+            redis_client: Optional[redis.Redis] = None,
+            encoding_pool: Optional[EncodingWorkerPool] = None,
+            encoding_cache: Optional[EncodingCache] = None,
+            near_duplicate_index: Optional[NearDuplicateIndex] = None,
+            write_buffer: Optional[EncodingWriteBuffer] = None,
+            person_cache: Optional[PersonCache] = None,
+            snapshot_cache: Optional[GallerySnapshotCache] = None,
+            file_snapshot: Optional[GalleryFileSnapshot] = None,
+            change_feed: Optional[GalleryChangeFeed] = None
     ):
         self.repository = repository
         self.storage = storage
         self.recognition_engine = recognition_engine
         self.redis_client = redis_client
+        self.encoding_pool = encoding_pool
+        self.encoding_cache = encoding_cache
+        self.near_duplicate_index = near_duplicate_index
+        self.write_buffer = write_buffer
+        self.person_cache = person_cache
+        self.snapshot_cache = snapshot_cache
+        self.file_snapshot = file_snapshot
+        self.change_feed = change_feed
         self.settings = get_settings()
+        self.retention = RetentionPolicy(
+            max_per_person=self.settings.gallery_max_encodings_per_person,
+            epsilon=self.settings.gallery_duplicate_epsilon
+        )
+        # Tiering keeps only this many rows in memory, the rest in a memory-mapped snapshot;
+        # it needs the on-disk snapshot and the Redis version counter
+        self.max_hot_rows = 0
+        if file_snapshot and redis_client and self.settings.gallery_hot_memory_mb:
+            self.max_hot_rows = hot_rows_for_budget(self.settings.gallery_hot_memory_mb)
+        self.gallery: Optional[FaceGallery] = None
+        self._gallery_version: Optional[int] = None
+        self._watermark: Optional[SyncWatermark] = None
+        # Changes from the feed that arrived ahead of a missing sequence number
+        self._pending_changes: Dict[int, GalleryChange] = {}
+        # Gallery version we are waiting for the feed to reach, and since when
+        self._feed_target: Optional[Tuple[int, float]] = None
+        # Set when our own write could not be applied or announced; the next sync reads a delta regardless
+        self._needs_resync = False
+        # While a sync reads the database, feed changes are queued and applied on top of its result
+        self._syncing = False
+        # When the gallery last caught up with the database, for polling without Redis
+        self._last_db_sync = 0.0
+        self._gallery_lock = asyncio.Lock()
+        # Snapshot publishing runs in a worker thread, one at a time, outside the gallery lock
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._registration_lock = asyncio.Lock()
 
     async def process_image(
             self,
@@ -50,7 +126,7 @@ class FaceService(IFaceService):
             raise ValidationError("File size exceeds maximum allowed")
 
         # Extract face encoding
-        face_encoding = self.recognition_engine.extract_face_encoding(content)
+        face_encoding = await self._extract_face_encoding(content)
 
         if face_encoding is None:
             return ImageUploadResult(
@@ -67,6 +143,90 @@ class FaceService(IFaceService):
         else:
             return await self._identify_person(face_encoding, content, file_ext)
 
+    async def _extract_face_encoding(self, image_data: bytes) -> Optional[np.ndarray]:
+        """Extract the first face encoding in the image."""
+        faces, _ = await self._extract_faces(image_data)
+        return faces[0].encoding if faces else None
+
+    async def _extract_faces(
+            self,
+            image_data: bytes,
+            profile: Optional[str] = None
+    ) -> Tuple[List[DetectedFace], bool]:
+        """
+        Extract every face, off the event loop when a worker pool is configured.
+        Returns the faces and whether they were reused from an identical or
+        near-identical image seen before.
+        """
+        cache_key = None
+        if self.encoding_cache:
+            # Different profiles can find different faces in the same image
+            cache_key = f"{profile or 'default'}:{self.encoding_cache.key(image_data)}"
+            cached = self.encoding_cache.get(cache_key)
+            if cached is not None:
+                return cached, True
+
+        image_hash, image_size = None, None
+        if self.near_duplicate_index:
+            try:
+                image_hash, image_size = perceptual_hash(image_data)
+            except Exception as e:
+                logger.debug(f"Could not compute perceptual hash: {e}")
+
+        if image_hash is not None:
+            match = self.near_duplicate_index.find(image_hash)
+            faces = self._rescale_faces(match[0], image_size, profile) if match else None
+            if faces is not None:
+                if cache_key:
+                    self.encoding_cache.put(cache_key, faces)
+                return faces, True
+
+        if self.encoding_pool:
+            faces = await self.encoding_pool.extract_faces(image_data, profile)
+        else:
+            faces = self.recognition_engine.extract_faces(image_data, profile)
+
+        if faces is None:
+            # The image could not be processed; that is not a result to remember for later deliveries
+            return [], False
+
+        if cache_key:
+            self.encoding_cache.put(cache_key, faces)
+        if image_hash is not None:
+            self.near_duplicate_index.add(image_hash, (faces, image_size, profile))
+        return faces, False
+
+    @staticmethod
+    def _rescale_faces(
+            entry: Tuple[List[DetectedFace], Tuple[int, int], Optional[str]],
+            image_size: Tuple[int, int],
+            profile: Optional[str]
+    ) -> Optional[List[DetectedFace]]:
+        """Map faces of a near-duplicate onto this image's size; None if not reusable."""
+        faces, (source_width, source_height), source_profile = entry
+        if source_profile != profile:
+            return None
+
+        width, height = image_size
+        scale_x, scale_y = width / source_width, height / source_height
+
+        # A resized copy keeps the aspect ratio; anything else may have been cropped
+        if abs(scale_x - scale_y) > 0.01 * max(scale_x, scale_y):
+            return None
+
+        return [
+            DetectedFace(
+                encoding=face.encoding,
+                location=(
+                    int(round(face.location[0] * scale_y)),
+                    int(round(face.location[1] * scale_x)),
+                    int(round(face.location[2] * scale_y)),
+                    int(round(face.location[3] * scale_x))
+                )
+            )
+            for face in faces
+        ]
+
     async def _register_new_person(
             self,
             name: str,
@@ -75,32 +235,36 @@ class FaceService(IFaceService):
             file_ext: str
     ) -> ImageUploadResult:
         """Register a new person with their face encoding."""
+        result, encoding = await self._prepare_registration(name, face_encoding, image_data, file_ext)
+        await self._save_encodings([encoding])
+        return result
 
-        # Check if person already exists
-        existing_person = await self.repository.get_person_by_name(name)
+    async def _prepare_registration(
+            self,
+            name: str,
+            face_encoding: np.ndarray,
+            image_data: bytes,
+            file_ext: str
+    ) -> Tuple[ImageUploadResult, FaceEncoding]:
+        """Find or create the person and store the image; returns the result and the encoding to save."""
+        # Concurrent registrations of the same new name must not both create the person
+        async with self._registration_lock:
+            # Check if person already exists
+            existing_person = await self._find_person_by_name(name)
 
-        if existing_person:
-            # Add another encoding for existing person
-            person = existing_person
-        else:
-            # Create new person
-            person = await self.repository.create_person(name)
+            if existing_person:
+                # Add another encoding for existing person
+                person = existing_person
+            else:
+                # Create new person
+                person = await self.repository.create_person(name)
+                if self.person_cache:
+                    self.person_cache.put(person)
 
         # Save image to storage
         image_path = self.storage.save_image(image_data, name, file_ext)
 
-        # Save face encoding to database
-        await self.repository.save_face_encoding(
-            person_id=person.id,
-            encoding=face_encoding,
-            image_path=image_path
-        )
-
-        # Clear cache if using Redis
-        if self.redis_client:
-            self.redis_client.delete("face_encodings_cache")
-
-        return ImageUploadResult(
+        result = ImageUploadResult(
             success=True,
             person_name=name,
             confidence=1.0,
@@ -108,6 +272,7 @@ class FaceService(IFaceService):
             message=f"Successfully registered {name}",
             is_new_person=not existing_person
         )
+        return result, FaceEncoding(person_id=person.id, encoding=face_encoding, image_path=image_path)
 
     async def _identify_person(
             self,
@@ -116,91 +281,691 @@ class FaceService(IFaceService):
             file_ext: str
     ) -> ImageUploadResult:
         """Identify a person from their face encoding."""
+        results = await self._identify_faces([DetectedFace(encoding=face_encoding)], image_data, file_ext)
+        return results[0]
 
-        # Get all face encodings from cache or database
-        all_encodings = await self._get_cached_encodings()
+    async def _identify_faces(
+            self,
+            faces: List[DetectedFace],
+            image_data: bytes,
+            file_ext: str,
+            save_encodings: bool = True
+    ) -> List[ImageUploadResult]:
+        """Identify every detected face, matching all of them against the gallery at once."""
+        results, new_encodings = await self._match_images([(faces, image_data, file_ext, save_encodings)])
 
-        if not all_encodings:
-            return ImageUploadResult(
-                success=False,
-                person_name=None,
-                confidence=0.0,
-                image_path="",
-                message="No registered faces in the system"
+        # All of the image's encodings go out in one write
+        await self._save_encodings(new_encodings[0])
+        return results[0]
+
+    async def _match_images(
+            self,
+            images: List[Tuple[List[DetectedFace], bytes, str, bool]]
+    ) -> Tuple[List[List[ImageUploadResult]], List[List[FaceEncoding]]]:
+        """
+        Identify the faces of several images, given as (faces, image data,
+        file extension, save encodings), in one pass over the gallery.
+        Returns the results and the new encodings to save, per image.
+        """
+        # Get the resident gallery, reloading it only when it is stale
+        gallery = await self._get_gallery()
+
+        if gallery.total_size == 0:
+            return [
+                [
+                    ImageUploadResult(
+                        success=False,
+                        person_name=None,
+                        confidence=0.0,
+                        image_path="",
+                        message="No registered faces in the system"
+                    )
+                    for _ in faces
+                ]
+                for faces, _, _, _ in images
+            ], [[] for _ in images]
+
+        # Compare every face of every image in one product
+        probes = np.stack([face.encoding for faces, _, _, _ in images for face in faces])
+        matches = self.recognition_engine.match_faces(gallery, probes)
+        if gallery.cold is not None:
+            matches = self._match_cold_tier(gallery, probes, matches)
+
+        # Resolve rows to persons now; the gallery may change while we wait on the database
+        matched_person_ids = [
+            int(gallery.person_ids[match_index]) if is_match else None
+            for is_match, match_index, _ in matches
+        ]
+        if gallery.cold is not None:
+            gallery.cold.touch(pid for pid in matched_person_ids if pid is not None)
+
+        # Fetch every matched person in one query
+        persons = await self._get_persons({pid for pid in matched_person_ids if pid is not None})
+
+        all_results = []
+        all_encodings = []
+        offset = 0
+        for faces, image_data, file_ext, save_encodings in images:
+            end = offset + len(faces)
+            results = []
+            new_encodings: List[FaceEncoding] = []
+            image_paths: Dict[int, str] = {}
+            for face, (is_match, _, confidence), person_id in zip(
+                    faces, matches[offset:end], matched_person_ids[offset:end]
+            ):
+                if not is_match:
+                    results.append(ImageUploadResult(
+                        success=False,
+                        person_name=None,
+                        confidence=0.0,
+                        image_path="",
+                        message="Face not recognized"
+                    ))
+                    continue
+
+                # Get matched person
+                person = persons.get(person_id)
+
+                if not person:
+                    results.append(ImageUploadResult(
+                        success=False,
+                        person_name=None,
+                        confidence=0.0,
+                        image_path="",
+                        message="Person record not found"
+                    ))
+                    continue
+
+                # Save image to the person's folder, once per person in the image
+                if person.id not in image_paths:
+                    image_paths[person.id] = self.storage.save_image(image_data, person.name, file_ext)
+                image_path = image_paths[person.id]
+
+                # Optionally save this new encoding as well
+                if save_encodings:
+                    new_encodings.append(
+                        FaceEncoding(person_id=person.id, encoding=face.encoding, image_path=image_path)
+                    )
+
+                results.append(ImageUploadResult(
+                    success=True,
+                    person_name=person.name,
+                    confidence=confidence,
+                    image_path=image_path,
+                    message=f"Recognized as {person.name} with {confidence:.2%} confidence"
+                ))
+            all_results.append(results)
+            all_encodings.append(new_encodings)
+            offset = end
+
+        return all_results, all_encodings
+
+    def _match_cold_tier(
+            self,
+            gallery: FaceGallery,
+            probes: np.ndarray,
+            matches: List[Tuple[bool, int, float]]
+    ) -> List[Tuple[bool, int, float]]:
+        """Search the cold tier for the faces the hot tier missed, promoting the persons found there."""
+        misses = [position for position, (is_match, _, _) in enumerate(matches) if not is_match]
+        cold = gallery.cold
+        if not misses or len(cold) == 0:
+            return matches
+
+        cold_matches = self.recognition_engine.match_faces(cold.gallery, probes[misses], exclude=cold.excluded)
+        found = {int(cold.gallery.person_ids[row]) for is_match, row, _ in cold_matches if is_match}
+        if not found:
+            return matches
+
+        # Match those faces again in memory, so rows refer to the hot tier
+        gallery.promote(found)
+        matches = list(matches)
+        for position, match in zip(misses, self.recognition_engine.match_faces(gallery, probes[misses])):
+            matches[position] = match
+        return matches
+
+    async def _get_gallery(self) -> FaceGallery:
+        """Return the resident gallery, applying changes made by other writers since the last sync."""
+        # Messages handled concurrently share one load or resync instead of each running their own
+        async with self._gallery_lock:
+            return await self._sync_gallery()
+
+    async def _sync_gallery(self) -> FaceGallery:
+        # Read the version before querying so a concurrent write is seen next time
+        remote_version = self._get_remote_gallery_version()
+        overlap = self.settings.gallery_sync_overlap_seconds
+
+        reload = self.gallery is None or self._is_version_reset(remote_version)
+        if reload:
+            self._pending_changes.clear()
+            self._needs_resync = False
+            self._syncing = True
+            try:
+                self.gallery = await self._load_gallery(remote_version)
+            finally:
+                self._syncing = False
+            self._last_db_sync = time.monotonic()
+        elif self._needs_resync or remote_version != self._gallery_version or self._poll_due(remote_version):
+            # The feed cannot bring back our own failed write
+            if not self._needs_resync and remote_version is not None and self._awaiting_feed(remote_version):
+                return self.gallery
+
+            # The feed missed a change (or there is none): resync from the database.
+            # A write failing while the delta is read needs another resync, so the flag is cleared first
+            self._needs_resync = False
+            self._syncing = True
+            try:
+                delta = await self.repository.get_encoding_delta(self._watermark, overlap)
+            except Exception:
+                self._needs_resync = True
+                raise
+            finally:
+                self._syncing = False
+            self._apply_delta(self.gallery, delta)
+            self._feed_target = None
+            self._last_db_sync = time.monotonic()
+
+        # A spill writes the file snapshot too, so it goes first
+        if self.max_hot_rows:
+            self._enforce_hot_budget(remote_version)
+
+        # Keep the snapshots close enough that cold starts only replay a short delta
+        stale = [] if self._publishing else [s for s in self._snapshot_stores() if s.is_stale(remote_version)]
+        if stale:
+            self._snapshot_task = asyncio.create_task(self._publish_snapshots(
+                stale, self.gallery.frozen(), self._watermark, remote_version
+            ))
+
+        if reload or remote_version is None or self._gallery_version is None:
+            self._gallery_version = remote_version
+        else:
+            # Our own writes may have moved the version past the one read before the database
+            self._gallery_version = max(self._gallery_version, remote_version)
+        self._drain_changes()
+        if self.gallery.index is not None:
+            self.gallery.index.refresh()
+        return self.gallery
+
+    async def _load_gallery(self, remote_version: Optional[int] = None) -> FaceGallery:
+        """Build the gallery from a snapshot plus its delta, or from the database."""
+        snapshot = None
+        for store in self._snapshot_stores():
+            snapshot = store.load(max_version=remote_version)
+            if snapshot is not None:
+                break
+
+        if snapshot is None and self.max_hot_rows:
+            snapshot = await self._stream_to_file_snapshot(remote_version)
+
+        if snapshot is not None:
+            gallery, watermark, version = snapshot
+            if self.max_hot_rows:
+                # The snapshot becomes the cold tier; rows are promoted into memory as they match
+                cold, gallery = gallery, FaceGallery()
+                gallery.attach_cold(ColdTier(cold, self.max_hot_rows))
+            delta = await self.repository.get_encoding_delta(watermark, self.settings.gallery_sync_overlap_seconds)
+            self._apply_delta(gallery, delta)
+            self._attach_index(gallery)
+            logger.info(
+                f"Loaded gallery snapshot of version {version} with {gallery.total_size} encodings "
+                f"({len(delta.encoding_ids)} from the delta)"
             )
+        else:
+            gallery = await self._stream_gallery()
+
+        # Warm the person cache in bulk; matches resolve their names from it
+        if self.person_cache:
+            self.person_cache.put_many(await self.repository.get_all_persons())
+        return gallery
+
+    @property
+    def _publishing(self) -> bool:
+        return self._snapshot_task is not None and not self._snapshot_task.done()
+
+    async def _publish_snapshots(self, stores: List[Any], gallery: FaceGallery, watermark: SyncWatermark, version: int):
+        # Uploading the whole gallery takes a while; it must not stall the loop or other messages
+        for store in stores:
+            try:
+                await asyncio.to_thread(store.publish, gallery, watermark, version)
+            except Exception as e:
+                logger.warning(f"Gallery snapshot publish failed: {e}")
+
+    async def close(self):
+        """Wait for a snapshot still being published, stop the index's training thread and persist the IVF index."""
+        if self._snapshot_task is not None:
+            await asyncio.gather(self._snapshot_task, return_exceptions=True)
+
+        index = self.gallery.index if self.gallery is not None else None
+        if index is None:
+            return
+
+        index.refresh()
+        # Waits for index saves already queued, so the one below is the last to write
+        await asyncio.to_thread(index.close)
+        if isinstance(index, IVFIndex) and index.path and index.is_ready:
+            # Rows assigned since the last build would otherwise be assigned again on the next start
+            await asyncio.to_thread(index.save, index.path, self.gallery)
+
+    def _snapshot_stores(self) -> List[Any]:
+        # A tiered gallery cannot be published to Redis without holding all of it in memory
+        if self.max_hot_rows:
+            return [self.file_snapshot]
+        # The local memory-mapped snapshot is cheapest to open, so it is tried first
+        return [store for store in (self.file_snapshot, self.snapshot_cache) if store is not None]
+
+    async def _stream_to_file_snapshot(self, version: int) -> Optional[Tuple[FaceGallery, SyncWatermark, int]]:
+        """Stream every encoding straight into a new on-disk snapshot, never holding the gallery in memory."""
+        watermark = await self.repository.get_sync_position()
+        total = await self.repository.count_face_encodings()
+        writer = self.file_snapshot.open_writer(total, version, ENCODING_DIMENSION)
+        if writer is None:
+            # Another worker on this host is writing one; load into memory and spill later
+            return None
+
+        logger.info(f"Streaming {total} encodings into a gallery snapshot")
+        with writer:
+            # Rows past the count were committed while streaming; the delta replays them.
+            # Page writes and the final fsync happen in a worker thread, off the loop
+            async for encoding_ids, person_ids, encodings in self.repository.iter_encoding_chunks(
+                    self.settings.gallery_load_chunk_size
+            ):
+                await asyncio.to_thread(writer.append, encoding_ids, person_ids, encodings)
+            if not await asyncio.to_thread(writer.commit, watermark):
+                return None
+
+        return await asyncio.to_thread(self.file_snapshot.load, version)
 
-        # Prepare encodings for comparison
-        known_encodings = [enc.encoding for enc in all_encodings]
+    def _enforce_hot_budget(self, version: int):
+        gallery = self.gallery
+        if gallery.cold is not None and gallery.cold.rebalance(gallery):
+            return
+        if gallery.cold is None and len(gallery) <= self.max_hot_rows:
+            return
+        if self._publishing:
+            return
 
-        # Compare faces
-        is_match, match_index, confidence = self.recognition_engine.compare_faces(
-            known_encodings,
-            face_encoding
+        # What is still over budget exists only in memory: write everything out and reopen it as the cold tier
+        self._snapshot_task = asyncio.create_task(self._spill(gallery, gallery.frozen(), self._watermark, version))
+
+    async def _spill(self, gallery: FaceGallery, view: FaceGallery, watermark: SyncWatermark, version: int):
+        """Write a frozen view of the gallery to disk in a worker thread, then map it back as the cold tier."""
+        def write_and_map() -> Optional[ColdTier]:
+            self.file_snapshot.publish(view, watermark, version)
+            snapshot = self.file_snapshot.load()
+            if snapshot is None or snapshot[2] < version:
+                # Another process holds the snapshot lock; older snapshots could resurrect deleted rows
+                return None
+            return ColdTier(snapshot[0], self.max_hot_rows)
+
+        try:
+            cold = await asyncio.to_thread(write_and_map)
+        except Exception as e:
+            logger.warning(f"Gallery spill failed: {e}")
+            return
+        if cold is None or gallery is not self.gallery:
+            return
+
+        # Rows deleted while the snapshot was written are still live in it
+        snapshot_ids = cold.gallery.ids
+        cold.remove_ids(snapshot_ids[~gallery.has_ids(snapshot_ids)])
+        gallery.attach_cold(cold)
+        cold.rebalance(gallery)
+        logger.info(f"Spilled gallery to a cold tier: {len(gallery)} rows in memory, {len(gallery.cold)} mapped")
+
+    async def _stream_gallery(self) -> FaceGallery:
+        """Stream every encoding into a preallocated gallery, one chunk at a time."""
+        # Position the sync cursor first; rows committed while streaming come again with the next delta
+        watermark = await self.repository.get_sync_position()
+        total = await self.repository.count_face_encodings()
+        gallery = FaceGallery(capacity=total)
+
+        logger.info(f"Loading gallery of {total} encodings")
+        next_report = 0.1
+        async for encoding_ids, person_ids, encodings in self.repository.iter_encoding_chunks(
+                self.settings.gallery_load_chunk_size
+        ):
+            gallery.extend(encoding_ids, person_ids, encodings)
+            if total and len(gallery) >= next_report * total:
+                logger.info(f"Loaded {len(gallery)}/{total} encodings ({len(gallery) / total:.0%})")
+                next_report = len(gallery) / total + 0.1
+
+        self._attach_index(gallery)
+        self._watermark = watermark
+        logger.info(f"Loaded gallery with {len(gallery)} encodings")
+        return gallery
+
+    async def _get_persons(self, person_ids: Iterable[int]) -> Dict[int, Person]:
+        """Persons by id, from the cache where possible and one query for the rest."""
+        if not self.person_cache:
+            return {person.id: person for person in await self.repository.get_persons_by_ids(list(person_ids))}
+
+        persons, missing = self.person_cache.get_many(person_ids)
+        if missing:
+            fetched = await self.repository.get_persons_by_ids(missing)
+            self.person_cache.put_many(fetched)
+            persons.update((person.id, person) for person in fetched)
+        return persons
+
+    async def _find_person_by_name(self, name: str) -> Optional[Person]:
+        person = self.person_cache.get_by_name(name) if self.person_cache else None
+        if person is None:
+            person = await self.repository.get_person_by_name(name)
+            if person and self.person_cache:
+                self.person_cache.put(person)
+        return person
+
+    def _is_version_reset(self, remote_version: Optional[int]) -> bool:
+        # A counter that went backwards (e.g. Redis was flushed) says nothing about what we missed
+        return (
+            remote_version is not None
+            and self._gallery_version is not None
+            and remote_version < self._gallery_version
         )
 
-        if not is_match:
-            return ImageUploadResult(
-                success=False,
-                person_name=None,
-                confidence=0.0,
-                image_path="",
-                message="Face not recognized"
-            )
+    def _poll_due(self, remote_version: Optional[int]) -> bool:
+        """Whether to poll the database for other writers' changes, having no version counter to watch."""
+        interval = self.settings.gallery_poll_interval
+        return remote_version is None and interval > 0 and time.monotonic() - self._last_db_sync >= interval
 
-        # Get matched person
-        matched_encoding = all_encodings[match_index]
-        person = await self.repository.get_person_by_id(matched_encoding.person_id)
+    def _awaiting_feed(self, remote_version: int) -> bool:
+        """Whether to give the change feed a little longer to deliver the versions we are behind."""
+        if not self.change_feed:
+            return False
 
-        if not person:
-            return ImageUploadResult(
-                success=False,
-                person_name=None,
-                confidence=0.0,
-                image_path="",
-                message="Person record not found"
-            )
+        now = time.monotonic()
+        if self._feed_target is None or self._gallery_version >= self._feed_target[0]:
+            self._feed_target = (remote_version, now)
+        return now - self._feed_target[1] < self.settings.gallery_feed_gap_timeout
+
+    def apply_change(self, change: GalleryChange):
+        """Apply a change announced by another worker, in sequence order."""
+        if self.gallery is None or self._gallery_version is None or change.sequence <= self._gallery_version:
+            return
+
+        self._pending_changes[change.sequence] = change
+        self._drain_changes()
 
-        # Save image to the person's folder
-        image_path = self.storage.save_image(image_data, person.name, file_ext)
+    def _drain_changes(self):
+        # Changes with a later sequence than the version read before a sync may be missing from what it
+        # reads; applied now, a later deletion could be undone by the older rows
+        if not self._pending_changes or self._gallery_version is None or self._syncing:
+            return
 
-        # Optionally save this new encoding as well
-        await self.repository.save_face_encoding(
-            person_id=person.id,
-            encoding=face_encoding,
-            image_path=image_path
+        for sequence in [s for s in self._pending_changes if s <= self._gallery_version]:
+            del self._pending_changes[sequence]
+
+        # Anything after a gap waits; if the gap persists _get_gallery resyncs from the database
+        while self._gallery_version + 1 in self._pending_changes:
+            change = self._pending_changes.pop(self._gallery_version + 1)
+            self._apply_delta(self.gallery, EncodingDelta(
+                encoding_ids=change.encoding_ids,
+                person_ids=change.person_ids,
+                encodings=change.encodings,
+                deleted_person_ids=change.deleted_person_ids,
+                watermark=self._advance_watermark(change),
+                deleted_encoding_ids=change.deleted_encoding_ids
+            ))
+            self._gallery_version = change.sequence
+
+    def _advance_watermark(self, change: GalleryChange) -> SyncWatermark:
+        # Tombstone ids are not announced; deletions are replayed idempotently on the next resync
+        if len(change.encoding_ids) == 0:
+            return self._watermark
+        return replace(
+            self._watermark,
+            encoding_id=max(self._watermark.encoding_id, int(change.encoding_ids.max())),
+            encoding_created_at=_latest(self._watermark.encoding_created_at, change.created_at)
         )
 
-        # Clear cache
-        if self.redis_client:
-            self.redis_client.delete("face_encodings_cache")
+    def _later_watermark(self, watermark: SyncWatermark) -> SyncWatermark:
+        if self._watermark is None:
+            return watermark
+        return SyncWatermark(
+            encoding_id=max(self._watermark.encoding_id, watermark.encoding_id),
+            encoding_created_at=_latest(self._watermark.encoding_created_at, watermark.encoding_created_at),
+            tombstone_id=max(self._watermark.tombstone_id, watermark.tombstone_id),
+            tombstone_deleted_at=_latest(self._watermark.tombstone_deleted_at, watermark.tombstone_deleted_at)
+        )
 
-        return ImageUploadResult(
-            success=True,
-            person_name=person.name,
-            confidence=confidence,
-            image_path=image_path,
-            message=f"Recognized as {person.name} with {confidence:.2%} confidence"
+    def _apply_delta(self, gallery: FaceGallery, delta: EncodingDelta):
+        # The overlap window and our own writes make some rows arrive twice
+        new = ~gallery.has_ids(delta.encoding_ids)
+        if np.any(new):
+            gallery.extend(delta.encoding_ids[new], delta.person_ids[new], delta.encodings[new])
+
+        removed = sum(gallery.remove_person(person_id) for person_id in delta.deleted_person_ids)
+        removed += gallery.remove_ids(delta.deleted_encoding_ids)
+        if self.person_cache:
+            for person_id in delta.deleted_person_ids:
+                self.person_cache.invalidate(person_id)
+        # A gallery being loaded starts at the delta's position; the resident one only moves forward
+        self._watermark = delta.watermark if gallery is not self.gallery else self._later_watermark(delta.watermark)
+        logger.debug(f"Gallery sync: {int(np.count_nonzero(new))} encodings added, {removed} removed")
+
+    def _attach_index(self, gallery: FaceGallery):
+        if self.settings.face_index_type == "ivf":
+            gallery.attach_index(IVFIndex(
+                n_lists=self.settings.face_index_lists,
+                n_probe=self.settings.face_index_probe,
+                min_train_size=self.settings.face_index_min_size,
+                path=self.settings.face_index_path
+            ))
+        elif self.settings.face_index_type == "prototype":
+            gallery.attach_index(PersonPrototypeIndex(
+                top_persons=self.settings.face_index_top_persons,
+                dimension=gallery.dimension
+            ))
+
+    def _get_remote_gallery_version(self) -> Optional[int]:
+        if not self.redis_client:
+            return None
+
+        version = self.redis_client.get("face_encodings_version")
+        return int(version) if version is not None else 0
+
+    async def _save_encodings(self, encodings: List[FaceEncoding]) -> List[FaceEncoding]:
+        """
+        Persist encodings (batched with other messages if buffered) and apply
+        them to the gallery, subject to the per-person retention policy.
+        """
+        evicted: List[int] = []
+        if self.retention.enabled and encodings:
+            gallery = await self._get_gallery()
+            # Retention weighs all of a person's encodings, so bring any cold ones into memory
+            gallery.promote({encoding.person_id for encoding in encodings})
+            kept, evicted = self.retention.plan_batch(
+                gallery,
+                [encoding.person_id for encoding in encodings],
+                [encoding.encoding for encoding in encodings]
+            )
+            encodings = [encodings[position] for position in kept]
+
+        if not encodings:
+            return []
+
+        if self.write_buffer:
+            saved = await self.write_buffer.save_many(encodings)
+        else:
+            saved = await self.repository.save_face_encodings(encodings)
+
+        try:
+            await self._on_encodings_saved(saved)
+            # Only drop the replaced encodings once their replacements are durable
+            await self._evict_encodings(evicted)
+        except Exception as e:
+            # The rows are durable: failing the message now would have it redelivered and stored twice.
+            # Resync this worker from the database; others see the rows with their next delta
+            logger.error(f"Saved {len(saved)} encodings but could not apply or announce them: {e}")
+            self._needs_resync = True
+        return saved
+
+    async def _evict_encodings(self, encoding_ids: List[int]) -> int:
+        if not encoding_ids:
+            return 0
+
+        deleted = await self.repository.delete_face_encodings(encoding_ids)
+        if self.gallery is not None:
+            self.gallery.remove_ids(encoding_ids)
+        await self._announce_change(GalleryChange(deleted_encoding_ids=list(encoding_ids)))
+        return deleted
+
+    async def compact_gallery(self, batch_size: int = 1000) -> int:
+        """
+        Prune every person above the retention cap down to their most
+        diverse encodings. Returns the number of encodings deleted.
+
+        Deletion is permanent, and each deleted encoding adds a tombstone
+        row that is kept for delta sync.
+        """
+        if not self.retention.max_per_person:
+            return 0
+
+        # One worker compacts at a time; the lock expires in case it dies halfway
+        lock_ttl = max(int(self.settings.gallery_compaction_interval), 60)
+        if self.redis_client and not self.redis_client.set("gallery_compaction_lock", 1, nx=True, ex=lock_ttl):
+            return 0
+
+        try:
+            gallery = await self._get_gallery()
+            cold = gallery.cold
+            if cold is not None:
+                # Persons split across the tiers and over the cap are pruned as a whole in memory
+                hot_persons, hot_counts = np.unique(gallery.person_ids, return_counts=True)
+                cold_persons, cold_counts = np.unique(cold.gallery.person_ids[~cold.excluded], return_counts=True)
+                split, hot_rows, cold_rows = np.intersect1d(hot_persons, cold_persons, return_indices=True)
+                over_cap = hot_counts[hot_rows] + cold_counts[cold_rows] > self.retention.max_per_person
+                gallery.promote(split[over_cap].tolist())
+
+            evicted = self.retention.prune(gallery)
+            if cold is not None:
+                evicted += self.retention.prune(cold.gallery, exclude=cold.excluded)
+
+            deleted = 0
+            for start in range(0, len(evicted), batch_size):
+                deleted += await self._evict_encodings(evicted[start:start + batch_size])
+
+            if evicted:
+                logger.info(f"Gallery compaction deleted {deleted} encodings, {gallery.total_size} remain")
+            return deleted
+        finally:
+            if self.redis_client:
+                self.redis_client.delete("gallery_compaction_lock")
+
+    async def _on_encodings_saved(self, encodings: List[FaceEncoding]):
+        """Apply our own writes to the resident gallery and notify other workers."""
+        change = GalleryChange(
+            encoding_ids=np.array([enc.id for enc in encodings], dtype=np.int64),
+            person_ids=np.array([enc.person_id for enc in encodings], dtype=np.int64),
+            encodings=np.stack([enc.encoding for enc in encodings]).astype(np.float32),
+            created_at=max(enc.created_at for enc in encodings)
         )
+        if self.gallery is not None:
+            self.gallery.extend(change.encoding_ids, change.person_ids, change.encodings)
+            if self.gallery.cold is not None:
+                self.gallery.cold.touch(change.person_ids.tolist())
+        await self._announce_change(change)
 
-    async def _get_cached_encodings(self) -> List[FaceEncoding]:
-        """Get face encodings from cache or database."""
-        if self.redis_client:
-            # Try to get from cache
-            cached = self.redis_client.get("face_encodings_cache")
-            if cached:
-                # Deserialize from cache
-                # Note: This is simplified, you'd need proper serialization for numpy arrays
-                pass
+    async def _announce_change(self, change: GalleryChange):
+        """Bump the shared gallery version and publish the change under it."""
+        sequence = self._bump_gallery_version()
+        if self.change_feed and sequence is not None:
+            change.sequence = sequence
+            await self.change_feed.publish(change)
 
-        # Get from database
-        encodings = await self.repository.get_all_face_encodings()
+    def _bump_gallery_version(self) -> Optional[int]:
+        if not self.redis_client:
+            return None
 
-        # Cache for future use (with TTL)
-        if self.redis_client and encodings:
-            # Serialize and cache (simplified)
-            self.redis_client.setex("face_encodings_cache", 300, "serialized_data")
+        new_version = self.redis_client.incr("face_encodings_version")
 
-        return encodings
+        # If nobody else wrote since our last sync there is no delta to fetch;
+        # otherwise the stale local version makes the next read pull one
+        if self._gallery_version is not None and new_version == self._gallery_version + 1:
+            self._gallery_version = new_version
+            self._drain_changes()
+        return new_version
+
+    async def rank_faces(
+            self,
+            face_encodings: List[np.ndarray],
+            top_k: int = 5
+    ) -> List[List[PersonCandidate]]:
+        """Rank the most likely persons for each face, resolving all names in one query."""
+        gallery = await self._get_gallery()
+        top_k = max(1, min(top_k, gallery.total_size))
+        rankings = [self._rank_candidates(gallery, encoding, top_k) for encoding in face_encodings]
+
+        if gallery.cold is not None:
+            # Faces without a close enough candidate in memory are ranked against the cold tier;
+            # its candidates are promoted and the face is ranked again in memory
+            tolerance = self.recognition_engine.tolerance
+            for position, ranking in enumerate(rankings):
+                if ranking and ranking[0].distance <= tolerance:
+                    continue
+                cold_ranking = self._rank_candidates(
+                    gallery.cold.gallery,
+                    face_encodings[position],
+                    top_k,
+                    exclude=gallery.cold.excluded
+                )
+                if gallery.promote(candidate.person_id for candidate in cold_ranking):
+                    rankings[position] = self._rank_candidates(gallery, face_encodings[position], top_k)
+            gallery.cold.touch(ranking[0].person_id for ranking in rankings if ranking)
+
+        person_ids = {candidate.person_id for ranking in rankings for candidate in ranking}
+        persons = await self._get_persons(person_ids)
+        for ranking in rankings:
+            for candidate in ranking:
+                person = persons.get(candidate.person_id)
+                candidate.person_name = person.name if person else None
+
+        return rankings
+
+    def _rank_candidates(
+            self,
+            gallery: FaceGallery,
+            encoding: np.ndarray,
+            top_k: int,
+            exclude: Optional[np.ndarray] = None
+    ) -> List[PersonCandidate]:
+        return self.recognition_engine.rank_candidates(
+            gallery,
+            encoding,
+            top_k=top_k,
+            neighbours=self.settings.face_rank_neighbours,
+            aggregate=self.settings.face_rank_aggregate,
+            exclude=exclude
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters of the in-process caches."""
+        stats: Dict[str, Any] = {"gallery_size": self.gallery.total_size if self.gallery is not None else 0}
+        if self.gallery is not None and self.gallery.cold is not None:
+            stats["gallery_tiers"] = self.gallery.cold.stats(self.gallery)
+        if self.encoding_cache:
+            stats["encoding_cache"] = self.encoding_cache.stats()
+        if self.near_duplicate_index:
+            stats["near_duplicates"] = self.near_duplicate_index.stats()
+        detection_stats = self.encoding_pool.stats if self.encoding_pool else self.recognition_engine.stats
+        stats["detection_profiles"] = detection_stats.snapshot()
+        if self.write_buffer:
+            stats["write_buffer"] = self.write_buffer.stats()
+        if self.person_cache:
+            stats["person_cache"] = self.person_cache.stats()
+        if self.snapshot_cache:
+            stats["gallery_snapshot"] = self.snapshot_cache.stats()
+        if self.file_snapshot:
+            stats["gallery_file_snapshot"] = self.file_snapshot.stats()
+        if self.change_feed:
+            stats["change_feed"] = {
+                "published": self.change_feed.published,
+                "received": self.change_feed.received,
+                "pending": len(self._pending_changes)
+            }
+        pool_stats = getattr(self.repository, "pool_stats", None)
+        if pool_stats:
+            stats["database_pool"] = pool_stats()
+        return stats
 
     async def get_all_persons(self) -> List[Person]:
         """Get all registered persons."""
@@ -208,11 +973,11 @@ class FaceService(IFaceService):
 
     async def get_person_by_name(self, name: str) -> Optional[Person]:
         """Get a person by name."""
-        return await self.repository.get_person_by_name(name)
+        return await self._find_person_by_name(name)
 
     async def delete_person(self, person_id: int) -> bool:
         """Delete a person and their data."""
-        person = await self.repository.get_person_by_id(person_id)
+        person = (await self._get_persons([person_id])).get(person_id)
         if not person:
             return False
 
@@ -223,9 +988,11 @@ class FaceService(IFaceService):
             # Delete person's folder
             self.storage.delete_person_folder(person.name)
 
-            # Clear cache
-            if self.redis_client:
-                self.redis_client.delete("face_encodings_cache")
+            if self.person_cache:
+                self.person_cache.invalidate(person_id)
+            if self.gallery is not None:
+                self.gallery.remove_person(person_id)
+            await self._announce_change(GalleryChange(deleted_person_ids=[person_id]))
 
         return success
 
@@ -235,7 +1002,8 @@ class FaceService(IFaceService):
             image_bytes: bytes,
             filename: str,
             person_name: Optional[str] = None,
-            image_id: Optional[str] = None
+            image_id: Optional[str] = None,
+            metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Process image from RabbitMQ event.
@@ -246,30 +1014,206 @@ class FaceService(IFaceService):
         # Check file extension from filename
         file_ext = Path(filename).suffix.lower()
         if file_ext not in self.settings.allowed_extensions:
-            return {
-                "success": False,
-                "image_id": image_id,
-                "message": f"File type {file_ext} not allowed"
-            }
+            return self._rejected_file_result(image_id, file_ext)
 
-        # Extract face encoding
-        face_encoding = self.recognition_engine.extract_face_encoding(image_bytes)
+        # Extract every face in the image
+        faces, is_duplicate = await self._extract_faces(image_bytes, self._detection_profile(person_name, metadata))
 
-        if face_encoding is None:
-            return {
-                "success": False,
-                "image_id": image_id,
-                "person_name": None,
-                "confidence": 0.0,
-                "message": "No face detected in the image",
-                "faces_found": 0
-            }
+        if not faces:
+            return self._no_face_result(image_id)
+
+        # Rank candidates before identification stores this image's encodings
+        top_k = self._requested_top_k(metadata)
+        candidates: List[Optional[List[PersonCandidate]]] = [None] * len(faces)
+        if top_k and not person_name:
+            candidates = await self.rank_faces([face.encoding for face in faces], top_k)
 
         # Use existing logic for registration or identification
         if person_name:
-            result = await self._register_new_person(person_name, face_encoding, image_bytes, file_ext)
+            # Registration only uses the first face; the others are reported as-is
+            face_results = [await self._register_new_person(person_name, faces[0].encoding, image_bytes, file_ext)]
+            face_results.extend(
+                ImageUploadResult(success=False, message="Only the first face is registered")
+                for _ in faces[1:]
+            )
         else:
-            result = await self._identify_person(face_encoding, image_bytes, file_ext)
+            # An identical or near-identical image was already processed; don't store its encodings again
+            face_results = await self._identify_faces(
+                faces, image_bytes, file_ext, save_encodings=not is_duplicate
+            )
+
+        return self._image_result(image_id, faces, face_results, candidates)
+
+    async def process_images_from_events(self, events: List[ImageEvent]) -> List[Any]:
+        """
+        Process a batch of events together: faces are extracted
+        concurrently, the faces of every image are matched against the
+        gallery in one pass and all new encodings are stored in one write.
+
+        Returns one result per event, in order, or the exception that event
+        failed with; a failed write only fails the events whose encodings
+        could not be stored. Every image is matched against the gallery as
+        it was when the batch started.
+        """
+        outcomes: List[Any] = [None] * len(events)
+        file_exts = [Path(event.filename).suffix.lower() for event in events]
+        accepted = []
+        for position, (event, file_ext) in enumerate(zip(events, file_exts)):
+            if file_ext in self.settings.allowed_extensions:
+                accepted.append(position)
+            else:
+                outcomes[position] = self._rejected_file_result(event.image_id, file_ext)
+
+        # The encoding pool works on all images at once
+        extracted = await asyncio.gather(
+            *[
+                self._extract_faces(
+                    events[position].image_bytes,
+                    self._detection_profile(events[position].person_name, events[position].metadata)
+                )
+                for position in accepted
+            ],
+            return_exceptions=True
+        )
+
+        faces_by_event: Dict[int, List[DetectedFace]] = {}
+        identifications: List[Tuple[int, bool]] = []
+        for position, extraction in zip(accepted, extracted):
+            if isinstance(extraction, Exception):
+                outcomes[position] = extraction
+                continue
+            faces, is_duplicate = extraction
+            if not faces:
+                outcomes[position] = self._no_face_result(events[position].image_id)
+                continue
+            faces_by_event[position] = faces
+            if not events[position].person_name:
+                identifications.append((position, is_duplicate))
+
+        # Rank candidates before identification stores any encodings
+        candidates: Dict[int, List[List[PersonCandidate]]] = {}
+        for position, _ in identifications:
+            top_k = self._requested_top_k(events[position].metadata)
+            if top_k:
+                candidates[position] = await self.rank_faces(
+                    [face.encoding for face in faces_by_event[position]], top_k
+                )
+
+        face_results: Dict[int, List[ImageUploadResult]] = {}
+        new_encodings: Dict[int, List[FaceEncoding]] = {}
+        for position, faces in faces_by_event.items():
+            event = events[position]
+            if not event.person_name:
+                continue
+            try:
+                result, encoding = await self._prepare_registration(
+                    event.person_name, faces[0].encoding, event.image_bytes, file_exts[position]
+                )
+            except Exception as e:
+                outcomes[position] = e
+                continue
+            # Registration only uses the first face; the others are reported as-is
+            face_results[position] = [result] + [
+                ImageUploadResult(success=False, message="Only the first face is registered")
+                for _ in faces[1:]
+            ]
+            new_encodings[position] = [encoding]
+
+        if identifications:
+            # An identical or near-identical image was already processed; don't store its encodings again
+            identified, encodings = await self._match_images([
+                (faces_by_event[position], events[position].image_bytes, file_exts[position], not is_duplicate)
+                for position, is_duplicate in identifications
+            ])
+            for (position, _), results, image_encodings in zip(identifications, identified, encodings):
+                face_results[position] = results
+                if image_encodings:
+                    new_encodings[position] = image_encodings
+
+        # Every encoding of the batch goes out in one write. If that fails, each event's encodings are
+        # written on their own, so only the events that really cannot be stored fail (and are redelivered)
+        try:
+            await self._save_encodings([encoding for encodings in new_encodings.values() for encoding in encodings])
+        except Exception as e:
+            logger.warning(f"Batched write of {len(new_encodings)} events failed, writing them one by one: {e}")
+            for position, encodings in new_encodings.items():
+                try:
+                    await self._save_encodings(encodings)
+                except Exception as error:
+                    outcomes[position] = error
+
+        for position, results in face_results.items():
+            if outcomes[position] is None:
+                outcomes[position] = self._image_result(
+                    events[position].image_id,
+                    faces_by_event[position],
+                    results,
+                    candidates.get(position, [None] * len(results))
+                )
+        return outcomes
+
+    def _requested_top_k(self, metadata: Optional[Dict[str, Any]]) -> int:
+        """Candidates to rank per face as asked for in the event's metadata; 0 for no ranking."""
+        value = (metadata or {}).get("top_k")
+        if not value:
+            return 0
+        try:
+            top_k = int(value)
+        except (TypeError, ValueError):
+            # A malformed top_k should not fail the whole event
+            logger.warning(f"Ignoring invalid top_k {value!r}, ranking {self.settings.face_rank_default_top_k}")
+            top_k = self.settings.face_rank_default_top_k
+        return max(top_k, 1) if top_k else 0
+
+    def _detection_profile(self, person_name: Optional[str], metadata: Optional[Dict[str, Any]]) -> str:
+        # Registrations can afford the accurate path; events may pick a profile explicitly
+        return (metadata or {}).get("detection_profile") or (
+            self.settings.face_registration_profile if person_name else self.settings.face_detection_profile
+        )
+
+    @staticmethod
+    def _rejected_file_result(image_id: Optional[str], file_ext: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "image_id": image_id,
+            "message": f"File type {file_ext} not allowed"
+        }
+
+    @staticmethod
+    def _no_face_result(image_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "image_id": image_id,
+            "person_name": None,
+            "confidence": 0.0,
+            "message": "No face detected in the image",
+            "faces_found": 0,
+            "faces": []
+        }
+
+    @staticmethod
+    def _image_result(
+            image_id: Optional[str],
+            faces: List[DetectedFace],
+            face_results: List[ImageUploadResult],
+            candidates: List[Optional[List[PersonCandidate]]]
+    ) -> Dict[str, Any]:
+        # The first successful face summarises the image
+        result = next((r for r in face_results if r.success), face_results[0])
+
+        face_entries = []
+        for face, face_result, face_candidates in zip(faces, face_results, candidates):
+            entry = {
+                "success": face_result.success,
+                "bounding_box": face.bounding_box,
+                "person_name": face_result.person_name,
+                "confidence": face_result.confidence,
+                "is_new_person": face_result.is_new_person,
+                "message": face_result.message
+            }
+            if face_candidates is not None:
+                entry["candidates"] = [asdict(candidate) for candidate in face_candidates]
+            face_entries.append(entry)
 
         # Add image_id to result
         return {
@@ -280,5 +1224,6 @@ class FaceService(IFaceService):
             "image_path": result.image_path,
             "message": result.message,
             "is_new_person": result.is_new_person,
-            "faces_found": 1 if result.success else 0
+            "faces_found": len(faces),
+            "faces": face_entries
         }
\ No newline at end of file
@@ -0,0 +1,291 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from app.domain.models import SyncWatermark
+from app.services.face_gallery import FaceGallery
+
+logger = logging.getLogger(__name__)
+
+_FORMAT = 1
+_ARRAYS = ("ids", "person_ids", "matrix", "sq_norms")
+
+
+class GalleryFileSnapshot:
+    """
+    Gallery snapshot on local disk, opened with ``np.load(mmap_mode="r")``.
+
+    Each snapshot is a directory of ``.npy`` files (ids, person ids, the
+    float32 matrix and its squared norms) plus ``manifest.json`` naming the
+    current directory, its gallery version, row count and sync watermark.
+    A starting worker maps the arrays instead of reading them, so startup
+    does not depend on gallery size, and workers on one host share the
+    pages through the page cache. Directories are written in full before
+    the manifest is replaced, so a reader never sees a partial snapshot.
+    """
+
+    def __init__(self, directory: str, refresh_versions: int = 1000):
+        self.directory = Path(directory)
+        self.refresh_versions = refresh_versions
+        self._known_version: Optional[int] = None
+        self.loads = 0
+        self.publishes = 0
+        self.misses = 0
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def load(self, max_version: Optional[int] = None) -> Optional[Tuple[FaceGallery, SyncWatermark, int]]:
+        """
+        Map the current snapshot as (gallery, watermark, gallery version).
+
+        Returns None when there is none, it cannot be read, or it is newer
+        than ``max_version`` (the version counter was reset after it was written).
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            self.misses += 1
+            return None
+        if max_version is not None and manifest["version"] > max_version:
+            # Written before the counter was reset; it would never be replaced otherwise
+            self.manifest_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        snapshot_dir = self.directory / manifest["directory"]
+        try:
+            arrays = {name: np.load(snapshot_dir / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable gallery snapshot {snapshot_dir}: {e}")
+            self.misses += 1
+            return None
+        rows = manifest["rows"]
+        if any(len(array) < rows for array in arrays.values()):
+            logger.warning(f"Ignoring gallery snapshot {snapshot_dir}: shorter than the manifest says")
+            self.misses += 1
+            return None
+        arrays = {name: array[:rows] for name, array in arrays.items()}
+
+        gallery = FaceGallery.from_snapshot(**arrays)
+        self._known_version = manifest["version"]
+        self.loads += 1
+        return gallery, _watermark_from_json(manifest["watermark"]), manifest["version"]
+
+    def is_stale(self, version: Optional[int]) -> bool:
+        """Whether the snapshot on disk lags the given gallery version by refresh_versions or more."""
+        if version is None or not self.refresh_versions:
+            return False
+        if self._known_version is not None and version - self._known_version < self.refresh_versions:
+            return False
+
+        manifest = self._read_manifest()
+        self._known_version = manifest["version"] if manifest else None
+        return self._known_version is None or version - self._known_version >= self.refresh_versions
+
+    def publish(self, gallery: FaceGallery, watermark: SyncWatermark, version: int) -> bool:
+        """
+        Write the gallery as the snapshot for ``version``, including the
+        cold tier of a tiered gallery.
+
+        Returns False if another process on this host is writing one, or a
+        snapshot of the same or a newer version is already in place.
+        """
+        writer = self.open_writer(gallery.total_size, version, gallery.dimension)
+        if writer is None:
+            return False
+
+        with writer:
+            for segment in gallery.iter_segments():
+                writer.append(*segment)
+            return writer.commit(watermark)
+
+    def open_writer(self, rows: int, version: int, dimension: int) -> Optional["SnapshotWriter"]:
+        """
+        Start a snapshot of up to ``rows`` rows for ``version``, written
+        incrementally so it never has to be held in memory.
+
+        Returns None if another process on this host is writing one, or a
+        snapshot of the same or a newer version is already in place.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock = open(self.directory / ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+
+        current = self._read_manifest()
+        if current and current["version"] >= version:
+            self._known_version = current["version"]
+            lock.close()
+            return None
+
+        try:
+            return SnapshotWriter(self, lock, rows, dimension, version)
+        except OSError as e:
+            logger.warning(f"Gallery snapshot write failed: {e}")
+            lock.close()
+            return None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loads": self.loads,
+            "publishes": self.publishes,
+            "misses": self.misses,
+            "version": self._known_version if self._known_version is not None else -1
+        }
+
+    def _commit(self, name: str, rows: int, last_encoding_id: int, watermark: SyncWatermark, version: int):
+        manifest = {
+            "format": _FORMAT,
+            "directory": name,
+            "version": version,
+            "rows": rows,
+            "last_encoding_id": last_encoding_id,
+            "watermark": _watermark_to_json(watermark),
+            "created_at": datetime.utcnow().isoformat()
+        }
+        temporary = self.manifest_path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(manifest))
+        os.replace(temporary, self.manifest_path)
+
+        # Mapped files stay valid after unlinking, so older snapshots can go right away
+        for entry in self.directory.iterdir():
+            if entry.is_dir() and entry.name != name:
+                shutil.rmtree(entry, ignore_errors=True)
+
+        self._known_version = version
+        self.publishes += 1
+        logger.info(f"Wrote gallery snapshot of version {version} ({rows} encodings) to {self.directory}")
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable gallery snapshot manifest: {e}")
+            return None
+        return manifest if manifest.get("format") == _FORMAT else None
+
+
+class SnapshotWriter:
+    """
+    Writes one snapshot directory through memory-mapped ``.npy`` files.
+
+    Holds the host-wide snapshot lock until committed or closed; closing
+    without committing discards the directory.
+    """
+
+    def __init__(self, snapshot: GalleryFileSnapshot, lock, rows: int, dimension: int, version: int):
+        self.snapshot = snapshot
+        self.version = version
+        self.capacity = rows
+        self.rows = 0
+        self.last_encoding_id = 0
+        self._lock = lock
+        self.name = f"v{version}-{uuid.uuid4().hex[:8]}"
+        self.path = snapshot.directory / self.name
+        self.path.mkdir()
+
+        # Zero-length files cannot be mapped; the manifest row count is authoritative
+        shape = max(rows, 1)
+        self._arrays = {
+            "ids": np.lib.format.open_memmap(self.path / "ids.npy", "w+", np.int64, (shape,)),
+            "person_ids": np.lib.format.open_memmap(self.path / "person_ids.npy", "w+", np.int64, (shape,)),
+            "matrix": np.lib.format.open_memmap(self.path / "matrix.npy", "w+", np.float32, (shape, dimension)),
+            "sq_norms": np.lib.format.open_memmap(self.path / "sq_norms.npy", "w+", np.float32, (shape,))
+        }
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def remaining(self) -> int:
+        return self.capacity - self.rows
+
+    def append(
+            self,
+            encoding_ids: np.ndarray,
+            person_ids: np.ndarray,
+            encodings: np.ndarray,
+            sq_norms: Optional[np.ndarray] = None
+    ) -> int:
+        """Append rows; returns how many fit (the rest are beyond the announced row count)."""
+        count = min(len(encoding_ids), self.remaining)
+        if count <= 0:
+            return 0
+
+        start, end = self.rows, self.rows + count
+        block = np.asarray(encodings[:count], dtype=np.float32)
+        self._arrays["ids"][start:end] = encoding_ids[:count]
+        self._arrays["person_ids"][start:end] = person_ids[:count]
+        self._arrays["matrix"][start:end] = block
+        self._arrays["sq_norms"][start:end] = (
+            sq_norms[:count] if sq_norms is not None else np.einsum("ij,ij->i", block, block)
+        )
+        self.last_encoding_id = max(self.last_encoding_id, int(np.max(encoding_ids[:count])))
+        self.rows = end
+        return count
+
+    def commit(self, watermark: SyncWatermark) -> bool:
+        """Make the written rows the current snapshot."""
+        try:
+            for name, array in self._arrays.items():
+                array.flush()
+                with open(self.path / f"{name}.npy", "rb+") as f:
+                    os.fsync(f.fileno())
+            self._arrays.clear()
+            self.snapshot._commit(self.name, self.rows, self.last_encoding_id, watermark, self.version)
+        except OSError as e:
+            logger.warning(f"Gallery snapshot write failed: {e}")
+            return False
+        finally:
+            self.close()
+        return True
+
+    def close(self):
+        if self._lock is None:
+            return
+        if self._arrays:
+            self._arrays.clear()
+            shutil.rmtree(self.path, ignore_errors=True)
+        self._lock.close()
+        self._lock = None
+
+
+def _watermark_to_json(watermark: SyncWatermark) -> Dict[str, Any]:
+    return {
+        "encoding_id": watermark.encoding_id,
+        "encoding_created_at": _isoformat(watermark.encoding_created_at),
+        "tombstone_id": watermark.tombstone_id,
+        "tombstone_deleted_at": _isoformat(watermark.tombstone_deleted_at)
+    }
+
+
+def _watermark_from_json(data: Dict[str, Any]) -> SyncWatermark:
+    return SyncWatermark(
+        encoding_id=data["encoding_id"],
+        encoding_created_at=_parse(data["encoding_created_at"]),
+        tombstone_id=data["tombstone_id"],
+        tombstone_deleted_at=_parse(data["tombstone_deleted_at"])
+    )
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
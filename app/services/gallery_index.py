@@ -0,0 +1,435 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows assigned to lists per matrix product while training
+_ASSIGN_CHUNK = 65536
+
+
+class GalleryIndex(ABC):
+    """
+    Candidate generator attached to a FaceGallery.
+
+    An index only narrows down which gallery rows a probe is compared
+    against; the final distances are always computed exactly by the gallery.
+    """
+
+    @property
+    @abstractmethod
+    def is_ready(self) -> bool:
+        pass
+
+    @abstractmethod
+    def on_attach(self, gallery) -> None:
+        """Called once when the index is attached to a populated gallery."""
+        pass
+
+    @abstractmethod
+    def on_extend(self, gallery, start: int, end: int) -> None:
+        """Called after rows [start, end) were appended to the gallery."""
+        pass
+
+    @abstractmethod
+    def on_remap(self, gallery, remap: np.ndarray) -> None:
+        """Called after compaction; remap[old_row] is the new row or -1."""
+        pass
+
+    @abstractmethod
+    def candidates(self, probe: np.ndarray) -> np.ndarray:
+        """Return the gallery rows worth comparing exactly against the probe."""
+        pass
+
+    def refresh(self) -> None:
+        """Install work finished in the background, e.g. a trained index; called before searching."""
+        pass
+
+    def close(self) -> None:
+        """Release background resources."""
+        pass
+
+
+class _InvertedLists:
+    """Growable per-list arrays of gallery rows."""
+
+    def __init__(self, count: int = 0):
+        self._lists: List[np.ndarray] = []
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self.resize(count)
+
+    def __len__(self) -> int:
+        return len(self._lists)
+
+    def resize(self, count: int) -> None:
+        while len(self._lists) < count:
+            self._lists.append(np.empty(0, dtype=np.int64))
+        if len(self.sizes) < count:
+            self.sizes = np.concatenate([self.sizes, np.zeros(count - len(self.sizes), dtype=np.int64)])
+
+    def rows(self, list_id: int) -> np.ndarray:
+        return self._lists[list_id][:self.sizes[list_id]]
+
+    def gather(self, list_ids: np.ndarray) -> np.ndarray:
+        if len(list_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.rows(list_id) for list_id in list_ids])
+
+    def append(self, list_id: int, rows: np.ndarray) -> None:
+        size = self.sizes[list_id]
+        members = self._lists[list_id]
+        needed = size + len(rows)
+        if needed > len(members):
+            grown = np.empty(max(needed, 2 * len(members)), dtype=np.int64)
+            grown[:size] = members[:size]
+            self._lists[list_id] = members = grown
+        members[size:needed] = rows
+        self.sizes[list_id] = needed
+
+    def append_grouped(self, list_ids: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Append each row to its list; returns the distinct lists touched."""
+        order = np.argsort(list_ids, kind="stable")
+        unique_ids, starts = np.unique(list_ids[order], return_index=True)
+        for list_id, members in zip(unique_ids, np.split(rows[order], starts[1:])):
+            self.append(int(list_id), members)
+        return unique_ids
+
+    def remap(self, remap: np.ndarray) -> np.ndarray:
+        """Rewrite rows after gallery compaction; returns lists that lost rows."""
+        changed = []
+        for list_id in range(len(self._lists)):
+            size = self.sizes[list_id]
+            if size == 0:
+                continue
+            rows = remap[self._lists[list_id][:size]]
+            rows = rows[rows >= 0]
+            self._lists[list_id][:len(rows)] = rows
+            if len(rows) != size:
+                self.sizes[list_id] = len(rows)
+                changed.append(list_id)
+        return np.asarray(changed, dtype=np.int64)
+
+
+class IVFIndex(GalleryIndex):
+    """
+    Inverted-file index over the gallery.
+
+    Rows are partitioned by their nearest k-means centroid. A query only
+    scans the rows of the ``n_probe`` closest lists, so ``n_probe`` trades
+    recall for latency (``n_probe == n_lists`` is an exact scan).
+
+    With ``background`` set, k-means training and the initial assignment run
+    in a worker thread on a frozen view of the gallery. Until the first
+    index is ready the gallery is scanned exactly; a retrain keeps serving
+    the old lists. The result is swapped in by the next ``refresh`` or
+    gallery change after it is done.
+    """
+
+    def __init__(
+            self,
+            n_lists: int = 0,
+            n_probe: int = 8,
+            min_train_size: int = 10000,
+            train_iterations: int = 10,
+            path: Optional[str] = None,
+            seed: int = 0,
+            background: bool = True
+    ):
+        self.n_lists = n_lists  # 0 picks ~sqrt(N) at training time
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.path = path
+        self.seed = seed
+        self.background = background
+
+        self.centroids: Optional[np.ndarray] = None
+        self._lists = _InvertedLists()
+        self._trained_size = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Training in progress: its future, the gallery, and where the rows of its frozen view are now
+        self._pending: Optional[Tuple[Future, Any, np.ndarray]] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, gallery) -> None:
+        """Train centroids on the gallery and assign every row to a list."""
+        self.centroids, self._lists, self._trained_size = self._train(gallery)
+        logger.info(f"Built IVF index: {self._trained_size} rows in {len(self.centroids)} lists")
+        if self.path:
+            self.save(self.path, gallery)
+
+    def on_attach(self, gallery) -> None:
+        if self.path and self.load(self.path, gallery):
+            return
+        if len(gallery) >= self.min_train_size:
+            self._schedule_build(gallery)
+
+    def on_extend(self, gallery, start: int, end: int) -> None:
+        if self._install_trained():
+            # The new rows were assigned along with everything added during training
+            return
+        if self.centroids is None:
+            if len(gallery) >= self.min_train_size:
+                self._schedule_build(gallery)
+            return
+
+        # Centroids drift as the gallery grows far beyond what they were trained on
+        if len(gallery) > 4 * self._trained_size:
+            if not self.background:
+                # Rebuilt in place, the new rows included
+                self.build(gallery)
+                return
+            self._schedule_build(gallery)
+
+        self._assign(np.arange(start, end, dtype=np.int64), gallery.encodings_at(slice(start, end)))
+
+    def on_remap(self, gallery, remap: np.ndarray) -> None:
+        if self._pending is not None:
+            future, owner, rows = self._pending
+            self._pending = (future, owner, np.where(rows >= 0, remap[np.maximum(rows, 0)], -1))
+        if self.centroids is not None:
+            self._lists.remap(remap)
+
+    def candidates(self, probe: np.ndarray) -> np.ndarray:
+        probe = np.asarray(probe, dtype=np.float32).reshape(1, -1)
+        n_probe = min(self.n_probe, len(self.centroids))
+
+        sq = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * (self.centroids @ probe[0])
+        nearest_lists = np.argpartition(sq, n_probe - 1)[:n_probe]
+
+        return self._lists.gather(nearest_lists)
+
+    def refresh(self) -> None:
+        self._install_trained()
+
+    def close(self) -> None:
+        """Stop the training thread. Queued saves are written first; a training still running is dropped."""
+        if self._executor is None:
+            return
+        self._pending = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def save(self, path: str, gallery) -> None:
+        """Persist centroids and list membership (as encoding ids) to disk."""
+        self._write(path, *self._export(gallery))
+
+    def load(self, path: str, gallery) -> bool:
+        """
+        Restore a saved index for the given gallery.
+        Encodings deleted since the save are dropped, new ones are assigned.
+        """
+        if not os.path.exists(path):
+            return False
+
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            list_sizes = data["list_sizes"]
+            encoding_ids = data["encoding_ids"]
+            trained_size = int(data["trained_size"])
+
+        if centroids.shape[1] != gallery.dimension:
+            logger.warning(f"Ignoring IVF index at {path}: dimension mismatch")
+            return False
+
+        # Map saved encoding ids onto current gallery rows
+        rows = gallery.rows_for_ids(encoding_ids)
+
+        self.centroids = centroids.astype(np.float32)
+        self._trained_size = trained_size
+        self._lists = _InvertedLists(len(centroids))
+        for list_id, members in enumerate(np.split(rows, np.cumsum(list_sizes)[:-1])):
+            self._lists.append(list_id, members[members >= 0])
+
+        missing = self._assign_missing(gallery)
+        logger.info(f"Loaded IVF index from {path}: {len(centroids)} lists, {missing} rows added")
+        return True
+
+    def _schedule_build(self, gallery) -> None:
+        if not self.background:
+            self.build(gallery)
+            return
+        if self._pending is not None:
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ivf-train")
+        view = gallery.frozen()
+        self._pending = (self._executor.submit(self._train, view), gallery, np.arange(len(view), dtype=np.int64))
+        logger.info(f"Training IVF index on {len(view)} rows in the background")
+
+    def _install_trained(self) -> bool:
+        """Swap in a finished background training. Returns whether it did."""
+        if self._pending is None or not self._pending[0].done():
+            return False
+
+        future, gallery, rows = self._pending
+        self._pending = None
+        try:
+            centroids, lists, trained_size = future.result()
+        except Exception as e:
+            logger.warning(f"IVF index training failed: {e}")
+            return False
+
+        # Follow the rows through compactions since the view was taken, then add the newer ones
+        lists.remap(rows)
+        self.centroids, self._lists, self._trained_size = centroids, lists, trained_size
+        missing = self._assign_missing(gallery)
+        logger.info(f"Built IVF index: {trained_size} rows in {len(centroids)} lists, {missing} rows added since")
+        if self.path:
+            self._executor.submit(self._write, self.path, *self._export(gallery))
+        return True
+
+    def _train(self, gallery) -> Tuple[np.ndarray, _InvertedLists, int]:
+        """K-means centroids for the gallery and its rows grouped by nearest centroid."""
+        size = len(gallery)
+        n_lists = self.n_lists or int(np.clip(np.sqrt(size), 1, 4096))
+        n_lists = min(n_lists, size)
+
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample; 256 points per list is plenty for k-means
+        sample_size = min(size, n_lists * 256)
+        sample = gallery.encodings_at(np.sort(rng.choice(size, sample_size, replace=False)))
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assignment = self._nearest_centroid(centroids, sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            filled = counts > 0
+            # Empty lists keep their previous centroid
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        lists = _InvertedLists(n_lists)
+        for start in range(0, size, _ASSIGN_CHUNK):
+            end = min(start + _ASSIGN_CHUNK, size)
+            vectors = gallery.encodings_at(slice(start, end))
+            lists.append_grouped(self._nearest_centroid(centroids, vectors), np.arange(start, end, dtype=np.int64))
+        return centroids, lists, size
+
+    def _assign_missing(self, gallery) -> int:
+        assigned = np.zeros(len(gallery), dtype=bool)
+        assigned[self._lists.gather(np.arange(len(self._lists)))] = True
+        missing = np.flatnonzero(~assigned)
+        if len(missing):
+            self._assign(missing, gallery.encodings_at(missing))
+        return len(missing)
+
+    def _export(self, gallery) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        sizes = self._lists.sizes.copy()
+        rows = self._lists.gather(np.arange(len(sizes)))
+        return self.centroids, sizes, gallery.ids[rows], self._trained_size
+
+    @staticmethod
+    def _write(path: str, centroids: np.ndarray, list_sizes: np.ndarray, encoding_ids: np.ndarray, trained_size: int):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=centroids,
+            list_sizes=list_sizes,
+            encoding_ids=encoding_ids,
+            trained_size=np.int64(trained_size)
+        )
+        os.replace(tmp_path, path)
+
+    def _assign(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if len(rows):
+            self._lists.append_grouped(self._nearest_centroid(self.centroids, vectors), rows)
+
+    @staticmethod
+    def _nearest_centroid(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        # ||v||^2 is constant per row, so it does not affect the argmin
+        sq = np.einsum("ij,ij->i", centroids, centroids)[None, :] - 2.0 * (vectors @ centroids.T)
+        return np.argmin(sq, axis=1)
+
+
+class PersonPrototypeIndex(GalleryIndex):
+    """
+    Two-stage person prefilter.
+
+    Keeps one centroid per person, updated incrementally as encodings are
+    added. A query ranks persons by centroid distance and returns only the
+    rows of the ``top_persons`` closest persons for exact comparison, so the
+    cost is O(persons + top_persons * encodings_per_person).
+    """
+
+    def __init__(self, top_persons: int = 5, dimension: int = 128):
+        self.top_persons = top_persons
+        self._slots: Dict[int, int] = {}
+        self._sums = np.zeros((0, dimension), dtype=np.float64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._centroids = np.zeros((0, dimension), dtype=np.float32)
+        self._rows = _InvertedLists()
+
+    @property
+    def is_ready(self) -> bool:
+        return True
+
+    def on_attach(self, gallery) -> None:
+        if len(gallery):
+            self.on_extend(gallery, 0, len(gallery))
+
+    def on_extend(self, gallery, start: int, end: int) -> None:
+        person_ids = gallery.person_ids[start:end]
+        slots = np.fromiter(
+            (self._slot_for(int(person_id)) for person_id in person_ids),
+            dtype=np.int64,
+            count=end - start
+        )
+
+        np.add.at(self._sums, slots, gallery.encodings_at(slice(start, end)))
+        np.add.at(self._counts, slots, 1)
+        touched = self._rows.append_grouped(slots, np.arange(start, end, dtype=np.int64))
+        self._refresh_centroids(touched)
+
+    def on_remap(self, gallery, remap: np.ndarray) -> None:
+        changed = self._rows.remap(remap)
+        for slot in changed:
+            rows = self._rows.rows(slot)
+            self._sums[slot] = gallery.encodings_at(rows).sum(axis=0, dtype=np.float64)
+            self._counts[slot] = len(rows)
+        self._refresh_centroids(changed)
+
+    def candidates(self, probe: np.ndarray) -> np.ndarray:
+        probe = np.asarray(probe, dtype=np.float32).reshape(-1)
+        active = self._counts > 0
+        n_active = int(np.count_nonzero(active))
+        if n_active == 0:
+            return np.empty(0, dtype=np.int64)
+
+        sq = np.einsum("ij,ij->i", self._centroids, self._centroids) - 2.0 * (self._centroids @ probe)
+        sq[~active] = np.inf
+
+        top = min(self.top_persons, n_active)
+        nearest_slots = np.argpartition(sq, top - 1)[:top]
+        return self._rows.gather(nearest_slots)
+
+    def _slot_for(self, person_id: int) -> int:
+        slot = self._slots.get(person_id)
+        if slot is None:
+            slot = len(self._slots)
+            self._slots[person_id] = slot
+            if slot >= len(self._counts):
+                self._grow(max(2 * len(self._counts), 16))
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        extra = capacity - len(self._counts)
+        dimension = self._sums.shape[1]
+        self._sums = np.vstack([self._sums, np.zeros((extra, dimension), dtype=np.float64)])
+        self._centroids = np.vstack([self._centroids, np.zeros((extra, dimension), dtype=np.float32)])
+        self._counts = np.concatenate([self._counts, np.zeros(extra, dtype=np.int64)])
+        self._rows.resize(capacity)
+
+    def _refresh_centroids(self, slots: np.ndarray) -> None:
+        if len(slots) == 0:
+            return
+        counts = np.maximum(self._counts[slots], 1)
+        self._centroids[slots] = self._sums[slots] / counts[:, None]
@@ -0,0 +1,138 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from app.services.face_gallery import FaceGallery
+
+
+def pairwise_distances(points: np.ndarray) -> np.ndarray:
+    sq_norms = np.einsum("ij,ij->i", points, points)
+    sq = sq_norms[:, None] + sq_norms[None, :] - 2.0 * (points @ points.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq)
+
+
+def farthest_point_selection(points: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of k points covering the set (greedy k-center).
+
+    Starts from the point closest to the mean, so a typical sample is
+    always kept, then repeatedly adds the point farthest from everything
+    selected so far.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    if len(points) <= k:
+        return np.arange(len(points))
+
+    centre = points.mean(axis=0)
+    selected = [int(np.argmin(np.linalg.norm(points - centre, axis=1)))]
+    nearest = np.linalg.norm(points - points[selected[0]], axis=1)
+    for _ in range(k - 1):
+        index = int(np.argmax(nearest))
+        selected.append(index)
+        np.minimum(nearest, np.linalg.norm(points - points[index], axis=1), out=nearest)
+
+    return np.array(selected)
+
+
+class RetentionPolicy:
+    """
+    Keeps each person's encodings few and diverse.
+
+    A new encoding within ``epsilon`` of one the person already has adds
+    nothing and is not stored. Once a person has ``max_per_person``
+    encodings, a new one only goes in by replacing a member of the
+    closest pair, and only if it is not itself part of that pair, so the
+    stored set keeps its spread while its size stays fixed.
+    """
+
+    def __init__(self, max_per_person: int = 0, epsilon: float = 0.0):
+        self.max_per_person = max_per_person
+        self.epsilon = epsilon
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_per_person or self.epsilon)
+
+    def plan(self, gallery: FaceGallery, person_id: int, encoding: np.ndarray) -> Tuple[bool, List[int]]:
+        """Decide whether to store an encoding; returns (store, encoding ids to evict)."""
+        rows = gallery.rows_for_person(person_id)
+        if len(rows) == 0:
+            return True, []
+
+        if self.epsilon and gallery.distances(encoding, rows).min() < self.epsilon:
+            return False, []
+
+        if not self.max_per_person or len(rows) < self.max_per_person:
+            return True, []
+
+        points = np.vstack([gallery.encodings_at(rows), np.asarray(encoding, dtype=np.float32).reshape(1, -1)])
+        distances = pairwise_distances(points)
+        np.fill_diagonal(distances, np.inf)
+        first, second = np.unravel_index(int(np.argmin(distances)), distances.shape)
+
+        new = len(rows)
+        if new in (first, second):
+            return False, []
+
+        # Of the closest pair, drop the one that is also closer to the rest
+        runner_up = np.partition(distances[[first, second]], 1, axis=1)[:, 1]
+        dropped = first if runner_up[0] <= runner_up[1] else second
+        return True, [int(gallery.ids[rows[dropped]])]
+
+    def plan_batch(
+            self,
+            gallery: FaceGallery,
+            person_ids: List[int],
+            encodings: List[np.ndarray]
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Plan several new encodings in order, each decision seeing the ones
+        made before it. Returns the positions to store and the encoding ids
+        to evict; an encoding of the batch replaced later in it is dropped.
+        """
+        # A planning view of the persons' rows; the batch's kept encodings go in under negative ids
+        rows = np.flatnonzero(np.isin(gallery.person_ids, person_ids))
+        view = FaceGallery(capacity=len(rows) + len(encodings), dimension=gallery.dimension)
+        view.extend(gallery.ids[rows], gallery.person_ids[rows], gallery.encodings_at(rows))
+
+        kept = []
+        evicted = []
+        for position, (person_id, encoding) in enumerate(zip(person_ids, encodings)):
+            store, replaced = self.plan(view, person_id, encoding)
+            if not store:
+                continue
+            # Evicted rows leave the view, so no id is planned for eviction twice
+            view.evict(replaced)
+            for encoding_id in replaced:
+                if encoding_id < 0:
+                    kept.remove(-1 - encoding_id)
+                else:
+                    evicted.append(encoding_id)
+            view.add(-1 - position, person_id, encoding)
+            kept.append(position)
+
+        return kept, evicted
+
+    def prune(self, gallery: FaceGallery, exclude: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Encoding ids to delete so no person exceeds the cap, keeping the
+        most spread-out samples. Rows set in ``exclude`` are left out.
+        """
+        if not self.max_per_person or len(gallery) == 0:
+            return []
+
+        candidates = np.flatnonzero(~exclude) if exclude is not None else np.arange(len(gallery))
+        candidate_person_ids = gallery.person_ids[candidates]
+        person_ids, counts = np.unique(candidate_person_ids, return_counts=True)
+        if not np.any(counts > self.max_per_person):
+            return []
+
+        order = candidates[np.argsort(candidate_person_ids, kind="stable")]
+        evicted = []
+        for rows, count in zip(np.split(order, np.cumsum(counts)[:-1]), counts):
+            if count <= self.max_per_person:
+                continue
+            keep = np.zeros(count, dtype=bool)
+            keep[farthest_point_selection(gallery.encodings_at(rows), self.max_per_person)] = True
+            evicted.extend(int(encoding_id) for encoding_id in gallery.ids[rows[~keep]])
+
+        return evicted
@@ -0,0 +1,244 @@
+import logging
+import struct
+from typing import Dict, Optional, Tuple
+import numpy as np
+import redis
+from app.domain.models import SyncWatermark
+from app.services.face_gallery import FaceGallery
+from app.utils.time_utils import to_micros, from_micros
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<4sIIqqqq")
+_FORMAT_TAG = b"GSN1"
+
+
+class GallerySnapshotCache:
+    """
+    Binary gallery snapshot shared through Redis.
+
+    A cold-starting worker reads the snapshot (ids, person ids and the
+    float32 matrix, split into chunks) and then only asks the database for
+    the delta since the watermark stored with it, instead of streaming the
+    whole table. Chunks are written under a fresh snapshot id and never
+    modified; a small manifest naming the current id is swapped in last,
+    and only if it is not older than the one already there, so readers
+    never see a half-written or mixed snapshot.
+    """
+
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            chunk_size: int = 4 * 1024 * 1024,
+            ttl: int = 86400,
+            refresh_versions: int = 1000,
+            key_prefix: str = "gallery_snapshot"
+    ):
+        self.redis_client = redis_client
+        self.chunk_size = max(chunk_size, 1024)
+        self.ttl = ttl
+        self.refresh_versions = refresh_versions
+        self.key_prefix = key_prefix
+        self._known_version: Optional[int] = None
+        self.loads = 0
+        self.publishes = 0
+        self.misses = 0
+
+    @property
+    def manifest_key(self) -> str:
+        return f"{self.key_prefix}:manifest"
+
+    def chunk_key(self, snapshot_id: int, chunk: int) -> str:
+        return f"{self.key_prefix}:{snapshot_id}:{chunk}"
+
+    def load(self, max_version: Optional[int] = None) -> Optional[Tuple[FaceGallery, SyncWatermark, int]]:
+        """
+        Read the current snapshot as (gallery, watermark, gallery version).
+
+        Returns None when there is no usable snapshot: none was published,
+        a chunk has expired, or it is stamped with a gallery version newer
+        than ``max_version`` (the version counter was reset after it was written).
+        """
+        try:
+            manifest = self._read_manifest()
+            if manifest is None:
+                self.misses += 1
+                return None
+            if max_version is not None and manifest["version"] > max_version:
+                # Written before the counter was reset; it would never be replaced otherwise
+                self.redis_client.delete(self.manifest_key)
+                self.misses += 1
+                return None
+
+            chunks = self.redis_client.mget([
+                self.chunk_key(manifest["id"], chunk) for chunk in range(manifest["chunks"])
+            ])
+        except redis.RedisError as e:
+            logger.warning(f"Gallery snapshot lookup failed: {e}")
+            self.misses += 1
+            return None
+
+        if any(chunk is None for chunk in chunks):
+            logger.info(f"Gallery snapshot {manifest['id']} is incomplete, ignoring it")
+            self.misses += 1
+            return None
+
+        try:
+            gallery, watermark = self._unpack(b"".join(chunks))
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable gallery snapshot: {e}")
+            self.misses += 1
+            return None
+
+        self._known_version = manifest["version"]
+        self.loads += 1
+        return gallery, watermark, manifest["version"]
+
+    def is_stale(self, version: Optional[int]) -> bool:
+        """Whether the shared snapshot lags the given gallery version by refresh_versions or more."""
+        if version is None or not self.refresh_versions:
+            return False
+        if self._known_version is not None and version - self._known_version < self.refresh_versions:
+            return False
+
+        try:
+            manifest = self._read_manifest()
+        except redis.RedisError:
+            return False
+        self._known_version = manifest["version"] if manifest else None
+        return self._known_version is None or version - self._known_version >= self.refresh_versions
+
+    def publish(self, gallery: FaceGallery, watermark: SyncWatermark, version: int) -> bool:
+        """
+        Store the gallery as the shared snapshot for ``version``.
+
+        Returns False if another worker is publishing, a snapshot of the
+        same or a newer version is already in place, or Redis failed.
+        """
+        lock_key = f"{self.key_prefix}:lock"
+        try:
+            if not self.redis_client.set(lock_key, 1, nx=True, ex=60):
+                return False
+        except redis.RedisError as e:
+            logger.warning(f"Gallery snapshot publish failed: {e}")
+            return False
+
+        try:
+            return self._publish(gallery, watermark, version)
+        finally:
+            try:
+                self.redis_client.delete(lock_key)
+            except redis.RedisError:
+                pass
+
+    def _publish(self, gallery: FaceGallery, watermark: SyncWatermark, version: int) -> bool:
+        payload = self._pack(gallery, watermark)
+        chunks = [payload[start:start + self.chunk_size] for start in range(0, len(payload), self.chunk_size)]
+
+        try:
+            snapshot_id = self.redis_client.incr(f"{self.key_prefix}:seq")
+            pipe = self.redis_client.pipeline(transaction=False)
+            for chunk, data in enumerate(chunks):
+                pipe.set(self.chunk_key(snapshot_id, chunk), data, ex=self.ttl or None)
+            pipe.execute()
+
+            previous = self._swap_manifest(snapshot_id, len(chunks), version, len(gallery))
+            if previous is False:
+                self.redis_client.delete(*[self.chunk_key(snapshot_id, chunk) for chunk in range(len(chunks))])
+                return False
+
+            # Readers may still be fetching the old chunks; let them expire instead of deleting
+            if previous is not None:
+                old_id, old_chunks = previous
+                pipe = self.redis_client.pipeline(transaction=False)
+                for chunk in range(old_chunks):
+                    pipe.expire(self.chunk_key(old_id, chunk), 60)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Gallery snapshot publish failed: {e}")
+            return False
+
+        self._known_version = version
+        self.publishes += 1
+        logger.info(f"Published gallery snapshot {snapshot_id} ({len(gallery)} encodings, {len(payload)} bytes)")
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loads": self.loads,
+            "publishes": self.publishes,
+            "misses": self.misses,
+            "version": self._known_version if self._known_version is not None else -1
+        }
+
+    def _read_manifest(self) -> Optional[Dict[str, int]]:
+        manifest = self.redis_client.hgetall(self.manifest_key)
+        if not manifest:
+            return None
+        return {key.decode(): int(value) for key, value in manifest.items()}
+
+    def _swap_manifest(self, snapshot_id: int, chunks: int, version: int, rows: int):
+        """Point the manifest at a new snapshot unless a newer one is there; returns the replaced (id, chunks)."""
+        replaced = []
+
+        def swap(pipe: redis.client.Pipeline):
+            current = pipe.hgetall(self.manifest_key)
+            current = {key.decode(): int(value) for key, value in current.items()}
+            if current and current["version"] >= version:
+                replaced.append(False)
+                pipe.multi()
+                return
+            pipe.multi()
+            pipe.hset(self.manifest_key, mapping={
+                "id": snapshot_id, "chunks": chunks, "version": version, "rows": rows
+            })
+            if self.ttl:
+                pipe.expire(self.manifest_key, self.ttl)
+            replaced.append((current["id"], current["chunks"]) if current else None)
+
+        self.redis_client.transaction(swap, self.manifest_key)
+        return replaced[-1]
+
+    @staticmethod
+    def _pack(gallery: FaceGallery, watermark: SyncWatermark) -> bytes:
+        header = _HEADER.pack(
+            _FORMAT_TAG,
+            len(gallery),
+            gallery.dimension,
+            watermark.encoding_id,
+            to_micros(watermark.encoding_created_at),
+            watermark.tombstone_id,
+            to_micros(watermark.tombstone_deleted_at)
+        )
+        return b"".join([
+            header,
+            gallery.ids.astype("<i8").tobytes(),
+            gallery.person_ids.astype("<i8").tobytes(),
+            gallery.matrix.astype("<f4").tobytes()
+        ])
+
+    @staticmethod
+    def _unpack(payload: bytes) -> Tuple[FaceGallery, SyncWatermark]:
+        tag, count, dimension, encoding_id, created_at, tombstone_id, deleted_at = _HEADER.unpack_from(payload)
+        if tag != _FORMAT_TAG:
+            raise ValueError(f"Unknown gallery snapshot format: {tag!r}")
+        expected = _HEADER.size + count * (16 + 4 * dimension)
+        if len(payload) != expected:
+            raise ValueError(f"Gallery snapshot is {len(payload)} bytes, expected {expected}")
+
+        offset = _HEADER.size
+        encoding_ids = np.frombuffer(payload, dtype="<i8", count=count, offset=offset)
+        offset += encoding_ids.nbytes
+        person_ids = np.frombuffer(payload, dtype="<i8", count=count, offset=offset)
+        offset += person_ids.nbytes
+        matrix = np.frombuffer(payload, dtype="<f4", count=count * dimension, offset=offset).reshape(count, dimension)
+
+        gallery = FaceGallery(capacity=count, dimension=dimension)
+        gallery.extend(encoding_ids, person_ids, matrix)
+        watermark = SyncWatermark(
+            encoding_id=encoding_id,
+            encoding_created_at=from_micros(created_at),
+            tombstone_id=tombstone_id,
+            tombstone_deleted_at=from_micros(deleted_at)
+        )
+        return gallery, watermark
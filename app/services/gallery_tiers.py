@@ -0,0 +1,172 @@
+import copy
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from app.services.face_gallery import FaceGallery
+
+# float32 row plus id, person id and squared norm
+HOT_ROW_BYTES = 128 * 4 + 8 + 8 + 4
+
+
+class ColdTier:
+    """
+    Memory-mapped, read-only tier of a gallery.
+
+    Holds the rows of an on-disk snapshot; the resident FaceGallery it is
+    attached to is the hot tier. Cold rows are never moved or rewritten:
+    deleting them or promoting them into the hot tier only flips masks, and
+    demoting a person makes their cold rows live again. The segment is only
+    scanned for faces the hot tier has no match for, and the persons found
+    there are promoted. Persons are demoted least recently used first
+    whenever the hot tier grows past ``max_hot_rows``.
+    """
+
+    def __init__(self, gallery: FaceGallery, max_hot_rows: int):
+        self.gallery = gallery
+        self.max_hot_rows = max_hot_rows
+        self.deleted = np.zeros(len(gallery), dtype=bool)
+        self.promoted = np.zeros(len(gallery), dtype=bool)
+
+        # Sorted copies of the id columns (16 bytes a row) for lookups without touching the matrix
+        self._id_order = np.argsort(gallery.ids, kind="stable")
+        self._sorted_ids = np.asarray(gallery.ids)[self._id_order]
+        self._person_order = np.argsort(gallery.person_ids, kind="stable")
+        self._sorted_person_ids = np.asarray(gallery.person_ids)[self._person_order]
+
+        # Persons by recency of use, least recent first
+        self._recency: "OrderedDict[int, None]" = OrderedDict()
+        self.promotions = 0
+        self.demotions = 0
+
+    def __len__(self) -> int:
+        return len(self.deleted) - int(np.count_nonzero(self.excluded))
+
+    @property
+    def excluded(self) -> np.ndarray:
+        """Rows a cold search must skip: deleted, or resident in the hot tier."""
+        return self.deleted | self.promoted
+
+    def frozen(self) -> "ColdTier":
+        """Copy with its own masks, for reading on another thread while this one keeps changing."""
+        view = copy.copy(self)
+        view.deleted = self.deleted.copy()
+        view.promoted = self.promoted.copy()
+        return view
+
+    def has_ids(self, encoding_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask of the given encoding ids present (and not deleted) in this tier."""
+        encoding_ids = np.asarray(encoding_ids, dtype=np.int64)
+        found, rows = self._find_ids(encoding_ids)
+        mask = np.zeros(len(encoding_ids), dtype=bool)
+        mask[found] = ~self.deleted[rows]
+        return mask
+
+    def remove_ids(self, encoding_ids: Iterable[int]) -> int:
+        """Mark encodings deleted. Returns rows removed that were not in the hot tier."""
+        _, rows = self._find_ids(np.fromiter(encoding_ids, dtype=np.int64))
+        return self._delete(rows)
+
+    def remove_person(self, person_id: int) -> int:
+        return self._delete(self.rows_for_person(person_id))
+
+    def rows_for_person(self, person_id: int) -> np.ndarray:
+        start, end = np.searchsorted(self._sorted_person_ids, [person_id, person_id + 1])
+        return self._person_order[start:end]
+
+    def take_person(self, person_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Live rows of a person as (ids, person ids, encodings), now marked as resident in the hot tier."""
+        rows = self.rows_for_person(person_id)
+        rows = np.sort(rows[~self.excluded[rows]])
+        self.promoted[rows] = True
+        if len(rows):
+            self.promotions += 1
+        return self.gallery.ids[rows], self.gallery.person_ids[rows], self.gallery.encodings_at(rows)
+
+    def adopt(self, hot: FaceGallery):
+        """Mark rows the hot tier already holds, e.g. after this tier replaced an older one."""
+        _, rows = self._find_ids(hot.ids)
+        self.promoted[rows] = True
+
+    def touch(self, person_ids: Iterable[int]):
+        for person_id in person_ids:
+            self._recency[person_id] = None
+            self._recency.move_to_end(person_id)
+
+    def recent_persons(self) -> List[int]:
+        """Persons by recency of use, least recent first."""
+        return list(self._recency)
+
+    def rebalance(self, hot: FaceGallery) -> bool:
+        """
+        Demote least recently used persons until the hot tier fits its
+        budget. Only rows with a copy in this tier can be demoted; returns
+        False when the rest, rows that exist only in memory, still do not fit.
+        """
+        excess = len(hot) - self.max_hot_rows
+        if excess <= 0:
+            return True
+
+        found, rows = self._find_ids(hot.ids)
+        demotable = np.zeros(len(hot), dtype=bool)
+        demotable[found] = self.promoted[rows]
+        if not np.any(demotable):
+            return False
+
+        # Rank persons by recency; persons never used here rank before all others
+        rank = {person_id: position for position, person_id in enumerate(self._recency)}
+        person_ids, counts = np.unique(hot.person_ids[demotable], return_counts=True)
+        order = np.argsort([rank.get(int(person_id), -1) for person_id in person_ids], kind="stable")
+        needed = int(np.searchsorted(np.cumsum(counts[order]), excess)) + 1
+        demoted_persons = person_ids[order[:needed]]
+
+        selected = demotable & np.isin(hot.person_ids, demoted_persons)
+        cold_rows = np.full(len(hot), -1, dtype=np.int64)
+        cold_rows[found] = rows
+        self.promoted[cold_rows[selected]] = False
+        hot.evict(hot.ids[selected])
+        for person_id in demoted_persons:
+            self._recency.pop(int(person_id), None)
+        self.demotions += len(demoted_persons)
+
+        return len(hot) <= self.max_hot_rows
+
+    def iter_live(self, chunk_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Rows not deleted and not in the hot tier, as (ids, person ids, encodings, squared norms) chunks."""
+        excluded = self.excluded
+        for start in range(0, len(excluded), chunk_size):
+            keep = ~excluded[start:start + chunk_size]
+            end = start + len(keep)
+            yield (
+                self.gallery.ids[start:end][keep],
+                self.gallery.person_ids[start:end][keep],
+                self.gallery.encodings_at(slice(start, end))[keep],
+                self.gallery.sq_norms[start:end][keep]
+            )
+
+    def stats(self, hot: FaceGallery) -> Dict[str, float]:
+        return {
+            "hot_rows": len(hot),
+            "max_hot_rows": self.max_hot_rows,
+            "cold_rows": len(self),
+            "promotions": self.promotions,
+            "demotions": self.demotions
+        }
+
+    def _find_ids(self, encoding_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions in ``encoding_ids`` found in this tier, and their rows."""
+        if len(self._sorted_ids) == 0 or len(encoding_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        positions = np.minimum(np.searchsorted(self._sorted_ids, encoding_ids), len(self._sorted_ids) - 1)
+        found = np.flatnonzero(self._sorted_ids[positions] == encoding_ids)
+        return found, self._id_order[positions[found]]
+
+    def _delete(self, rows: np.ndarray) -> int:
+        removed = int(np.count_nonzero(~self.excluded[rows]))
+        self.deleted[rows] = True
+        return removed
+
+
+def hot_rows_for_budget(memory_mb: int) -> int:
+    """How many rows fit in a hot tier of ``memory_mb`` megabytes."""
+    return memory_mb * 1024 * 1024 // HOT_ROW_BYTES
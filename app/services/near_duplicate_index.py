@@ -0,0 +1,53 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+# Number of set bits for every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class NearDuplicateIndex:
+    """
+    Hamming-distance index over the perceptual hashes of recent images.
+
+    Holds the last ``window`` hashes in a ring buffer; a lookup XORs the
+    probe against all of them at once and returns the payload of the
+    closest hash if it is within ``max_distance`` bits.
+    """
+
+    def __init__(self, window: int = 1000, max_distance: int = 4):
+        self.window = window
+        self.max_distance = max_distance
+        self._hashes = np.zeros(window, dtype=np.uint64)
+        self._payloads: list = [None] * window
+        self._size = 0
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, image_hash: int) -> Optional[Tuple[Any, int]]:
+        """Return (payload, distance) of the nearest recent image, if close enough."""
+        if self._size:
+            xor = self._hashes[:self._size] ^ np.uint64(image_hash)
+            distances = _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= self.max_distance:
+                self.hits += 1
+                return self._payloads[nearest], int(distances[nearest])
+
+        self.misses += 1
+        return None
+
+    def add(self, image_hash: int, payload: Any):
+        self._hashes[self._next] = np.uint64(image_hash)
+        self._payloads[self._next] = payload
+        self._next = (self._next + 1) % self.window
+        self._size = min(self._size + 1, self.window)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.domain.models import Person
+
+
+class PersonCache:
+    """
+    LRU/TTL cache of person rows, looked up by id or by name.
+
+    Persons are tiny and rarely change, so the identify and register paths
+    read them from here instead of the database. Entries expire after
+    ``ttl`` seconds as a backstop; creations and deletions invalidate them
+    directly.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._by_id: "OrderedDict[int, Tuple[Person, float]]" = OrderedDict()
+        self._ids_by_name: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, person_id: int) -> Optional[Person]:
+        entry = self._by_id.get(person_id)
+        if entry is not None:
+            person, expires_at = entry
+            if expires_at > time.monotonic():
+                self._by_id.move_to_end(person_id)
+                self.hits += 1
+                return person
+            self.invalidate(person_id)
+
+        self.misses += 1
+        return None
+
+    def get_many(self, person_ids: Iterable[int]) -> Tuple[Dict[int, Person], List[int]]:
+        """Return the cached persons and the ids that still have to be fetched."""
+        found, missing = {}, []
+        for person_id in person_ids:
+            person = self.get(person_id)
+            if person is not None:
+                found[person_id] = person
+            else:
+                missing.append(person_id)
+        return found, missing
+
+    def get_by_name(self, name: str) -> Optional[Person]:
+        person_id = self._ids_by_name.get(name)
+        if person_id is None:
+            self.misses += 1
+            return None
+        return self.get(person_id)
+
+    def put(self, person: Person):
+        self.put_many([person])
+
+    def put_many(self, persons: Iterable[Person]):
+        expires_at = time.monotonic() + self.ttl
+        for person in persons:
+            self._by_id[person.id] = (person, expires_at)
+            self._by_id.move_to_end(person.id)
+            self._ids_by_name[person.name] = person.id
+
+        while len(self._by_id) > self.max_entries:
+            _, (evicted, _) = self._by_id.popitem(last=False)
+            self._forget_name(evicted)
+
+    def invalidate(self, person_id: int):
+        entry = self._by_id.pop(person_id, None)
+        if entry is not None:
+            self._forget_name(entry[0])
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _forget_name(self, person: Person):
+        if self._ids_by_name.get(person.name) == person.id:
+            del self._ids_by_name[person.name]
@@ -1,4 +1,10 @@
 """Utilities module."""
-from app.utils.image_utils import validate_image, resize_image, get_image_format
+from app.utils.image_utils import (
+    validate_image, resize_image, get_image_format, scale_to_max_dimension, decode_image, DecodedImage
+)
+from app.utils.time_utils import to_micros, from_micros
 
-__all__ = ["validate_image", "resize_image", "get_image_format"]
\ No newline at end of file
+__all__ = [
+    "validate_image", "resize_image", "get_image_format", "scale_to_max_dimension", "decode_image", "DecodedImage",
+    "to_micros", "from_micros"
+]
\ No newline at end of file
@@ -1,6 +1,21 @@
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+import math
+import time
+from dataclasses import dataclass
 from typing import Tuple, Optional
+import numpy as np
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+@dataclass
+class DecodedImage:
+    image: Image.Image
+    array: np.ndarray  # contiguous (H, W, 3) uint8, read-only view of the pixel data
+    scale: float  # decoded size relative to the original image
+    decode_ms: float
+    peak_bytes: int  # estimated from the pixel buffers alive at the same time
 
 
 def validate_image(image_data: bytes) -> Tuple[bool, Optional[str]]:
@@ -23,6 +38,92 @@ def resize_image(image_data: bytes, max_size: Tuple[int, int] = (800, 800)) -> b
     return output.getvalue()
 
 
+def scale_to_max_dimension(image: Image.Image, max_dimension: int) -> Tuple[Image.Image, float]:
+    """
+    Downscale a decoded image so its longest side is at most max_dimension.
+    Returns the (possibly unchanged) image and the applied scale factor.
+    """
+    longest = max(image.size)
+    if not max_dimension or longest <= max_dimension:
+        return image, 1.0
+
+    scale = max_dimension / longest
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0), scale
+
+
+def decode_image(image_data: bytes, max_dimension: int = 0) -> DecodedImage:
+    """
+    Decode image bytes into an RGB array as cheaply as possible.
+
+    JPEGs are DCT-scaled by the decoder (draft mode) when only about
+    max_dimension pixels are needed, EXIF orientation is applied once and the
+    pixels are handed to NumPy without the extra copy np.array() makes.
+    """
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_data))
+    original_longest = max(image.size)
+
+    if max_dimension and image.format == "JPEG" and original_longest > max_dimension:
+        # The decoder picks the smallest 1/2, 1/4 or 1/8 scale that is still >= the request
+        ratio = max_dimension / original_longest
+        image.draft("RGB", (math.ceil(image.width * ratio), math.ceil(image.height * ratio)))
+
+    image.load()
+    peak_bytes = _pixel_bytes(image)
+
+    if image.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1:
+        transposed = ImageOps.exif_transpose(image)
+        peak_bytes = max(peak_bytes, _pixel_bytes(image) + _pixel_bytes(transposed))
+        image = transposed
+
+    if image.mode != "RGB":
+        converted = image.convert("RGB")
+        peak_bytes = max(peak_bytes, _pixel_bytes(image) + _pixel_bytes(converted))
+        image = converted
+
+    array = np.asarray(image)
+    peak_bytes = max(peak_bytes, _pixel_bytes(image) + array.nbytes)
+
+    return DecodedImage(
+        image=image,
+        array=array,
+        scale=max(image.size) / original_longest,
+        decode_ms=(time.perf_counter() - start) * 1000,
+        peak_bytes=peak_bytes
+    )
+
+
+def perceptual_hash(image_data: bytes) -> Tuple[int, Tuple[int, int]]:
+    """
+    64-bit difference hash (dHash) of an image, robust to re-compression and resizing.
+    Returns the hash and the (width, height) of the oriented full-size image.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    width, height = image.size
+    orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+
+    # Only a 9x8 thumbnail is needed, so let the JPEG decoder skip most of the work
+    image.draft("L", (64, 64))
+    thumbnail = image.convert("L")
+    if orientation != 1:
+        thumbnail = ImageOps.exif_transpose(thumbnail)
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+    thumbnail = thumbnail.resize((9, 8), Image.Resampling.BOX)
+
+    # One bit per horizontally adjacent pixel pair: is the right one brighter?
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big"), (width, height)
+
+
+def _pixel_bytes(image: Image.Image) -> int:
+    # PIL stores multi-band pixels in 4 bytes
+    bands = len(image.getbands())
+    return image.width * image.height * (1 if bands == 1 else 4)
+
+
 def get_image_format(image_data: bytes) -> Optional[str]:
     """Get the format of an image."""
     try:
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+_EPOCH = datetime(1970, 1, 1)
+NO_TIME = -1
+
+
+def to_micros(value: Optional[datetime]) -> int:
+    """Microseconds since the epoch, NO_TIME for None; database timestamps are naive UTC."""
+    if value is None:
+        return NO_TIME
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> Optional[datetime]:
+    """Inverse of to_micros, as a naive UTC datetime."""
+    return None if value == NO_TIME else _EPOCH + timedelta(microseconds=value)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark IFaceRepository implementations with the worker's access pattern.
+
+    python benchmark_repository.py                      # embedded SQLite in a temp dir
+    python benchmark_repository.py --database-url postgresql://...  # also the async repository
+
+The async repository writes into the given database; it removes the
+persons it created afterwards. Use a scratch database.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+import numpy as np
+
+
+async def _timed(label: str, operations: int, coroutine_factory):
+    start = time.perf_counter()
+    for i in range(operations):
+        await coroutine_factory(i)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {operations / elapsed:>10.0f} ops/s  ({elapsed * 1000 / operations:.3f} ms/op)")
+
+
+async def run_benchmark(repository, encodings: int, batch: int, persons: int):
+    from app.domain.models import FaceEncoding
+
+    rng = np.random.default_rng(0)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    created = []
+
+    async def create(i):
+        created.append(await repository.create_person(f"{prefix}-{i}"))
+
+    await _timed("create_person", persons, create)
+    person_ids = [person.id for person in created]
+
+    async def save_one(i):
+        await repository.save_face_encoding(person_ids[i % persons], rng.normal(size=128), "bench.jpg")
+
+    await _timed("save_face_encoding (1 row/commit)", min(encodings, 500), save_one)
+
+    start = time.perf_counter()
+    for offset in range(0, encodings, batch):
+        await repository.save_face_encodings([
+            FaceEncoding(person_id=person_ids[i % persons], encoding=rng.normal(size=128), image_path="bench.jpg")
+            for i in range(offset, min(offset + batch, encodings))
+        ])
+    elapsed = time.perf_counter() - start
+    print(f"  {f'save_face_encodings ({batch} rows/commit)':<34} {encodings / elapsed:>10.0f} rows/s")
+
+    await _timed("get_person_by_name", 1000, lambda i: repository.get_person_by_name(f"{prefix}-{i % persons}"))
+    await _timed("get_persons_by_ids (5 ids)", 1000, lambda i: repository.get_persons_by_ids(person_ids[i % persons:][:5]))
+
+    position = await repository.get_sync_position()
+    await _timed("get_encoding_delta (up to date)", 200, lambda i: repository.get_encoding_delta(position, 0))
+
+    start = time.perf_counter()
+    total = 0
+    async for encoding_ids, _, _ in repository.iter_encoding_chunks(10000):
+        total += len(encoding_ids)
+    elapsed = time.perf_counter() - start
+    print(f"  {'cold load (iter_encoding_chunks)':<34} {total / elapsed:>10.0f} rows/s  ({total} rows)")
+
+    for person_id in person_ids:
+        await repository.delete_person(person_id)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--encodings", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--persons", type=int, default=100)
+    parser.add_argument("--database-url", help="also benchmark AsyncFaceRepository against this database")
+    args = parser.parse_args()
+
+    from app.infrastructure.repositories import SqliteFaceRepository
+
+    with tempfile.TemporaryDirectory() as directory:
+        repository = SqliteFaceRepository(str(Path(directory) / "bench.db"))
+        print(f"SqliteFaceRepository (WAL, {repository.synchronous})")
+        await run_benchmark(repository, args.encodings, args.batch, args.persons)
+        await repository.close()
+
+    if args.database_url:
+        from app.infrastructure.database.async_connection import (
+            create_async_database_engine,
+            create_async_session_factory
+        )
+        from app.infrastructure.repositories import AsyncFaceRepository
+
+        engine = create_async_database_engine(args.database_url)
+        print(f"AsyncFaceRepository ({engine.url.drivername})")
+        await run_benchmark(AsyncFaceRepository(create_async_session_factory(engine)), args.encodings, args.batch, args.persons)
+        await engine.dispose()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
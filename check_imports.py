@@ -14,7 +14,7 @@ def check_imports():
         "from app.domain.interfaces import IFaceService, IFaceRepository",
         "from app.infrastructure.database import Base, engine, get_db",
         "from app.infrastructure.database.models import PersonDB, FaceEncodingDB",
-        "from app.infrastructure.repositories import FaceRepository",
+        "from app.infrastructure.repositories import FaceRepository, AsyncFaceRepository, SqliteFaceRepository",
         "from app.infrastructure.storage import FileStorage",
         "from app.services import FaceService, FaceRecognitionEngine",
         "from app.utils import validate_image, resize_image, get_image_format",
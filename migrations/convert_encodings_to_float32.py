@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Convert pickled face encodings to the tagged float32 format.
+
+Rows are processed in id order, one committed batch at a time, and rows
+already in the new format are skipped, so the migration can be stopped
+and re-run at any point. The worker reads both formats meanwhile.
+
+    python -m migrations.convert_encodings_to_float32 [--batch-size N] [--start-id ID]
+"""
+import argparse
+import sys
+from sqlalchemy import update
+from app.infrastructure.database import SessionLocal, FaceEncodingDB
+from app.infrastructure.repositories.encoding_format import (
+    encode_encoding,
+    decode_encoding,
+    is_current_format
+)
+
+
+def migrate(batch_size: int = 1000, start_id: int = 0) -> int:
+    """Convert every legacy row with id > start_id. Returns rows converted."""
+    converted = 0
+    last_id = start_id
+
+    with SessionLocal() as db:
+        while True:
+            rows = db.query(FaceEncodingDB.id, FaceEncodingDB.encoding).filter(
+                FaceEncodingDB.id > last_id
+            ).order_by(FaceEncodingDB.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            updates = [
+                {"row_id": row.id, "encoding": encode_encoding(decode_encoding(row.encoding))}
+                for row in rows
+                if not is_current_format(row.encoding)
+            ]
+            for values in updates:
+                db.execute(
+                    update(FaceEncodingDB)
+                    .where(FaceEncodingDB.id == values["row_id"])
+                    .values(encoding=values["encoding"])
+                )
+            db.commit()
+
+            converted += len(updates)
+            last_id = rows[-1].id
+            print(f"Converted {converted} encodings (up to id {last_id})")
+
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this encoding id")
+    args = parser.parse_args()
+
+    converted = migrate(batch_size=args.batch_size, start_id=args.start_id)
+    print(f"Done, {converted} encodings converted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,9 +15,20 @@ CREATE TABLE IF NOT EXISTS face_encodings (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create person_tombstones table (deletions replayed by incremental gallery sync);
+-- encoding_id is set when a single encoding was pruned rather than the whole person deleted
+CREATE TABLE IF NOT EXISTS person_tombstones (
+    id SERIAL PRIMARY KEY,
+    person_id INTEGER NOT NULL,
+    encoding_id INTEGER,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes
-CREATE INDEX idx_persons_name ON persons(name);
-CREATE INDEX idx_face_encodings_person_id ON face_encodings(person_id);
+CREATE INDEX IF NOT EXISTS idx_persons_name ON persons(name);
+CREATE INDEX IF NOT EXISTS idx_face_encodings_person_id ON face_encodings(person_id);
+CREATE INDEX IF NOT EXISTS idx_face_encodings_created_at ON face_encodings(created_at);
+CREATE INDEX IF NOT EXISTS idx_person_tombstones_deleted_at ON person_tombstones(deleted_at);
 
 -- Create updated_at trigger
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -28,5 +39,6 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+DROP TRIGGER IF EXISTS update_persons_updated_at ON persons;
 CREATE TRIGGER update_persons_updated_at BEFORE UPDATE
     ON persons FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
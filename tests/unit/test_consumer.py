@@ -0,0 +1,263 @@
+"""How RabbitMQConsumer settles each message: acked, requeued or rejected."""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import pytest
+from app.core.exceptions import PersistenceError
+from app.infrastructure.rabbitmq.consumer import RabbitMQConsumer
+
+ROUTING_KEY = "image.received"
+
+
+class _Message:
+    """An aio_pika IncomingMessage that records how it was settled, once."""
+
+    def __init__(self, body, routing_key: str = ROUTING_KEY, delivery_tag: int = 1):
+        self.body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.routing_key = routing_key
+        self.delivery_tag = delivery_tag
+        self.settled = None
+
+    async def ack(self):
+        self._settle("ack")
+
+    async def nack(self, requeue: bool = True):
+        self._settle("requeue" if requeue else "drop")
+
+    async def reject(self, requeue: bool = False):
+        self._settle("requeue" if requeue else "reject")
+
+    def _settle(self, outcome: str):
+        assert self.settled is None, f"message settled twice: {self.settled}, then {outcome}"
+        self.settled = outcome
+
+    @asynccontextmanager
+    async def process(self, ignore_processed: bool = False):
+        try:
+            yield
+        except Exception:
+            if self.settled is None:
+                await self.reject()
+            raise
+        if self.settled is None:
+            await self.ack()
+
+
+class _Queue:
+    def __init__(self):
+        self.callback = None
+        self.cancelled = False
+
+    async def consume(self, callback):
+        self.callback = callback
+        return "consumer-tag"
+
+    async def cancel(self, consumer_tag):
+        self.cancelled = True
+
+
+def _messages(count: int, routing_key: str = ROUTING_KEY):
+    return [_Message({"event_id": i}, routing_key, delivery_tag=i) for i in range(count)]
+
+
+def _consumer(batch_size: int = 4, batch_linger: float = 0.05) -> RabbitMQConsumer:
+    return RabbitMQConsumer(connection=None, concurrency=1, batch_size=batch_size, batch_linger=batch_linger)
+
+
+async def _run_batch(consumer: RabbitMQConsumer, batch):
+    # The consume loop takes the slot before handing the batch over
+    await consumer._slots.acquire()
+    await consumer._handle_batch(batch, lingered=0.0)
+
+
+@pytest.mark.asyncio
+async def test_batch_settles_each_message_by_its_outcome():
+    consumer = _consumer()
+    outcomes = [None, PersistenceError("write failed"), ValueError("bad image")]
+
+    async def handler(bodies):
+        return outcomes
+
+    consumer.register_batch_handler(ROUTING_KEY, handler)
+    batch = _messages(3)
+
+    await _run_batch(consumer, batch)
+
+    assert [message.settled for message in batch] == ["ack", "requeue", "reject"]
+    assert not consumer._slots.locked()
+    assert consumer.batches == 1 and consumer.batched_messages == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error, settled", [(PersistenceError("write failed"), "requeue"), (ValueError("bug"), "reject")])
+async def test_failed_batch_handler_settles_every_message(error, settled):
+    consumer = _consumer()
+
+    async def handler(bodies):
+        raise error
+
+    consumer.register_batch_handler(ROUTING_KEY, handler)
+    batch = _messages(3)
+
+    await _run_batch(consumer, batch)
+
+    assert [message.settled for message in batch] == [settled] * 3
+    assert not consumer._slots.locked()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_batch_is_requeued():
+    consumer = _consumer()
+    started = asyncio.Event()
+
+    async def handler(bodies):
+        started.set()
+        await asyncio.Event().wait()
+
+    consumer.register_batch_handler(ROUTING_KEY, handler)
+    batch = _messages(3)
+    task = asyncio.create_task(_run_batch(consumer, batch))
+    await started.wait()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert [message.settled for message in batch] == ["requeue"] * 3
+    assert not consumer._slots.locked()
+
+
+@pytest.mark.asyncio
+async def test_batch_falls_back_to_the_message_handler():
+    consumer = _consumer()
+    handled = []
+
+    async def batch_handler(bodies):
+        return [None] * len(bodies)
+
+    async def handler(body):
+        if body["event_id"] == 2:
+            raise PersistenceError("write failed")
+        if body["event_id"] == 3:
+            raise ValueError("bad image")
+        handled.append(body["event_id"])
+
+    consumer.register_batch_handler(ROUTING_KEY, batch_handler)
+    consumer.register_handler("person.deleted", handler)
+    batch = [_Message({"event_id": 0})] + _messages(4, "person.deleted")[1:] + [_Message(b"not json")]
+
+    await _run_batch(consumer, batch)
+
+    # Undecodable messages are dropped with an ack, as on the single-message path
+    assert [message.settled for message in batch] == ["ack", "ack", "requeue", "reject", "ack"]
+    assert handled == [1]
+
+
+@pytest.mark.asyncio
+async def test_next_batch_stops_when_full_or_after_lingering():
+    consumer = _consumer(batch_size=3, batch_linger=0.05)
+    deliveries = asyncio.Queue()
+    for message in _messages(4):
+        deliveries.put_nowait(message)
+
+    full, _ = await consumer._next_batch(deliveries)
+    partial, lingered = await consumer._next_batch(deliveries)
+
+    assert [message.delivery_tag for message in full] == [0, 1, 2]
+    assert [message.delivery_tag for message in partial] == [3]
+    assert lingered >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_next_batch_requeues_what_it_took_when_cancelled():
+    consumer = _consumer(batch_size=3, batch_linger=10.0)
+    deliveries = asyncio.Queue()
+    first = _Message({"event_id": 0})
+    deliveries.put_nowait(first)
+    task = asyncio.create_task(consumer._next_batch(deliveries))
+    await asyncio.sleep(0.01)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert first.settled == "requeue"
+
+
+@pytest.mark.asyncio
+async def test_stopped_batch_consumer_requeues_prefetched_messages():
+    consumer = _consumer(batch_size=2, batch_linger=0.0)
+    consumer.queue = _Queue()
+    release = asyncio.Event()
+
+    async def handler(bodies):
+        await release.wait()
+        return [None] * len(bodies)
+
+    consumer.register_batch_handler(ROUTING_KEY, handler)
+    consuming = asyncio.create_task(consumer._consume_batches())
+    await asyncio.sleep(0)
+    batch, prefetched = _messages(2), _messages(3)
+    for message in batch + prefetched:
+        await consumer.queue.callback(message)
+    # The only slot is busy with the first batch; the rest wait in the prefetch queue
+    await asyncio.sleep(0.01)
+
+    consuming.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await consuming
+    release.set()
+    await consumer.drain(timeout=1.0)
+
+    assert consumer.queue.cancelled
+    assert [message.settled for message in batch] == ["ack", "ack"]
+    assert [message.settled for message in prefetched] == ["requeue"] * 3
+
+
+@pytest.mark.asyncio
+async def test_drain_requeues_messages_still_running():
+    consumer = RabbitMQConsumer(connection=None, concurrency=2)
+    finished = asyncio.Event()
+
+    async def handler(body):
+        if body["event_id"] == 1:
+            await asyncio.Event().wait()
+        finished.set()
+
+    consumer.register_handler(ROUTING_KEY, handler)
+    quick, stuck = _messages(2)
+    for message in (quick, stuck):
+        await consumer._slots.acquire()
+        task = asyncio.create_task(consumer._handle_message(message))
+        consumer._in_flight.add(task)
+        task.add_done_callback(consumer._in_flight.discard)
+    await finished.wait()
+
+    await consumer.drain(timeout=0.05)
+
+    assert quick.settled == "ack" and stuck.settled == "requeue"
+    assert not consumer._in_flight
+    assert consumer._slots._value == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error, settled", [
+    (None, "ack"),
+    (PersistenceError("write failed"), "requeue"),
+    (ValueError("bad image"), "reject")
+])
+async def test_single_message_settled_by_outcome(error, settled):
+    consumer = RabbitMQConsumer(connection=None)
+
+    async def handler(body):
+        if error is not None:
+            raise error
+
+    consumer.register_handler(ROUTING_KEY, handler)
+    message = _Message({"event_id": 0})
+
+    await consumer._slots.acquire()
+    await consumer._handle_message(message)
+
+    assert message.settled == settled
+    assert not consumer._slots.locked()
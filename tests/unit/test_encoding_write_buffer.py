@@ -0,0 +1,91 @@
+"""EncodingWriteBuffer group commits on the embedded SQLite repository."""
+import asyncio
+import numpy as np
+import pytest
+import pytest_asyncio
+from app.core.exceptions import PersistenceError
+from app.domain.models import FaceEncoding
+from app.infrastructure.repositories import SqliteFaceRepository
+from app.infrastructure.repositories.encoding_write_buffer import EncodingWriteBuffer
+
+
+@pytest_asyncio.fixture
+async def repository(tmp_path):
+    repository = SqliteFaceRepository(str(tmp_path / "faces.db"))
+    yield repository
+    await repository.close()
+
+
+def _encodings(person_id: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        FaceEncoding(person_id=person_id, encoding=rng.normal(size=128).astype(np.float32), image_path=f"{seed}-{i}.jpg")
+        for i in range(count)
+    ]
+
+
+def _fail_writes(repository, monkeypatch, failures: int):
+    """Make the next ``failures`` writes raise; returns the size of every batch written or attempted."""
+    batches = []
+    save_face_encodings = repository.save_face_encodings
+
+    async def flaky_save(encodings):
+        batches.append(len(encodings))
+        if len(batches) <= failures:
+            raise ConnectionError("database went away")
+        return await save_face_encodings(encodings)
+
+    monkeypatch.setattr(repository, "save_face_encodings", flaky_save)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_callers_share_one_write_and_get_their_own_rows(repository):
+    person = await repository.create_person("alice")
+    buffer = EncodingWriteBuffer(repository, max_batch=64, flush_interval=0.01)
+    requests = [_encodings(person.id, count, seed) for seed, count in enumerate([2, 1, 3])]
+
+    results = await asyncio.gather(*[buffer.save_many(encodings) for encodings in requests])
+
+    for encodings, saved in zip(requests, results):
+        assert [encoding.image_path for encoding in saved] == [encoding.image_path for encoding in encodings]
+        assert all(encoding.id is not None for encoding in saved)
+    assert buffer.flushes == 1 and buffer.rows == 6
+    assert await repository.count_face_encodings() == 6
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_fails_every_caller_and_the_buffer_recovers(repository, monkeypatch):
+    person = await repository.create_person("alice")
+    buffer = EncodingWriteBuffer(repository, max_batch=64, flush_interval=0.01)
+    batches = _fail_writes(repository, monkeypatch, failures=1)
+
+    results = await asyncio.gather(
+        *[buffer.save_many(_encodings(person.id, 2, seed)) for seed in range(3)],
+        return_exceptions=True
+    )
+
+    assert batches == [6]
+    assert all(isinstance(result, PersistenceError) for result in results)
+    assert buffer.failures == 1 and buffer.stats()["pending"] == 0
+    assert await repository.count_face_encodings() == 0
+
+    # Later writes go through as usual
+    saved = await buffer.save_many(_encodings(person.id, 2, seed=5))
+    assert len(saved) == 2 and all(encoding.id is not None for encoding in saved)
+    assert buffer.flushes == 1 and await repository.count_face_encodings() == 2
+
+
+@pytest.mark.asyncio
+async def test_caller_split_across_batches_fails_if_any_of_them_does(repository, monkeypatch):
+    person = await repository.create_person("alice")
+    buffer = EncodingWriteBuffer(repository, max_batch=3)
+    batches = _fail_writes(repository, monkeypatch, failures=1)
+
+    with pytest.raises(PersistenceError):
+        await buffer.save_many(_encodings(person.id, 5))
+
+    # The second batch was still written; its rows are durable even though the caller failed
+    assert batches == [3, 2]
+    assert await repository.count_face_encodings() == 2
+    assert await buffer.save(_encodings(person.id, 1, seed=1)[0])
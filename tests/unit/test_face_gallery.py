@@ -0,0 +1,125 @@
+"""FaceGallery against a brute-force model: random appends and deletions over an immutable snapshot base."""
+import numpy as np
+import pytest
+from app.services.face_gallery import FaceGallery
+
+DIMENSION = 16
+
+
+class _Model:
+    """The rows a gallery should hold, in order, as plain Python lists."""
+
+    def __init__(self):
+        self.ids, self.person_ids, self.encodings = [], [], []
+
+    def extend(self, ids, person_ids, encodings):
+        self.ids += list(ids)
+        self.person_ids += list(person_ids)
+        self.encodings += list(encodings)
+
+    def keep(self, keep):
+        self.ids, self.person_ids, self.encodings = (
+            [value for value, kept in zip(column, keep) if kept]
+            for column in (self.ids, self.person_ids, self.encodings)
+        )
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return np.asarray(self.encodings, dtype=np.float32).reshape(-1, DIMENSION)
+
+
+def _snapshot_gallery(rng, rows: int):
+    ids = np.arange(1, rows + 1, dtype=np.int64)
+    person_ids = rng.integers(1, 6, rows).astype(np.int64)
+    matrix = rng.normal(size=(rows, DIMENSION)).astype(np.float32)
+    sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    for array in (ids, person_ids, matrix, sq_norms):
+        # Mapped snapshot arrays are read-only; any write into the base raises
+        array.setflags(write=False)
+    return FaceGallery.from_snapshot(ids, person_ids, matrix, sq_norms), ids, person_ids, matrix
+
+
+def _assert_matches(gallery: FaceGallery, model: _Model, rng):
+    assert len(gallery) == len(model.ids)
+    assert gallery.ids.tolist() == model.ids
+    assert gallery.person_ids.tolist() == model.person_ids
+    expected = model.matrix
+    np.testing.assert_array_equal(gallery.matrix, expected)
+    np.testing.assert_allclose(gallery.sq_norms, np.einsum("ij,ij->i", expected, expected), rtol=1e-5)
+
+    segments = list(gallery.iter_segments(chunk_size=7))
+    if segments:
+        np.testing.assert_array_equal(np.concatenate([segment[2] for segment in segments]), expected)
+        assert np.concatenate([segment[0] for segment in segments]).tolist() == model.ids
+
+    if not model.ids:
+        return
+    rows = rng.integers(0, len(model.ids), 10)
+    np.testing.assert_array_equal(gallery.encodings_at(rows), expected[rows])
+
+    probes = rng.normal(size=(3, DIMENSION)).astype(np.float32)
+    brute = np.linalg.norm(expected[None, :, :] - probes[:, None, :], axis=2)
+    np.testing.assert_allclose(gallery.distances_batch(probes), brute, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(gallery.distances(probes[0]), brute[0], rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(gallery.distances(probes[0], rows), brute[0][rows], rtol=1e-4, atol=1e-4)
+
+    queries = rng.integers(0, max(model.ids) + 5, 20)
+    present = set(model.ids)
+    assert gallery.has_ids(queries).tolist() == [int(query) in present for query in queries]
+    expected_rows = [model.ids.index(int(query)) if int(query) in present else -1 for query in queries]
+    assert gallery.rows_for_ids(queries).tolist() == expected_rows
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("base_rows", [0, 40])
+def test_random_changes_match_brute_force(seed, base_rows):
+    rng = np.random.default_rng(seed)
+    model = _Model()
+    if base_rows:
+        gallery, ids, person_ids, matrix = _snapshot_gallery(rng, base_rows)
+        model.extend(ids.tolist(), person_ids.tolist(), list(matrix))
+    else:
+        gallery = FaceGallery(capacity=4, dimension=DIMENSION)
+    next_id = base_rows + 1
+    views = []
+
+    for _ in range(30):
+        operation = rng.choice(["extend", "remove_ids", "evict", "remove_person", "freeze"], p=[.4, .2, .15, .1, .15])
+        if operation == "extend":
+            count = int(rng.integers(1, 12))
+            ids = list(range(next_id, next_id + count))
+            next_id += count
+            person_ids = rng.integers(1, 6, count).tolist()
+            encodings = rng.normal(size=(count, DIMENSION)).astype(np.float32)
+            gallery.extend(ids, person_ids, encodings)
+            model.extend(ids, person_ids, list(encodings))
+        elif operation in ("remove_ids", "evict"):
+            # Some ids are already gone or were never there
+            doomed = set(rng.integers(1, next_id + 3, int(rng.integers(1, 8))).tolist())
+            removed = getattr(gallery, operation)(doomed)
+            assert removed == len(doomed & set(model.ids))
+            model.keep([encoding_id not in doomed for encoding_id in model.ids])
+        elif operation == "remove_person":
+            person_id = int(rng.integers(1, 6))
+            assert gallery.remove_person(person_id) == model.person_ids.count(person_id)
+            model.keep([owner != person_id for owner in model.person_ids])
+        else:
+            views.append((gallery.frozen(), list(model.ids), model.matrix))
+
+        _assert_matches(gallery, model, rng)
+
+    # Views taken earlier still show the rows of their time
+    for view, ids, matrix in views:
+        assert view.ids.tolist() == ids
+        np.testing.assert_array_equal(view.matrix, matrix)
+
+
+def test_rows_for_person():
+    gallery = FaceGallery(capacity=2, dimension=DIMENSION)
+    gallery.extend([1, 2, 3, 4], [7, 8, 7, 9], np.zeros((4, DIMENSION)))
+    gallery.remove_ids([1])
+
+    assert gallery.rows_for_person(7).tolist() == [1]
+    assert gallery.rows_for_person(5).tolist() == []
+    assert gallery.add(5, 7, np.ones(DIMENSION)) == 3
+    assert gallery.rows_for_person(7).tolist() == [1, 3]
@@ -0,0 +1,95 @@
+"""Top-k candidate ranking and batch matching against a full sort of every distance."""
+import numpy as np
+import pytest
+from app.services.face_gallery import FaceGallery
+from app.services.face_recognition_engine import FaceRecognitionEngine
+from app.services.gallery_index import PersonPrototypeIndex
+
+DIMENSION = 128
+
+
+def _gallery(rng, rows: int = 300, persons: int = 20) -> FaceGallery:
+    # Persons are clusters, so rankings have a clear head and a long tail
+    centres = rng.normal(size=(persons, DIMENSION)) * 0.08
+    person_ids = rng.integers(0, persons, rows)
+    gallery = FaceGallery(dimension=DIMENSION)
+    gallery.extend(range(1, rows + 1), person_ids + 1, centres[person_ids] + rng.normal(size=(rows, DIMENSION)) * 0.03)
+    return gallery
+
+
+def _brute_force_ranking(engine, gallery, probe, top_k, neighbours, aggregate, rows=None):
+    """(person id, distance) of the top_k persons, from a full sort of the distances."""
+    rows = np.arange(len(gallery)) if rows is None else np.asarray(rows)
+    distances = np.linalg.norm(gallery.encodings_at(rows) - probe, axis=1)
+    nearest = np.argsort(distances)[:neighbours]
+    by_person = {}
+    for position in nearest:
+        by_person.setdefault(int(gallery.person_ids[rows[position]]), []).append(distances[position])
+
+    if aggregate == "count":
+        order = sorted(by_person, key=lambda p: (-sum(d <= engine.tolerance for d in by_person[p]), min(by_person[p])))
+        return [(p, min(by_person[p])) for p in order[:top_k]]
+    score = min if aggregate == "min" else np.mean
+    order = sorted(by_person, key=lambda p: score(by_person[p]))
+    return [(p, score(by_person[p])) for p in order[:top_k]]
+
+
+def _assert_ranking(candidates, expected):
+    assert [candidate.person_id for candidate in candidates] == [person_id for person_id, _ in expected]
+    np.testing.assert_allclose([c.distance for c in candidates], [d for _, d in expected], rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("aggregate", ["min", "mean", "count"])
+@pytest.mark.parametrize("top_k, neighbours", [(1, 1), (3, 10), (5, 50), (30, 300)])
+def test_rank_candidates_matches_full_sort(aggregate, top_k, neighbours):
+    rng = np.random.default_rng(top_k)
+    engine = FaceRecognitionEngine(tolerance=0.5)
+    gallery = _gallery(rng)
+
+    for row in rng.integers(0, len(gallery), 5):
+        probe = gallery.encodings_at([row])[0] + rng.normal(size=DIMENSION).astype(np.float32) * 0.01
+        candidates = engine.rank_candidates(gallery, probe, top_k=top_k, neighbours=neighbours, aggregate=aggregate)
+
+        _assert_ranking(candidates, _brute_force_ranking(engine, gallery, probe, top_k, neighbours, aggregate))
+        margins = [candidate.margin for candidate in candidates]
+        assert all(margin is None or margin >= 0 for margin in margins)
+
+
+def test_rank_candidates_skips_excluded_rows():
+    rng = np.random.default_rng(0)
+    engine = FaceRecognitionEngine()
+    gallery = _gallery(rng)
+    exclude = rng.random(len(gallery)) < 0.5
+    probe = gallery.encodings_at([int(np.flatnonzero(exclude)[0])])[0]
+
+    candidates = engine.rank_candidates(gallery, probe, top_k=5, neighbours=40, exclude=exclude)
+
+    _assert_ranking(candidates, _brute_force_ranking(engine, gallery, probe, 5, 40, "min", np.flatnonzero(~exclude)))
+
+
+def test_rank_candidates_with_an_index_ranks_its_candidates_exactly():
+    rng = np.random.default_rng(1)
+    engine = FaceRecognitionEngine()
+    gallery = _gallery(rng)
+    index = PersonPrototypeIndex(top_persons=4, dimension=DIMENSION)
+    gallery.attach_index(index)
+    probe = gallery.encodings_at([7])[0]
+
+    candidates = engine.rank_candidates(gallery, probe, top_k=3, neighbours=20)
+
+    expected = _brute_force_ranking(engine, gallery, probe, 3, 20, "min", index.candidates(probe))
+    _assert_ranking(candidates, expected)
+    assert candidates[0].person_id == gallery.person_ids[7]
+
+
+def test_match_faces_matches_full_scan():
+    rng = np.random.default_rng(2)
+    engine = FaceRecognitionEngine(tolerance=0.2)
+    gallery = _gallery(rng)
+    probes = np.vstack([gallery.encodings_at([3, 50]), rng.normal(size=(2, DIMENSION))]).astype(np.float32)
+
+    matches = engine.match_faces(gallery, probes)
+
+    distances = np.linalg.norm(gallery.matrix[None, :, :] - probes[:, None, :], axis=2)
+    assert [row for _, row, _ in matches] == distances.argmin(axis=1).tolist()
+    assert [is_match for is_match, _, _ in matches] == (distances.min(axis=1) <= 0.2).tolist()
@@ -0,0 +1,211 @@
+"""
+Every IFaceRepository backend through the same cases: the embedded SQLite
+repository and the async SQLAlchemy repository (on sqlite+aiosqlite).
+"""
+import asyncio
+import numpy as np
+import pytest
+import pytest_asyncio
+from app.domain.models import FaceEncoding, SyncWatermark
+from app.infrastructure.database.async_connection import (
+    PoolMetrics,
+    create_async_database_engine,
+    create_async_session_factory
+)
+from app.infrastructure.database.models import Base
+from app.infrastructure.repositories import SqliteFaceRepository
+from app.infrastructure.repositories.async_face_repository import AsyncFaceRepository
+
+
+async def _create_engine(tmp_path):
+    engine = create_async_database_engine(f"sqlite:///{tmp_path / 'faces.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return engine
+
+
+@pytest_asyncio.fixture
+async def async_engine(tmp_path):
+    engine = await _create_engine(tmp_path)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(params=["sqlite", "async"])
+async def repository(request, tmp_path):
+    if request.param == "async":
+        engine = await _create_engine(tmp_path)
+        yield AsyncFaceRepository(create_async_session_factory(engine), PoolMetrics(engine))
+        await engine.dispose()
+        return
+
+    repository = SqliteFaceRepository(str(tmp_path / "faces.db"))
+    yield repository
+    await repository.close()
+
+
+def _encodings(person_id: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        FaceEncoding(person_id=person_id, encoding=rng.normal(size=128).astype(np.float32), image_path=f"{i}.jpg")
+        for i in range(count)
+    ]
+
+
+async def _save(repository, person_id: int, count: int, seed: int = 0):
+    saved = await repository.save_face_encodings(_encodings(person_id, count, seed))
+    # created_at is the sync cursor; keep consecutive writes apart
+    await asyncio.sleep(0.01)
+    return saved
+
+
+@pytest.mark.asyncio
+async def test_create_and_find_person(repository):
+    alice = await repository.create_person("alice")
+    bob = await repository.create_person("bob")
+
+    assert alice.id != bob.id
+    assert (await repository.get_person_by_id(alice.id)).name == "alice"
+    assert (await repository.get_person_by_name("bob")).id == bob.id
+    assert await repository.get_person_by_name("carol") is None
+    assert await repository.get_person_by_id(bob.id + 100) is None
+    assert {p.id for p in await repository.get_persons_by_ids([alice.id, bob.id, bob.id + 100])} == {alice.id, bob.id}
+    assert sorted(p.name for p in await repository.get_all_persons()) == ["alice", "bob"]
+
+
+@pytest.mark.asyncio
+async def test_save_encodings(repository):
+    person = await repository.create_person("alice")
+    encodings = _encodings(person.id, 3)
+
+    saved = await repository.save_face_encodings(encodings)
+    single = await repository.save_face_encoding(person.id, encodings[0].encoding, "single.jpg")
+
+    assert [encoding.id for encoding in saved] == sorted(encoding.id for encoding in saved)
+    assert all(encoding.created_at is not None for encoding in saved)
+    assert single.id > saved[-1].id
+    assert await repository.count_face_encodings() == 4
+
+    stored = {encoding.id: encoding for encoding in await repository.get_all_face_encodings()}
+    for original, encoding in zip(encodings, saved):
+        assert stored[encoding.id].person_id == person.id
+        assert stored[encoding.id].image_path == original.image_path
+        np.testing.assert_array_equal(stored[encoding.id].encoding, original.encoding)
+
+
+@pytest.mark.asyncio
+async def test_iter_encoding_chunks(repository):
+    person = await repository.create_person("alice")
+    saved = await repository.save_face_encodings(_encodings(person.id, 25))
+
+    chunks = [chunk async for chunk in repository.iter_encoding_chunks(chunk_size=10)]
+
+    assert [len(encoding_ids) for encoding_ids, _, _ in chunks] == [10, 10, 5]
+    encoding_ids = np.concatenate([chunk[0] for chunk in chunks])
+    matrix = np.concatenate([chunk[2] for chunk in chunks])
+    assert encoding_ids.tolist() == [encoding.id for encoding in saved]
+    assert all((chunk[1] == person.id).all() for chunk in chunks)
+    assert matrix.dtype == np.float32 and matrix.shape == (25, 128)
+    np.testing.assert_array_equal(matrix, np.stack([encoding.encoding for encoding in saved]))
+
+
+@pytest.mark.asyncio
+async def test_initial_delta_is_everything_without_deletions(repository):
+    alice = await repository.create_person("alice")
+    bob = await repository.create_person("bob")
+    saved = await _save(repository, alice.id, 3) + await _save(repository, bob.id, 2)
+    await repository.delete_face_encodings([saved[0].id])
+
+    delta = await repository.get_encoding_delta(SyncWatermark())
+
+    assert delta.encoding_ids.tolist() == [encoding.id for encoding in saved[1:]]
+    assert delta.deleted_person_ids == [] and delta.deleted_encoding_ids == []
+    assert delta.watermark == await repository.get_sync_position()
+
+
+@pytest.mark.asyncio
+async def test_delta_with_tombstones(repository):
+    alice = await repository.create_person("alice")
+    bob = await repository.create_person("bob")
+    before = await _save(repository, alice.id, 3)
+    await _save(repository, bob.id, 2)
+    watermark = await repository.get_sync_position()
+    await asyncio.sleep(0.01)
+
+    after = await _save(repository, alice.id, 2, seed=1)
+    assert await repository.delete_face_encodings([before[0].id, after[0].id]) == 2
+    assert await repository.delete_person(bob.id)
+
+    delta = await repository.get_encoding_delta(watermark, overlap_seconds=0)
+
+    assert delta.encoding_ids.tolist() == [after[1].id]
+    assert (delta.person_ids == alice.id).all()
+    np.testing.assert_array_equal(delta.encodings[0], after[1].encoding)
+    assert delta.deleted_person_ids == [bob.id]
+    assert delta.deleted_encoding_ids == sorted([before[0].id, after[0].id])
+    assert delta.watermark == await repository.get_sync_position()
+
+    # Nothing changed since; replaying from the new watermark finds no new rows
+    replay = await repository.get_encoding_delta(delta.watermark, overlap_seconds=0)
+    assert set(replay.encoding_ids.tolist()) <= {after[1].id}
+
+
+@pytest.mark.asyncio
+async def test_delta_overlap_rereads_recent_rows(repository):
+    person = await repository.create_person("alice")
+    first = await _save(repository, person.id, 2)
+    # The watermark's time cursor is this row's; rows written with it are re-read even without overlap
+    last = await _save(repository, person.id, 1, seed=1)
+    watermark = await repository.get_sync_position()
+    second = await _save(repository, person.id, 2, seed=2)
+
+    narrow = await repository.get_encoding_delta(watermark, overlap_seconds=0)
+    wide = await repository.get_encoding_delta(watermark, overlap_seconds=3600)
+
+    assert not set(narrow.encoding_ids.tolist()) & {encoding.id for encoding in first}
+    assert {encoding.id for encoding in second} <= set(narrow.encoding_ids.tolist())
+    assert set(wide.encoding_ids.tolist()) == {encoding.id for encoding in first + last + second}
+    assert wide.watermark == narrow.watermark
+
+
+@pytest.mark.asyncio
+async def test_delete(repository):
+    alice = await repository.create_person("alice")
+    bob = await repository.create_person("bob")
+    saved = await repository.save_face_encodings(_encodings(alice.id, 2) + _encodings(bob.id, 2, seed=1))
+
+    assert await repository.delete_person(alice.id)
+    assert not await repository.delete_person(alice.id)
+    assert await repository.get_person_by_id(alice.id) is None
+    assert await repository.delete_face_encodings([saved[2].id, saved[0].id]) == 1
+    assert await repository.delete_face_encodings([]) == 0
+
+    remaining = await repository.get_all_face_encodings()
+    assert [encoding.id for encoding in remaining] == [saved[3].id]
+    assert await repository.count_face_encodings() == 1
+
+
+@pytest.mark.asyncio
+async def test_async_repository_pool_metrics(async_engine):
+    repository = AsyncFaceRepository(create_async_session_factory(async_engine), PoolMetrics(async_engine))
+    person = await repository.create_person("alice")
+
+    # Concurrent calls each check out their own connection and return it
+    await asyncio.gather(*[repository.save_face_encodings(_encodings(person.id, 2, seed)) for seed in range(4)])
+    persons = await asyncio.gather(*[repository.get_person_by_id(person.id) for _ in range(4)])
+
+    stats = repository.pool_stats()
+    assert [p.name for p in persons] == ["alice"] * 4
+    assert await repository.count_face_encodings() == 8
+    assert stats["checkouts"] >= 9 and stats["connects"] >= 1
+    assert stats["checked_out"] == 0 and stats["peak_checked_out"] >= 1
+    assert stats["invalidated"] == 0
+
+
+@pytest.mark.asyncio
+async def test_async_repository_without_pool_metrics(async_engine):
+    repository = AsyncFaceRepository(create_async_session_factory(async_engine))
+
+    await repository.create_person("alice")
+
+    assert repository.pool_stats() == {}
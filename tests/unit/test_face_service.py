@@ -0,0 +1,403 @@
+"""FaceService gallery sync between workers, on the embedded SQLite repository and fakeredis."""
+import io
+import fakeredis
+import numpy as np
+import pytest
+import pytest_asyncio
+import redis
+from PIL import Image
+from app.config import Settings
+from app.domain.models import DetectedFace, FaceEncoding
+from app.infrastructure.rabbitmq.gallery_feed import pack_change, unpack_change
+from app.infrastructure.repositories import SqliteFaceRepository
+from app.infrastructure.storage.file_storage import FileStorage
+from app.services import face_service as face_service_module
+from app.services.face_recognition_engine import FaceRecognitionEngine
+from app.services.encoding_cache import EncodingCache
+from app.services.face_service import FaceService
+from app.services.gallery_file_snapshot import GalleryFileSnapshot
+
+
+class _Feed:
+    """In-process change feed: every change reaches every connected worker, the writer included."""
+
+    def __init__(self):
+        self.services = []
+        self.published = 0
+        self.received = 0
+        self.deliver = True
+
+    async def publish(self, change):
+        self.published += 1
+        if not self.deliver:
+            return
+        for service in self.services:
+            self.received += 1
+            service.apply_change(unpack_change(pack_change(change)))
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = Settings(
+        _env_file=None,
+        gallery_snapshot_dir="",
+        gallery_poll_interval=0,
+        gallery_feed_gap_timeout=60.0
+    )
+    monkeypatch.setattr(face_service_module, "get_settings", lambda: settings)
+    return settings
+
+
+@pytest_asyncio.fixture
+async def repository(tmp_path):
+    repository = SqliteFaceRepository(str(tmp_path / "faces.db"))
+    yield repository
+    await repository.close()
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def feed():
+    return _Feed()
+
+
+def _service(repository, server, tmp_path, feed=None, **components) -> FaceService:
+    # One Redis client per worker, like separate processes sharing one Redis
+    service = FaceService(
+        repository,
+        FileStorage(str(tmp_path / "uploads")),
+        FaceRecognitionEngine(),
+        redis_client=fakeredis.FakeRedis(server=server),
+        change_feed=feed,
+        **components
+    )
+    if feed is not None:
+        feed.services.append(service)
+    return service
+
+
+def _encodings(person_id: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        FaceEncoding(person_id=person_id, encoding=rng.normal(size=128).astype(np.float32), image_path=f"{i}.jpg")
+        for i in range(count)
+    ]
+
+
+def _ids(encodings) -> list:
+    return sorted(encoding.id for encoding in encodings)
+
+
+def _count_deltas(repository, monkeypatch) -> list:
+    calls = []
+    get_encoding_delta = repository.get_encoding_delta
+
+    async def counting_delta(*args, **kwargs):
+        calls.append(args)
+        return await get_encoding_delta(*args, **kwargs)
+
+    monkeypatch.setattr(repository, "get_encoding_delta", counting_delta)
+    return calls
+
+
+def _fail_version_bump_once(service: FaceService, monkeypatch):
+    incr = service.redis_client.incr
+
+    def fail_once(key):
+        monkeypatch.setattr(service.redis_client, "incr", incr)
+        raise redis.ConnectionError("connection reset")
+
+    monkeypatch.setattr(service.redis_client, "incr", fail_once)
+
+
+@pytest.mark.asyncio
+async def test_workers_stay_in_sync_through_the_feed(settings, repository, server, feed, tmp_path, monkeypatch):
+    first, second = _service(repository, server, tmp_path, feed), _service(repository, server, tmp_path, feed)
+    await first._get_gallery()
+    await second._get_gallery()
+    delta_calls = _count_deltas(repository, monkeypatch)
+
+    rng = np.random.default_rng(0)
+    await first._register_new_person("alice", rng.normal(size=128), b"image", ".jpg")
+    await second._register_new_person("bob", rng.normal(size=128), b"image", ".jpg")
+    await first._register_new_person("alice", rng.normal(size=128), b"image", ".jpg")
+    alice = await repository.get_person_by_name("alice")
+
+    stored = _ids(await repository.get_all_face_encodings())
+    for service in (first, second):
+        gallery = await service._get_gallery()
+        assert sorted(gallery.ids.tolist()) == stored
+        assert service._gallery_version == 3
+
+    assert await second.delete_person(alice.id)
+    remaining = _ids(await repository.get_all_face_encodings())
+    for service in (first, second):
+        gallery = await service._get_gallery()
+        assert sorted(gallery.ids.tolist()) == remaining
+        assert alice.id not in gallery.person_ids
+
+    # Every change came through the feed; nobody read a delta from the database
+    assert len(remaining) == 1 and delta_calls == []
+
+
+@pytest.mark.asyncio
+async def test_feed_gap_falls_back_to_a_database_delta(settings, repository, server, feed, tmp_path, monkeypatch):
+    writer, reader = _service(repository, server, tmp_path, feed), _service(repository, server, tmp_path, feed)
+    person = await repository.create_person("alice")
+    await writer._get_gallery()
+    await reader._get_gallery()
+    delta_calls = _count_deltas(repository, monkeypatch)
+
+    feed.deliver = False
+    lost = await writer._save_encodings(_encodings(person.id, 2))
+    feed.deliver = True
+    after_gap = await writer._save_encodings(_encodings(person.id, 1, seed=1))
+
+    # The change after the gap waits for the missing one, at first
+    gallery = await reader._get_gallery()
+    assert sorted(gallery.ids.tolist()) == []
+    assert reader.get_stats()["change_feed"]["pending"] == 1 and delta_calls == []
+
+    settings.gallery_feed_gap_timeout = 0
+    gallery = await reader._get_gallery()
+
+    assert len(delta_calls) == 1
+    assert sorted(gallery.ids.tolist()) == _ids(lost + after_gap)
+    assert reader._gallery_version == writer._gallery_version == 2
+    assert reader.get_stats()["change_feed"]["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_version_reset_forces_a_full_reload(settings, repository, server, feed, tmp_path):
+    writer, reader = _service(repository, server, tmp_path, feed), _service(repository, server, tmp_path, feed)
+    person = await repository.create_person("alice")
+    await writer._get_gallery()
+    stale = await reader._get_gallery()
+    await writer._save_encodings(_encodings(person.id, 1))
+    await writer._save_encodings(_encodings(person.id, 1, seed=1))
+    await reader._get_gallery()
+    assert reader._gallery_version == 2
+
+    # Redis lost the counter; a write made meanwhile is nowhere in the feed
+    reader.redis_client.flushall()
+    unseen = await repository.save_face_encodings(_encodings(person.id, 1, seed=2))
+    reader.redis_client.incr("face_encodings_version")
+
+    gallery = await reader._get_gallery()
+
+    assert gallery is not stale
+    assert sorted(gallery.ids.tolist()) == _ids(await repository.get_all_face_encodings())
+    assert unseen[0].id in gallery.ids
+    assert reader._gallery_version == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_version_bump_resyncs_from_database(settings, repository, server, feed, tmp_path, monkeypatch):
+    service = _service(repository, server, tmp_path, feed)
+    person = await repository.create_person("alice")
+    await service._get_gallery()
+
+    _fail_version_bump_once(service, monkeypatch)
+    saved = await service._save_encodings(_encodings(person.id, 2))
+    # A row whose announcement this worker never saw; only a database delta brings it in
+    unseen = await repository.save_face_encodings(_encodings(person.id, 1, seed=1))
+    delta_calls = _count_deltas(repository, monkeypatch)
+
+    gallery = await service._get_gallery()
+
+    assert len(delta_calls) == 1
+    assert sorted(gallery.ids.tolist()) == _ids(saved + unseen)
+
+    # Once resynced, an unchanged version does not read the database again
+    await service._get_gallery()
+    assert len(delta_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_feed_change_during_resync_is_applied_after_it(settings, repository, server, feed, tmp_path, monkeypatch):
+    writer, reader = _service(repository, server, tmp_path, feed), _service(repository, server, tmp_path, feed)
+    person = await repository.create_person("alice")
+    await writer._get_gallery()
+    await reader._get_gallery()
+    saved = await writer._save_encodings(_encodings(person.id, 3))
+    await reader._get_gallery()
+
+    # The reader's own write fails to announce itself, so its next read resyncs from the database
+    _fail_version_bump_once(reader, monkeypatch)
+    own = await reader._save_encodings(_encodings(person.id, 1, seed=1))
+    watermark = reader._watermark
+    get_encoding_delta = repository.get_encoding_delta
+
+    async def delete_after_reading(*args, **kwargs):
+        delta = await get_encoding_delta(*args, **kwargs)
+        # The writer deletes a row the delta still holds; its change arrives before the delta is applied
+        monkeypatch.setattr(repository, "get_encoding_delta", get_encoding_delta)
+        await writer._evict_encodings([saved[0].id])
+        return delta
+
+    monkeypatch.setattr(repository, "get_encoding_delta", delete_after_reading)
+    version = reader._gallery_version
+
+    gallery = await reader._get_gallery()
+
+    assert sorted(gallery.ids.tolist()) == _ids(saved[1:] + own)
+    assert reader._gallery_version == version + 1 == writer._gallery_version
+    assert reader._watermark.encoding_id >= watermark.encoding_id
+    assert reader._pending_changes == {}
+
+
+@pytest.mark.asyncio
+async def test_compaction_releases_its_lock(settings, repository, server, tmp_path):
+    settings.gallery_max_encodings_per_person = 2
+    service = _service(repository, server, tmp_path)
+    person = await repository.create_person("alice")
+    await repository.save_face_encodings(_encodings(person.id, 5))
+
+    assert await service.compact_gallery() == 3
+    assert service.redis_client.get("gallery_compaction_lock") is None
+    assert service.gallery.total_size == 2
+
+    # Another writer without retention; the next run is not locked out until the lock expires
+    await repository.save_face_encodings(_encodings(person.id, 2, seed=1))
+    service.redis_client.incr("face_encodings_version")
+    assert await service.compact_gallery() == 2
+
+
+@pytest.mark.asyncio
+async def test_rank_faces_orders_persons_by_distance(settings, repository, server, tmp_path):
+    settings.face_rank_neighbours = 200
+    service = _service(repository, server, tmp_path)
+    rng = np.random.default_rng(3)
+    persons = [await repository.create_person(name) for name in ("alice", "bob", "carol", "dave")]
+    for person in persons:
+        await repository.save_face_encodings(_encodings(person.id, 5, seed=person.id))
+    probes = [rng.normal(size=128).astype(np.float32) for _ in range(3)]
+
+    rankings = await service.rank_faces(probes, top_k=3)
+
+    gallery = service.gallery
+    names = {person.id: person.name for person in persons}
+    for probe, ranking in zip(probes, rankings):
+        distances = np.linalg.norm(gallery.matrix - probe, axis=1)
+        closest = {person.id: distances[gallery.person_ids == person.id].min() for person in persons}
+        expected = sorted(closest, key=closest.get)[:3]
+        assert [candidate.person_id for candidate in ranking] == expected
+        assert [candidate.person_name for candidate in ranking] == [names[person_id] for person_id in expected]
+
+
+@pytest.mark.asyncio
+async def test_gallery_over_its_memory_budget_spills_to_a_cold_tier(settings, repository, server, tmp_path):
+    service = _service(repository, server, tmp_path, file_snapshot=GalleryFileSnapshot(str(tmp_path / "gallery")))
+    persons = [await repository.create_person(name) for name in ("alice", "bob", "carol")]
+    for person in persons:
+        await service._save_encodings(_encodings(person.id, 6, seed=person.id))
+    await service._get_gallery()
+    # The first load published a snapshot; one snapshot write runs at a time
+    await service._snapshot_task
+
+    service.max_hot_rows = 8
+    await service._save_encodings(_encodings(persons[0].id, 2, seed=10))
+    gallery = await service._get_gallery()
+    # Deleted while the spill may still be writing the snapshot that holds it
+    doomed = int(gallery.ids[0])
+    await service._evict_encodings([doomed])
+    await service.close()
+
+    stored = _ids(await repository.get_all_face_encodings())
+    assert gallery.cold is not None
+    assert len(gallery) <= 8
+    hot, cold = gallery.ids.tolist(), np.concatenate([chunk[0] for chunk in gallery.cold.iter_live()]).tolist()
+    assert not set(hot) & set(cold)
+    assert sorted(hot + cold) == stored and doomed not in stored
+
+    # Matching a cold person promotes them back into memory
+    probe = next(e for e in await repository.get_all_face_encodings() if e.id in cold)
+    results = await service._identify_faces([DetectedFace(encoding=probe.encoding)], b"image", ".jpg", False)
+    assert results[0].success and results[0].person_name == {p.id: p.name for p in persons}[probe.person_id]
+    assert probe.id in gallery.ids
+
+
+def _blank_image() -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_only_successful_extractions_are_cached(settings, repository, server, tmp_path):
+    cache = EncodingCache(redis_client=fakeredis.FakeRedis(server=server))
+    service = _service(repository, server, tmp_path, encoding_cache=cache)
+
+    # An image that cannot be decoded is retried on its next delivery, not remembered as faceless
+    assert await service._extract_faces(b"not an image") == ([], False)
+    assert cache.stats()["entries"] == 0
+    assert cache.redis_client.keys(f"{cache.key_prefix}*") == []
+
+    # An image without faces is a result like any other
+    image = _blank_image()
+    assert await service._extract_faces(image) == ([], False)
+    assert await service._extract_faces(image) == ([], True)
+    assert len(cache.redis_client.keys(f"{cache.key_prefix}*")) == 1
+
+
+@pytest.mark.parametrize("metadata, top_k", [
+    (None, 0),
+    ({}, 0),
+    ({"top_k": 0}, 0),
+    ({"top_k": "0"}, 0),
+    ({"top_k": 3}, 3),
+    ({"top_k": "4"}, 4),
+    ({"top_k": -2}, 1),
+    ({"top_k": "many"}, 7),
+    ({"top_k": [3]}, 7)
+])
+def test_requested_top_k(settings, repository, server, tmp_path, metadata, top_k):
+    settings.face_rank_default_top_k = 7
+    service = _service(repository, server, tmp_path)
+
+    assert service._requested_top_k(metadata) == top_k
+
+
+@pytest.mark.asyncio
+async def test_malformed_top_k_ranks_the_default_number(settings, repository, server, tmp_path, monkeypatch):
+    settings.face_rank_default_top_k = 2
+    service = _service(repository, server, tmp_path)
+    persons = [await repository.create_person(name) for name in ("alice", "bob", "carol")]
+    for person in persons:
+        await repository.save_face_encodings(_encodings(person.id, 2, seed=person.id))
+    face = DetectedFace(encoding=np.random.default_rng(9).normal(size=128).astype(np.float32), location=(0, 10, 10, 0))
+    monkeypatch.setattr(service.recognition_engine, "extract_faces", lambda image_data, profile=None: [face])
+
+    result = await service.process_image_from_event(b"image", "a.jpg", image_id="1", metadata={"top_k": "all"})
+    assert len(result["faces"][0]["candidates"]) == 2
+
+    # Larger than the gallery is clamped to it
+    rankings = await service.rank_faces([face.encoding], top_k=1000)
+    assert len(rankings[0]) == 3
+
+
+@pytest.mark.asyncio
+async def test_close_stops_index_training_and_saves_the_index(settings, repository, server, tmp_path):
+    settings.face_index_type = "ivf"
+    settings.face_index_min_size = 20
+    settings.face_index_lists = 4
+    settings.face_index_path = str(tmp_path / "ivf.npz")
+    service = _service(repository, server, tmp_path)
+    person = await repository.create_person("alice")
+    await repository.save_face_encodings(_encodings(person.id, 40))
+
+    index = (await service._get_gallery()).index
+    index._pending[0].result(5)
+    assert not index.is_ready
+    # The next sync installs the finished training
+    await service._get_gallery()
+    assert index.is_ready
+
+    await service.close()
+
+    assert index._executor is None
+    assert (tmp_path / "ivf.npz").exists()
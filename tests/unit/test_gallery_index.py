@@ -0,0 +1,183 @@
+"""IVFIndex and PersonPrototypeIndex against brute force, through random gallery changes."""
+import threading
+import numpy as np
+import pytest
+from app.services.face_gallery import FaceGallery
+from app.services.gallery_index import IVFIndex, PersonPrototypeIndex
+
+DIMENSION = 16
+
+
+def _gallery(rng, rows: int, persons: int = 8, first_id: int = 1) -> FaceGallery:
+    gallery = FaceGallery(capacity=4, dimension=DIMENSION)
+    _extend(gallery, rng, rows, persons, first_id)
+    return gallery
+
+
+def _extend(gallery: FaceGallery, rng, rows: int, persons: int = 8, first_id: int = None):
+    first_id = first_id if first_id is not None else int(gallery.ids.max(initial=0)) + 1
+    gallery.extend(
+        range(first_id, first_id + rows),
+        rng.integers(1, persons + 1, rows),
+        rng.normal(size=(rows, DIMENSION))
+    )
+
+
+def _change(gallery: FaceGallery, rng):
+    if rng.random() < 0.6:
+        _extend(gallery, rng, int(rng.integers(1, 20)))
+    else:
+        gallery.remove_ids(rng.choice(gallery.ids, size=min(len(gallery), 5), replace=False).tolist())
+
+
+def _assert_ivf_consistent(index: IVFIndex, gallery: FaceGallery):
+    """Every row is in exactly one list, and that list's centroid is the row's nearest."""
+    members = index._lists.gather(np.arange(len(index._lists)))
+    assert sorted(members.tolist()) == list(range(len(gallery)))
+
+    vectors = gallery.matrix
+    distances = np.linalg.norm(vectors[:, None, :] - index.centroids[None, :, :], axis=2)
+    assigned = np.empty(len(gallery), dtype=np.int64)
+    for list_id in range(len(index._lists)):
+        assigned[index._lists.rows(list_id)] = list_id
+    rows = np.arange(len(gallery))
+    np.testing.assert_allclose(distances[rows, assigned], distances.min(axis=1), rtol=1e-5, atol=1e-5)
+
+
+def _assert_finds_stored_rows(index: IVFIndex, gallery: FaceGallery, rng):
+    # A probe equal to a stored encoding always has that row among its candidates
+    for row in rng.integers(0, len(gallery), 10):
+        assert row in index.candidates(gallery.encodings_at([row])[0])
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_ivf_follows_gallery_changes(seed):
+    rng = np.random.default_rng(seed)
+    gallery = _gallery(rng, 200)
+    index = IVFIndex(n_lists=8, n_probe=2, min_train_size=100, background=False)
+    gallery.attach_index(index)
+    assert index.is_ready
+
+    for _ in range(25):
+        _change(gallery, rng)
+        _assert_ivf_consistent(index, gallery)
+        _assert_finds_stored_rows(index, gallery, rng)
+
+    # Probing every list is an exact scan
+    index.n_probe = len(index.centroids)
+    assert sorted(index.candidates(rng.normal(size=DIMENSION)).tolist()) == list(range(len(gallery)))
+
+
+def test_ivf_retrains_after_growing_fourfold():
+    rng = np.random.default_rng(0)
+    gallery = _gallery(rng, 100)
+    index = IVFIndex(n_lists=4, min_train_size=100, background=False)
+    gallery.attach_index(index)
+
+    _extend(gallery, rng, 301)
+
+    assert index._trained_size == 401
+    _assert_ivf_consistent(index, gallery)
+
+
+def test_ivf_background_training_follows_changes_made_meanwhile():
+    rng = np.random.default_rng(1)
+    gallery = _gallery(rng, 150)
+    index = IVFIndex(n_lists=8, n_probe=2, min_train_size=100)
+    release = threading.Event()
+    train = index._train
+
+    def blocked_train(view):
+        release.wait(5)
+        return train(view)
+
+    index._train = blocked_train
+    gallery.attach_index(index)
+    # The gallery is scanned exactly until training is done; rows move and go meanwhile
+    for _ in range(10):
+        _change(gallery, rng)
+        assert not index.is_ready
+
+    release.set()
+    index._pending[0].result(5)
+    # Checking readiness has no side effects; the finished training is installed explicitly
+    assert not index.is_ready
+    index.refresh()
+
+    assert index.is_ready
+    _assert_ivf_consistent(index, gallery)
+    _assert_finds_stored_rows(index, gallery, rng)
+    index.close()
+    assert index._executor is None
+
+
+def test_ivf_close_writes_queued_saves_and_drops_training(tmp_path):
+    rng = np.random.default_rng(3)
+    path = tmp_path / "ivf.npz"
+    gallery = _gallery(rng, 150)
+    index = IVFIndex(n_lists=8, min_train_size=100, path=str(path))
+    gallery.attach_index(index)
+    index._pending[0].result(5)
+    # Installing the trained index queues its save on the training thread
+    index.refresh()
+    _extend(gallery, rng, 500)
+    assert index._pending is not None
+
+    index.close()
+
+    assert path.exists() and index._pending is None and index._executor is None
+    assert index.is_ready
+
+
+def test_ivf_save_and_load(tmp_path):
+    rng = np.random.default_rng(2)
+    path = str(tmp_path / "ivf.npz")
+    gallery = _gallery(rng, 300)
+    saved = IVFIndex(n_lists=8, min_train_size=100, path=path, background=False)
+    gallery.attach_index(saved)
+
+    # Restarting with some of those encodings deleted and new ones added
+    restarted = FaceGallery(capacity=4, dimension=DIMENSION)
+    keep = rng.random(len(gallery)) < 0.8
+    restarted.extend(gallery.ids[keep], gallery.person_ids[keep], gallery.matrix[keep])
+    _extend(restarted, rng, 40, first_id=1000)
+    loaded = IVFIndex(n_lists=8, min_train_size=100, path=path, background=False)
+    restarted.attach_index(loaded)
+
+    np.testing.assert_array_equal(loaded.centroids, saved.centroids)
+    assert loaded._trained_size == saved._trained_size
+    _assert_ivf_consistent(loaded, restarted)
+    # Kept rows are in the same list as before the restart
+    for list_id in range(len(saved._lists)):
+        before = set(gallery.ids[saved._lists.rows(list_id)].tolist())
+        after = set(restarted.ids[loaded._lists.rows(list_id)].tolist())
+        assert before & set(restarted.ids.tolist()) == after - set(range(1000, 1040))
+
+
+def _person_centroids(gallery: FaceGallery) -> dict:
+    return {
+        int(person_id): gallery.matrix[gallery.person_ids == person_id].mean(axis=0)
+        for person_id in np.unique(gallery.person_ids)
+    }
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_prototype_index_follows_gallery_changes(seed):
+    rng = np.random.default_rng(seed)
+    gallery = _gallery(rng, 60)
+    index = PersonPrototypeIndex(top_persons=3, dimension=DIMENSION)
+    gallery.attach_index(index)
+
+    for _ in range(25):
+        _change(gallery, rng)
+        if rng.random() < 0.2:
+            gallery.remove_person(int(rng.choice(gallery.person_ids)))
+
+        centroids = _person_centroids(gallery)
+        for person_id, centroid in centroids.items():
+            np.testing.assert_allclose(index._centroids[index._slots[person_id]], centroid, rtol=1e-4, atol=1e-5)
+
+        probe = rng.normal(size=DIMENSION)
+        person_ids = sorted(centroids, key=lambda person_id: np.linalg.norm(centroids[person_id] - probe))
+        expected = np.flatnonzero(np.isin(gallery.person_ids, person_ids[:3]))
+        assert sorted(index.candidates(probe).tolist()) == expected.tolist()
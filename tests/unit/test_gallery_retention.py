@@ -0,0 +1,55 @@
+"""RetentionPolicy batch planning against applying each decision to the gallery in turn."""
+import numpy as np
+import pytest
+from app.services.face_gallery import FaceGallery
+from app.services.gallery_retention import RetentionPolicy
+
+
+def _gallery(person_counts, rng) -> FaceGallery:
+    gallery = FaceGallery()
+    next_id = 1
+    for person_id, count in person_counts.items():
+        gallery.extend(range(next_id, next_id + count), [person_id] * count, rng.normal(size=(count, 128)))
+        next_id += count
+    return gallery
+
+
+def _apply_one_by_one(policy: RetentionPolicy, gallery: FaceGallery, person_ids, encodings):
+    """Reference: plan each encoding against the gallery with every earlier decision applied."""
+    for position, (person_id, encoding) in enumerate(zip(person_ids, encodings)):
+        store, replaced = policy.plan(gallery, person_id, encoding)
+        if store:
+            gallery.remove_ids(replaced)
+            gallery.add(-1 - position, person_id, encoding)
+    return gallery
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_batch_matches_sequential_decisions(seed):
+    rng = np.random.default_rng(seed)
+    policy = RetentionPolicy(max_per_person=4, epsilon=0.5 if seed % 2 else 0.0)
+    person_counts = {1: 4, 2: 2, 3: 0}
+    person_ids = rng.choice([1, 2, 3], size=12).tolist()
+    encodings = rng.normal(size=(12, 128)).astype(np.float32)
+    gallery = _gallery(person_counts, np.random.default_rng(seed))
+    reference = _apply_one_by_one(policy, _gallery(person_counts, np.random.default_rng(seed)), person_ids, encodings)
+
+    kept, evicted = policy.plan_batch(gallery, person_ids, encodings)
+
+    # The ids the batch ends up with: the stored rows left plus the kept new ones
+    assert len(set(evicted)) == len(evicted)
+    final = sorted(set(gallery.ids.tolist()) - set(evicted)) + [-1 - position for position in kept]
+    assert sorted(final) == sorted(reference.ids.tolist())
+    _, counts = np.unique(reference.person_ids, return_counts=True)
+    assert counts.max() <= policy.max_per_person
+
+
+def test_plan_batch_at_cap_never_exceeds_it():
+    rng = np.random.default_rng(7)
+    policy = RetentionPolicy(max_per_person=3)
+    gallery = _gallery({1: 3}, rng)
+
+    kept, evicted = policy.plan_batch(gallery, [1] * 10, rng.normal(size=(10, 128)) * 5)
+
+    assert len(set(evicted)) == len(evicted)
+    assert 3 - len(evicted) + len(kept) <= 3
@@ -0,0 +1,156 @@
+"""GallerySnapshotCache against an in-process Redis (fakeredis)."""
+from datetime import datetime
+import fakeredis
+import numpy as np
+import pytest
+from app.domain.models import SyncWatermark
+from app.services.face_gallery import FaceGallery
+from app.services.gallery_snapshot import GallerySnapshotCache
+
+WATERMARK = SyncWatermark(
+    encoding_id=40,
+    encoding_created_at=datetime(2024, 5, 1, 12, 30, 15, 123456),
+    tombstone_id=3,
+    tombstone_deleted_at=datetime(2024, 5, 1, 12, 0)
+)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _cache(server, refresh_versions: int = 10) -> GallerySnapshotCache:
+    # One client per cache, like separate workers sharing one Redis
+    return GallerySnapshotCache(fakeredis.FakeRedis(server=server), chunk_size=1024, refresh_versions=refresh_versions)
+
+
+def _gallery(rows: int, seed: int = 0) -> FaceGallery:
+    rng = np.random.default_rng(seed)
+    gallery = FaceGallery(capacity=rows)
+    gallery.extend(range(1, rows + 1), rng.integers(1, 5, rows), rng.normal(size=(rows, 128)))
+    return gallery
+
+
+def _assert_same_rows(loaded: FaceGallery, expected: FaceGallery):
+    np.testing.assert_array_equal(loaded.ids, expected.ids)
+    np.testing.assert_array_equal(loaded.person_ids, expected.person_ids)
+    np.testing.assert_array_equal(loaded.matrix, expected.matrix)
+    np.testing.assert_allclose(loaded.sq_norms, expected.sq_norms, rtol=1e-6)
+
+
+def test_load_without_snapshot_is_a_miss(server):
+    cache = _cache(server)
+
+    assert cache.load() is None
+    assert cache.misses == 1
+    assert cache.is_stale(0)
+
+
+def test_cold_start_from_snapshot(server):
+    gallery = _gallery(40)
+    assert _cache(server).publish(gallery, WATERMARK, version=7)
+
+    # A worker starting later reads the gallery and the watermark its delta starts from
+    cache = _cache(server)
+    loaded, watermark, version = cache.load(max_version=7)
+
+    _assert_same_rows(loaded, gallery)
+    assert watermark == WATERMARK
+    assert version == 7
+    assert cache.loads == 1 and cache.stats()["version"] == 7
+
+
+def test_warm_path_does_not_read_redis(server, monkeypatch):
+    cache = _cache(server, refresh_versions=10)
+    assert cache.publish(_gallery(5), WATERMARK, version=20)
+
+    monkeypatch.setattr(cache, "_read_manifest", lambda: pytest.fail("warm path read the manifest"))
+    assert not cache.is_stale(20)
+    assert not cache.is_stale(29)
+    assert not cache.is_stale(None)
+
+
+def test_is_stale_after_refresh_versions(server):
+    publisher, reader = _cache(server, refresh_versions=10), _cache(server, refresh_versions=10)
+    assert publisher.publish(_gallery(5), WATERMARK, version=20)
+
+    assert not reader.is_stale(29)
+    assert reader.is_stale(30)
+    assert not _cache(server, refresh_versions=0).is_stale(1000)
+
+
+def test_snapshot_newer_than_counter_is_dropped(server):
+    cache = _cache(server)
+    assert cache.publish(_gallery(5), WATERMARK, version=50)
+
+    # The version counter was reset below the snapshot's version
+    assert cache.load(max_version=3) is None
+    assert cache.redis_client.hgetall(cache.manifest_key) == {}
+
+
+def test_incomplete_snapshot_is_ignored(server):
+    cache = _cache(server)
+    assert cache.publish(_gallery(40), WATERMARK, version=5)
+
+    manifest = cache._read_manifest()
+    cache.redis_client.delete(cache.chunk_key(manifest["id"], manifest["chunks"] - 1))
+
+    assert cache.load() is None
+
+
+def test_older_snapshot_does_not_replace_newer(server):
+    newer, older = _gallery(10, seed=1), _gallery(20, seed=2)
+    assert _cache(server).publish(newer, WATERMARK, version=9)
+
+    assert not _cache(server).publish(older, WATERMARK, version=8)
+    assert not _cache(server).publish(older, WATERMARK, version=9)
+    _assert_same_rows(_cache(server).load()[0], newer)
+
+
+def test_publish_skipped_while_another_worker_holds_the_lock(server):
+    cache = _cache(server)
+    cache.redis_client.set(f"{cache.key_prefix}:lock", 1)
+
+    assert not cache.publish(_gallery(5), WATERMARK, version=1)
+    assert cache.load() is None
+
+
+def _race(cache: GallerySnapshotCache, commit_first):
+    """Run ``commit_first`` after the cache has read the WATCHed manifest but before its EXEC."""
+    transaction = cache.redis_client.transaction
+    interleaved = []
+
+    def racing_transaction(func, *watches, **kwargs):
+        def swap(pipe):
+            result = func(pipe)
+            if not interleaved:
+                interleaved.append(True)
+                commit_first()
+            return result
+        return transaction(swap, *watches, **kwargs)
+
+    cache.redis_client.transaction = racing_transaction
+
+
+@pytest.mark.parametrize("slow_version, fast_version", [(8, 9), (9, 8)])
+def test_concurrent_publishers_newer_version_wins(server, slow_version, fast_version):
+    slow_gallery, fast_gallery = _gallery(10, seed=1), _gallery(20, seed=2)
+    slow, fast = _cache(server), _cache(server)
+    # The fast publisher bypasses the lock, as if the slow one's lock had expired
+    _race(slow, lambda: fast._publish(fast_gallery, WATERMARK, fast_version))
+
+    published = slow.publish(slow_gallery, WATERMARK, slow_version)
+
+    loaded, _, version = _cache(server).load()
+    assert version == max(slow_version, fast_version)
+    assert published == (slow_version > fast_version)
+    _assert_same_rows(loaded, slow_gallery if published else fast_gallery)
+    if not published:
+        # The loser's chunks are removed right away
+        assert _snapshot_ids_with_chunks(server) == {_cache(server)._read_manifest()["id"]}
+
+
+def _snapshot_ids_with_chunks(server) -> set:
+    keys = fakeredis.FakeRedis(server=server).keys("gallery_snapshot:*:*")
+    return {int(key.split(b":")[1]) for key in keys}
@@ -0,0 +1,106 @@
+"""ColdTier promotion, demotion and deletion against a brute-force model of the live rows."""
+import numpy as np
+import pytest
+from app.services.face_gallery import FaceGallery
+from app.services.gallery_tiers import ColdTier
+
+DIMENSION = 16
+
+
+def _tiered(rng, cold_rows: int, max_hot_rows: int, persons: int = 10):
+    ids = np.arange(1, cold_rows + 1, dtype=np.int64)
+    person_ids = rng.integers(1, persons + 1, cold_rows).astype(np.int64)
+    matrix = rng.normal(size=(cold_rows, DIMENSION)).astype(np.float32)
+    for array in (ids, person_ids, matrix):
+        array.setflags(write=False)
+    cold = FaceGallery.from_snapshot(ids, person_ids, matrix, np.einsum("ij,ij->i", matrix, matrix))
+    hot = FaceGallery(capacity=4, dimension=DIMENSION)
+    hot.attach_cold(ColdTier(cold, max_hot_rows))
+    live = {int(i): (int(p), v) for i, p, v in zip(ids, person_ids, matrix)}
+    return hot, live
+
+
+def _cold_live(tier: ColdTier):
+    chunks = list(tier.iter_live(chunk_size=9))
+    return np.concatenate([chunk[0] for chunk in chunks]), np.concatenate([chunk[2] for chunk in chunks])
+
+
+def _assert_tiers_match(hot: FaceGallery, live: dict):
+    """Every live row is in exactly one tier, with its own person and encoding."""
+    tier = hot.cold
+    cold_ids, cold_encodings = _cold_live(tier)
+    hot_ids = hot.ids.tolist()
+    assert not set(hot_ids) & set(cold_ids.tolist())
+    assert sorted(hot_ids + cold_ids.tolist()) == sorted(live)
+    assert hot.total_size == len(live) and len(tier) == len(cold_ids)
+
+    for encoding_id, person_id, encoding in zip(hot_ids, hot.person_ids, hot.matrix):
+        assert live[encoding_id][0] == person_id
+        np.testing.assert_array_equal(encoding, live[encoding_id][1])
+    for encoding_id, encoding in zip(cold_ids.tolist(), cold_encodings):
+        np.testing.assert_array_equal(encoding, live[encoding_id][1])
+    assert hot.has_ids(np.array(sorted(live))).all()
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_random_promotions_demotions_and_deletions(seed):
+    rng = np.random.default_rng(seed)
+    hot, live = _tiered(rng, cold_rows=120, max_hot_rows=30)
+    tier = hot.cold
+    next_id = 1000
+
+    for _ in range(40):
+        operation = rng.choice(["promote", "add", "remove_ids", "remove_person", "rebalance"])
+        if operation == "promote":
+            persons = rng.integers(1, 11, 2).tolist()
+            expected = sum(1 for encoding_id, (person_id, _) in live.items()
+                           if person_id in persons and encoding_id not in set(hot.ids.tolist()))
+            assert hot.promote(persons) == expected
+            tier.touch(persons)
+        elif operation == "add":
+            # New rows exist only in memory until the next spill
+            count = int(rng.integers(1, 4))
+            person_ids = rng.integers(1, 11, count)
+            encodings = rng.normal(size=(count, DIMENSION)).astype(np.float32)
+            hot.extend(range(next_id, next_id + count), person_ids, encodings)
+            live.update((next_id + i, (int(person_ids[i]), encodings[i])) for i in range(count))
+            next_id += count
+        elif operation == "remove_ids":
+            doomed = rng.choice(sorted(live), size=min(len(live), 3), replace=False).tolist()
+            assert hot.remove_ids(doomed) == len(doomed)
+            for encoding_id in doomed:
+                del live[encoding_id]
+        elif operation == "remove_person":
+            person_id = int(rng.integers(1, 11))
+            expected = sum(1 for owner, _ in live.values() if owner == person_id)
+            assert hot.remove_person(person_id) == expected
+            live = {encoding_id: row for encoding_id, row in live.items() if row[0] != person_id}
+        else:
+            fits = tier.rebalance(hot)
+            assert fits == (len(hot) <= tier.max_hot_rows)
+            if not fits:
+                # Only rows without a copy in the cold tier are left over the budget
+                assert not tier.has_ids(hot.ids).any()
+
+        _assert_tiers_match(hot, live)
+
+
+def test_least_recently_used_persons_are_demoted_first():
+    rng = np.random.default_rng(0)
+    hot, live = _tiered(rng, cold_rows=60, max_hot_rows=20, persons=6)
+    tier = hot.cold
+    for person_id in range(1, 7):
+        hot.promote([person_id])
+        tier.touch([person_id])
+    # Person 1 was promoted first but used last
+    tier.touch([1])
+
+    assert tier.rebalance(hot)
+
+    # Whoever stays resident was used more recently than everyone demoted
+    resident = set(hot.person_ids.tolist())
+    by_recency = [2, 3, 4, 5, 6, 1]
+    assert 1 in resident and 2 not in resident
+    assert resident == set(by_recency[len(by_recency) - len(resident):])
+    assert tier.demotions >= 1 and len(hot) <= 20
+    _assert_tiers_match(hot, live)